@@ -6,6 +6,7 @@ from sqlalchemy import pool
 from alembic import context
 
 from models.users import Base
+import models  # noqa: F401 — регистрирует все модели в Base.metadata
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -0,0 +1,40 @@
+"""gps breadcrumbs
+
+Revision ID: 0a9d4e6b7c21
+Revises: f1c7a83e52d6
+Create Date: 2026-10-18 16:40:03.275519
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a9d4e6b7c21'
+down_revision: Union[str, None] = 'f1c7a83e52d6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Без первичного и внешних ключей: таблица только для добавления и пишется через COPY
+    op.create_table(
+        'gps_breadcrumbs',
+        sa.Column('driver_id', sa.Integer(), nullable=False),
+        sa.Column('recorded_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('lat', sa.Float(), nullable=False),
+        sa.Column('lon', sa.Float(), nullable=False),
+        sa.Column('available', sa.Boolean(), nullable=False),
+    )
+    op.create_index('ix_gps_breadcrumbs_driver_id_recorded_at', 'gps_breadcrumbs', ['driver_id', 'recorded_at'],
+                    unique=False)
+    op.create_index('ix_gps_breadcrumbs_recorded_at_brin', 'gps_breadcrumbs', ['recorded_at'], unique=False,
+                    postgresql_using='brin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_gps_breadcrumbs_recorded_at_brin', table_name='gps_breadcrumbs')
+    op.drop_index('ix_gps_breadcrumbs_driver_id_recorded_at', table_name='gps_breadcrumbs')
+    op.drop_table('gps_breadcrumbs')
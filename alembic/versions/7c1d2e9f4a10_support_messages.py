@@ -0,0 +1,39 @@
+"""support messages
+
+Revision ID: 7c1d2e9f4a10
+Revises: 4eb5da08213d
+Create Date: 2026-10-18 10:12:41.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1d2e9f4a10'
+down_revision: Union[str, None] = '4eb5da08213d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'support_messages',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_support_messages_created_at_id', 'support_messages', ['created_at', 'id'], unique=False)
+    op.create_index('ix_support_messages_user_id_created_at_id', 'support_messages',
+                    ['user_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_support_messages_user_id_created_at_id', table_name='support_messages')
+    op.drop_index('ix_support_messages_created_at_id', table_name='support_messages')
+    op.drop_table('support_messages')
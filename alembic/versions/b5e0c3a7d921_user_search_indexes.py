@@ -0,0 +1,37 @@
+"""user search indexes
+
+Revision ID: b5e0c3a7d921
+Revises: 7c1d2e9f4a10
+Create Date: 2026-10-18 11:02:07.531944
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e0c3a7d921'
+down_revision: Union[str, None] = '7c1d2e9f4a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY не блокирует запись в большую таблицу users, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_phone_pattern "
+                   "ON users (phone varchar_pattern_ops)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_lower_pattern "
+                   "ON users (lower(email) text_pattern_ops)")
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_full_name_trgm "
+                   "ON users USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_full_name_trgm")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_email_lower_pattern")
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_users_phone_pattern")
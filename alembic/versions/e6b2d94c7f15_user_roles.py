@@ -0,0 +1,27 @@
+"""user roles
+
+Revision ID: e6b2d94c7f15
+Revises: d3a8f61c0b47
+Create Date: 2026-10-18 13:05:12.417730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b2d94c7f15'
+down_revision: Union[str, None] = 'd3a8f61c0b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Колонка с server_default в PostgreSQL 11+ добавляется без перезаписи таблицы
+    op.add_column('users', sa.Column('role', sa.String(), server_default='rider', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'role')
@@ -0,0 +1,64 @@
+"""trips
+
+Revision ID: f1c7a83e52d6
+Revises: e6b2d94c7f15
+Create Date: 2026-10-18 15:21:48.903117
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c7a83e52d6'
+down_revision: Union[str, None] = 'e6b2d94c7f15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Секции на текущий и несколько следующих месяцев; дальше их создает manage.py trip-partitions
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'trips',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('request_id', sa.String(length=32), nullable=False),
+        sa.Column('rider_id', sa.Integer(), nullable=False),
+        sa.Column('driver_id', sa.Integer(), nullable=True),
+        sa.Column('status', sa.String(), server_default='assigned', nullable=False),
+        sa.Column('pickup_lat', sa.Float(), nullable=False),
+        sa.Column('pickup_lon', sa.Float(), nullable=False),
+        sa.Column('pickup_distance', sa.Float(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['rider_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['driver_id'], ['users.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    # Таблица пустая, поэтому индексы создаются сразу; у новых секций они появляются автоматически
+    op.create_index('ix_trips_rider_id_created_at', 'trips', ['rider_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_trips_driver_id_created_at', 'trips', ['driver_id', 'created_at', 'id'], unique=False)
+
+    first = datetime.now(timezone.utc).date().replace(day=1)
+    for offset in range(PARTITIONS_AHEAD + 1):
+        month = _add_months(first, offset)
+        op.execute(f"CREATE TABLE trips_p{month.year:04d}_{month.month:02d} PARTITION OF trips "
+                   f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                   f"TO ('{_add_months(month, 1).isoformat()} 00:00:00+00')")
+
+
+def downgrade() -> None:
+    # Секции удаляются вместе с родительской таблицей (отсоединенные ранее остаются)
+    op.drop_index('ix_trips_driver_id_created_at', table_name='trips')
+    op.drop_index('ix_trips_rider_id_created_at', table_name='trips')
+    op.drop_table('trips')
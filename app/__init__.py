@@ -1,5 +1,12 @@
 from .auth import router as auth_router
 from .support import router as support_router
 from .preferences import router as preferences_router
+from .admin import router as admin_router
+from .metrics import router as metrics_router, MetricsMiddleware
+from .jwks import router as jwks_router
+from .drivers import router as drivers_router
+from .rides import router as rides_router
 
-__all__ = ["auth_router", "support_router", "preferences_router"]
+__all__ = ["auth_router", "support_router", "preferences_router", "admin_router", "metrics_router",
+           "jwks_router", "drivers_router", "rides_router",
+           "MetricsMiddleware"]
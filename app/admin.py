@@ -0,0 +1,99 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import bulk, crud, user_cache
+from crud.search import search_users
+from crud.support import list_support_messages
+from schemas import BulkPreferencesSchema, UserRoleSchema
+from sql_app import get_async_session, get_session_maker
+from .dependencies import require_admin
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+async def _stream_with_session(stream, *args, **kwargs):
+    # Зависимости с yield закрываются до отправки StreamingResponse (FastAPI >= 0.106),
+    # поэтому потоковый ответ открывает собственную сессию на время передачи
+    async with get_session_maker()() as session:
+        async for chunk in stream(session, *args, **kwargs):
+            yield chunk
+
+
+# Импорт пользователей: тело запроса — CSV (с заголовком) или JSONL, читается потоково
+@router.post("/users/import")
+async def import_users(
+        request: Request,
+        format: Literal['csv', 'jsonl'] = 'csv',
+        method: Literal['copy', 'insert'] = 'copy',
+        session: AsyncSession = Depends(get_async_session)
+):
+    records = bulk.iter_records(bulk.iter_lines(request.stream()), format)
+    report = await bulk.import_users(session, records, method=method)
+    return report.as_dict()
+
+
+# Поиск пользователей: префикс телефона/почты, подстрока имени; следующая страница — after_id=next_after_id
+@router.get("/users")
+async def find_users(
+        phone: Optional[str] = None,
+        email: Optional[str] = None,
+        name: Optional[str] = None,
+        after_id: Optional[int] = None,
+        limit: int = Query(default=100, ge=1, le=1000)
+):
+    return StreamingResponse(_stream_with_session(search_users, phone=phone, email=email, name=name,
+                                                  after_id=after_id, limit=limit),
+                             media_type='application/json')
+
+
+# Назначение роли: водителем становится пользователь с role='driver'
+@router.put("/users/{user_id}/role")
+async def set_user_role(user_id: int, payload: UserRoleSchema, session: AsyncSession = Depends(get_async_session)):
+    updated = await crud.update_role(session, user_id, payload.role)
+    if not updated:
+        raise HTTPException(status_code=404, detail='Пользователь не найден')
+    user_id, phone, email = updated
+    user_cache.invalidate(user_id=user_id, phone=phone, email=email)
+    return {"message": "Роль пользователя изменена."}
+
+
+# Массовая смена языка/уведомлений (например, перевести город на узбекский) одним UPDATE
+@router.patch("/users/preferences")
+async def bulk_update_preferences(changes: BulkPreferencesSchema, session: AsyncSession = Depends(get_async_session)):
+    if changes.user_ids is None and not changes.phone_prefix:
+        raise HTTPException(status_code=400, detail="Необходимо указать user_ids или phone_prefix.")
+    values = changes.model_dump(include={'language', 'notifications_enabled'}, exclude_none=True)
+    if not values:
+        raise HTTPException(status_code=400, detail="Необходимо указать language или notifications_enabled.")
+
+    updated = await crud.bulk_update_preferences(session, values, user_ids=changes.user_ids,
+                                                 phone_prefix=changes.phone_prefix)
+    # Затронутых пользователей может быть очень много — проще сбросить локальный кэш целиком
+    if updated:
+        user_cache.clear()
+    return {'updated': updated}
+
+
+# Экспорт пользователей без загрузки всей таблицы в память
+@router.get("/users/export")
+async def export_users(format: Literal['csv', 'jsonl'] = 'csv'):
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(_stream_with_session(bulk.export_users, format), media_type=media_type,
+                             headers={'Content-Disposition': f'attachment; filename="users.{format}"'})
+
+
+# Лента службы поддержки (все сообщения или одного пользователя), от новых к старым
+@router.get("/support/messages")
+async def support_messages(
+        user_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = Query(default=50, ge=1, le=500),
+        session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        messages, next_cursor = await list_support_messages(session, user_id=user_id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'messages': messages, 'next_cursor': next_cursor}
@@ -1,59 +1,68 @@
 from typing import Optional
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import HTTPException, Depends, APIRouter
+from fastapi import HTTPException, Depends, APIRouter, Request, Header
 
 import core
-from crud import crud
+from crud import crud, tokens, user_cache
 from models import User
 from sql_app import get_async_session
-from services import send_email_verification_code, client, TWILIO_PHONE_NUMBER
-from schemas import UserCreateSchema, TokenSchema, UserLoginSchema, VerifyCodeSchema
-from core import generate_verification_code, hash_password, verify_password, create_access_token
+from services import send_email_verification_code, send_sms, verification_store
+from schemas import UserCreateSchema, TokenSchema, UserLoginSchema, VerifyCodeSchema, RefreshTokenSchema
+from core.rate_limit import rate_limiter, resolve_client_ip, trusted_proxies
+from core import generate_verification_code, hash_password_async, verify_and_update_password_async
+from core.config import PASSWORD_REHASH_ON_LOGIN
+from .dependencies import CurrentUser, get_current_user
+from .idempotency import idempotent
 
 router = APIRouter()
-verification_codes = {}
+
+
+def client_ip(request: Request) -> Optional[str]:
+    peer = request.client.host if request.client else None
+    return resolve_client_ip(peer, request.headers.get('x-forwarded-for'), trusted_proxies)
+
+
+# Клиент повторяет запрос с тем же ключом — получает первый ответ, а не второе SMS или вторую регистрацию
+IdempotencyKey = Header(default=None, alias='Idempotency-Key', max_length=255)
 
 
 # Отправка кода подтверждения
 @router.post("/auth/send-code")
 async def send_verification_code(
-        phone: Optional[str] = None, email: Optional[str] = None
+        request: Request, phone: Optional[str] = None, email: Optional[str] = None,
+        idempotency_key: Optional[str] = IdempotencyKey
 ):
     """
     Пользователь передает либо телефон, либо email для отправки кода.
     """
+    return await idempotent('send_code', idempotency_key, phone or email, {'phone': phone, 'email': email},
+                            lambda: _send_verification_code(request, phone, email))
+
+
+async def _send_verification_code(request: Request, phone: Optional[str], email: Optional[str]):
     if not phone and not email:
         raise HTTPException(
             status_code=400, detail="Необходимо указать либо телефон, либо электронную почту."
         )
+    await rate_limiter.check('send_code', phone, email, ip=client_ip(request))
 
     code = core.utils.generate_verification_code()  # функция генерации кода, например, 6 цифр
-    print('code---------------------------------->', code)
     # Отправляем код на телефон
     if phone:
-        print('phone----------------------------------------->', phone)
-        verification_codes[phone] = code
+        await verification_store.save(phone, code)
         try:
-            print('client--------------------------->', client)
-            print(f"Отправка SMS на {phone} с кодом {code}")
-            client.messages.create(
-                body=f"Ваш код подтверждения: {code}",
-                from_=TWILIO_PHONE_NUMBER,
-                to=phone
-            )
+            await send_sms(phone, f"Ваш код подтверждения: {code}")
             return {"message": "Код подтверждения отправлен на телефон."}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Ошибка отправки SMS: {e}")
 
     # Отправляем код на email
     if email:
-        verification_codes[email] = code
-        try:
-            # Пример отправки через SMTP:
-            send_email_verification_code(email, code)
-            return {"message": "Код подтверждения отправлен на почту."}
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Ошибка отправки кода на почту: {e}")
+        await verification_store.save(email, code)
+        # Письмо ставится в очередь и отправляется фоновым воркером
+        send_email_verification_code(email, code)
+        return {"message": "Код подтверждения отправлен на почту."}
 
 
 # Проверка кода подтверждения
@@ -62,34 +71,33 @@ async def verify_code(payload: VerifyCodeSchema):
     """
     Пользователь подтверждает код, отправленный на телефон или почту.
     """
-    if payload.phone and verification_codes.get(payload.phone) == payload.code:
-        del verification_codes[payload.phone]  # Удаляем код после успешной верификации
+    if payload.phone and await verification_store.verify(payload.phone, payload.code):
         return {"message": "Код подтвержден. Теперь можно завершить регистрацию."}
-    elif payload.email and verification_codes.get(payload.email) == payload.code:
-        del verification_codes[payload.email]  # Удаляем код после успешной верификации
+    elif payload.email and await verification_store.verify(payload.email, payload.code):
         return {"message": "Код подтвержден. Теперь можно завершить регистрацию."}
     else:
         raise HTTPException(status_code=400, detail="Неверный код подтверждения.")
 
 
 @router.post("/signup", response_model=TokenSchema)
-async def signup(user: UserCreateSchema, session: AsyncSession = Depends(get_async_session)):
+async def signup(user: UserCreateSchema, session: AsyncSession = Depends(get_async_session),
+                 idempotency_key: Optional[str] = IdempotencyKey):
     """
     Завершение регистрации: пользователь вводит имя, фамилию и пароль после подтверждения номера телефона или почты.
     """
+    return await idempotent('signup', idempotency_key, user.phone or user.email, user.model_dump(),
+                            lambda: _signup(user, session))
+
+
+async def _signup(user: UserCreateSchema, session: AsyncSession) -> dict:
     if not user.phone and not user.email:
         raise HTTPException(status_code=400, detail="Нужно указать либо телефон, либо почту.")
 
-    db_user = None
-    if user.email:
-        db_user = await crud.get_user_by_email(session, user.email)
-    elif user.phone:
-        db_user = await crud.get_user_by_phone(session, user.phone)
-
+    db_user = await crud.get_login_identity(session, email=user.email, phone=user.phone)
     if db_user:
         raise HTTPException(status_code=400, detail="Пользователь с такими данными уже существует.")
 
-    hashed_password = hash_password(user.password)  # Хешируем пароль
+    hashed_password = await hash_password_async(user.password)  # Хешируем пароль
     new_user = User(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -102,39 +110,65 @@ async def signup(user: UserCreateSchema, session: AsyncSession = Depends(get_asy
         session.add(new_user)
         await session.commit()
         await session.refresh(new_user)
+    except IntegrityError:
+        # Параллельная регистрация с тем же телефоном или почтой успела раньше
+        await session.rollback()
+        raise HTTPException(status_code=409, detail="Пользователь с такими данными уже существует.")
     except Exception as e:
         raise HTTPException(status_code=500, detail="Ошибка при регистрации")
+    user_cache.invalidate(new_user)  # Сбрасываем закэшированное "пользователь не найден"
 
-    # Создаем JWT-токен после успешной регистрации
-    access_token = create_access_token(data={"sub": new_user.email if new_user.email else new_user.phone})
-    return {"access_token": access_token, "token_type": "Bearer"}
+    # Создаем JWT-токен и refresh-токен после успешной регистрации
+    return await tokens.issue_tokens(session, new_user.id, new_user.email if new_user.email else new_user.phone)
 
 
 # Логика для входа пользователя
 @router.post("/login", response_model=TokenSchema)
-async def login(user: UserLoginSchema, session: AsyncSession = Depends(get_async_session)):
+async def login(request: Request, user: UserLoginSchema, session: AsyncSession = Depends(get_async_session)):
     """
     Пользователь может войти с номером телефона или электронной почтой и паролем.
     """
     if not user.phone and not user.email:
         raise HTTPException(status_code=400, detail="Необходимо указать либо телефон, либо электронную почту.")
+    await rate_limiter.check('login', user.phone, user.email, ip=client_ip(request))
 
-    db_user = None
-    if user.email:
-        db_user = await crud.get_user_by_email(session, user.email)
-    elif user.phone:
-        db_user = await crud.get_user_by_phone(session, user.phone)
-
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+    db_user = await crud.get_login_identity(session, email=user.email, phone=user.phone)
+    if not db_user:
         raise HTTPException(status_code=400, detail='Некорректный номер телефона, email или пароль')
+    valid, new_hash = await verify_and_update_password_async(user.password, db_user.hashed_password)
+    if not valid:
+        raise HTTPException(status_code=400, detail='Некорректный номер телефона, email или пароль')
+
+    # Хеш устаревшей схемы или стоимости пересчитываем, пока пароль известен
+    if new_hash and PASSWORD_REHASH_ON_LOGIN:
+        if await crud.update_password_hash(session, db_user.id, db_user.hashed_password, new_hash):
+            user_cache.invalidate(user_id=db_user.id, phone=user.phone, email=user.email)
+
+    # Если пользователь прошел все проверки, выдаем токены
+    return await tokens.issue_tokens(session, db_user.id, user.email if user.email else user.phone)
+
 
-    # Если пользователь прошел все проверки, выдаем токен
-    access_token = create_access_token(data={'sub': user.email if user.email else user.phone})
-    return {'access_token': access_token, 'token_type': 'Bearer'}
+# Новая пара токенов по refresh-токену, без пароля и bcrypt; старый refresh-токен гасится
+@router.post("/auth/refresh", response_model=TokenSchema)
+async def refresh_tokens(payload: RefreshTokenSchema, session: AsyncSession = Depends(get_async_session)):
+    issued = await tokens.rotate_refresh_token(session, payload.refresh_token)
+    if issued is None:
+        raise HTTPException(status_code=401, detail="Недействительный refresh-токен.")
+    return issued
+
+
+# Выход: сессия отзывается, ее access- и refresh-токены перестают приниматься
+@router.post("/auth/logout")
+async def logout(current_user: CurrentUser = Depends(get_current_user),
+                 session: AsyncSession = Depends(get_async_session)):
+    if current_user.sid:
+        await tokens.revoke_sessions(session, current_user.id, [current_user.sid])
+    return {"message": "Вы вышли из аккаунта."}
 
 
 @router.post("/auth/reset-password")
 async def reset_password(
+        request: Request,
         phone: Optional[str] = None,
         email: Optional[str] = None,
         session: AsyncSession = Depends(get_async_session)
@@ -144,6 +178,7 @@ async def reset_password(
     """
     if not phone and not email:
         raise HTTPException(status_code=400, detail="Необходимо указать либо телефон, либо электронную почту.")
+    await rate_limiter.check('reset_password', phone, email, ip=client_ip(request))
 
     code = generate_verification_code()  # Генерируем код
 
@@ -152,12 +187,11 @@ async def reset_password(
         user = await crud.get_user_by_phone(session, phone)
         if not user:
             raise HTTPException(status_code=404, detail="Пользователь не найден.")
-        verification_codes[phone] = code
-        client.messages.create(
-            body=f"Ваш код для сброса пароля: {code}",
-            from_=TWILIO_PHONE_NUMBER,
-            to=phone
-        )
+        await verification_store.save(phone, code)
+        try:
+            await send_sms(phone, f"Ваш код для сброса пароля: {code}")
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Ошибка отправки SMS: {e}")
         return {"message": "Код подтверждения отправлен на телефон."}
 
     # Отправляем код на email
@@ -165,7 +199,7 @@ async def reset_password(
         user = await crud.get_user_by_email(session, email)
         if not user:
             raise HTTPException(status_code=404, detail="Пользователь не найден.")
-        verification_codes[email] = code
+        await verification_store.save(email, code)
         send_email_verification_code(email, code)
         return {"message": "Код подтверждения отправлен на почту."}
 
@@ -179,24 +213,27 @@ async def change_password(
     """
     Изменение пароля после подтверждения кода.
     """
-    if payload.phone and verification_codes.get(payload.phone) == payload.code:
-        user = await crud.get_user_by_phone(session, payload.phone)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден.")
-
-        user.hashed_password = hash_password(new_password)  # Хешируем новый пароль
-        del verification_codes[payload.phone]  # Удаляем код после успешной верификации
-        await session.commit()
-        return {"message": "Пароль успешно изменен."}
-
-    elif payload.email and verification_codes.get(payload.email) == payload.code:
-        user = await crud.get_user_by_email(session, payload.email)
-        if not user:
-            raise HTTPException(status_code=404, detail="Пользователь не найден.")
+    # Код проверяется и удаляется атомарно, поэтому повторно использовать его нельзя
+    if payload.phone and await verification_store.verify(payload.phone, payload.code):
+        key = payload.phone
+        user = await crud.get_user_by_phone(session, payload.phone, use_cache=False)
+    elif payload.email and await verification_store.verify(payload.email, payload.code):
+        key = payload.email
+        user = await crud.get_user_by_email(session, payload.email, use_cache=False)
+    else:
+        raise HTTPException(status_code=400, detail="Неверный код подтверждения.")
 
-        user.hashed_password = hash_password(new_password)  # Хешируем новый пароль
-        del verification_codes[payload.email]  # Удаляем код после успешной верификации
-        await session.commit()
-        return {"message": "Пароль успешно изменен."}
+    if not user:
+        raise HTTPException(status_code=404, detail="Пользователь не найден.")
 
-    raise HTTPException(status_code=400, detail="Неверный код подтверждения.")
+    # Хешируем только после проверки кода, чтобы неверные коды не тратили время пула хеширования.
+    # Если пул перегружен (503), код возвращается: пароль не изменен, и запрос можно повторить
+    try:
+        user.hashed_password = await hash_password_async(new_password)
+    except Exception:
+        await verification_store.save(key, payload.code)
+        raise
+    await session.commit()
+    user_cache.invalidate(user)
+    await tokens.revoke_user_sessions(session, user.id)  # Старые сессии после смены пароля недействительны
+    return {"message": "Пароль успешно изменен."}
@@ -0,0 +1,80 @@
+import hmac
+import time
+from typing import NamedTuple, Optional, Tuple
+
+from jose import JWTError
+from fastapi import Depends, Header, HTTPException
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import crud
+from core import decode_access_token
+from core.cache import LRUTTLCache, MISSING
+from core.revocation import revocation_list
+from core.config import TOKEN_CACHE_MAX_SIZE, ADMIN_API_TOKEN
+from sql_app import get_async_session
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+# token -> CurrentUser; запись живет до истечения токена, поэтому повторные запросы
+# с тем же токеном не проверяют подпись и не обращаются к базе
+token_cache = LRUTTLCache(TOKEN_CACHE_MAX_SIZE, ttl=0)
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    sub: str
+    sid: Optional[str] = None  # сессия refresh-токена; у старых токенов ее нет
+
+
+def _unauthorized(detail: str = "Не удалось проверить токен.") -> HTTPException:
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def get_current_user(
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+        session: AsyncSession = Depends(get_async_session)
+) -> CurrentUser:
+    if credentials is None:
+        raise _unauthorized("Требуется авторизация.")
+
+    return await authenticate_token(credentials.credentials, session)
+
+
+async def authenticate_token(token: str, session: AsyncSession) -> CurrentUser:
+    """Пользователь по access-токену (HTTPException 401, если токен недействителен или сессия отозвана)."""
+    current_user = token_cache.get(token)
+    if current_user is MISSING:
+        current_user, expires_in = await _authenticate(token, session)
+        token_cache.set(token, current_user, ttl=expires_in)
+
+    # Отзыв сессии проверяется и для токенов из кэша: это поиск в словаре, без запроса к базе
+    if current_user.sid and revocation_list.is_revoked(current_user.sid):
+        raise _unauthorized("Сессия завершена, войдите заново.")
+    return current_user
+
+
+async def _authenticate(token: str, session: AsyncSession) -> Tuple[CurrentUser, float]:
+    """Проверяет подпись токена; возвращает пользователя и сколько секунд токен еще действителен."""
+    try:
+        claims = decode_access_token(token)
+    except JWTError:
+        raise _unauthorized()
+
+    sub = claims.get('sub')
+    user_id = claims.get('uid')
+    if user_id is None and sub:
+        # Токены, выданные до появления uid: ищем пользователя по email или телефону
+        identity = await crud.get_login_identity(session, email=sub if '@' in sub else None,
+                                                 phone=None if '@' in sub else sub)
+        user_id = identity.id if identity else None
+    if user_id is None:
+        raise _unauthorized()
+
+    return CurrentUser(user_id, sub, claims.get('sid')), claims['exp'] - time.time()
+
+
+# Доступ к административным эндпоинтам по общему токену из ADMIN_API_TOKEN
+async def require_admin(x_admin_token: Optional[str] = Header(default=None)):
+    if not ADMIN_API_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Доступ запрещен.")
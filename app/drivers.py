@@ -0,0 +1,156 @@
+import time
+import asyncio
+from typing import Dict, Optional, Set, Tuple
+
+from jose import jwt
+from pydantic import ValidationError
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import crud, breadcrumb_writer
+from crud.trips import list_trips
+from core.revocation import revocation_list
+from schemas import DriverLocationSchema
+from services.geo_index import driver_index
+from services.matching import Assignment, matching_engine
+from sql_app import get_async_session, get_session_maker
+from .dependencies import CurrentUser, authenticate_token, get_current_user
+
+router = APIRouter()
+
+# Коды закрытия WebSocket из диапазона приложения (4000-4999)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_REPLACED = 4409
+
+# driver_id -> текущее соединение водителя; повторное подключение закрывает предыдущее
+_connections: Dict[int, WebSocket] = {}
+_notifications: Set[asyncio.Task] = set()
+
+
+def _notify_driver(assignment: Assignment):
+    # Отправка не должна задерживать тик распределения, поэтому идет отдельной задачей
+    websocket = _connections.get(assignment.driver_id)
+    if websocket is None:
+        return
+    task = asyncio.create_task(websocket.send_json({
+        'type': 'assignment', 'request_id': assignment.request_id, 'rider_id': assignment.rider_id,
+        'distance': round(assignment.distance), 'eta': round(assignment.eta),
+    }))
+    _notifications.add(task)
+    task.add_done_callback(_notifications.discard)
+
+
+matching_engine.subscribe(_notify_driver)
+
+
+def _token_from(websocket: WebSocket, token: Optional[str]) -> Optional[str]:
+    # Браузерный WebSocket не умеет ставить заголовки, поэтому токен можно передать и в ?token=
+    if token:
+        return token
+    scheme, _, credentials = websocket.headers.get('authorization', '').partition(' ')
+    return credentials if scheme.lower() == 'bearer' and credentials else None
+
+
+async def _authenticate_driver(token: str) -> Tuple[Optional[CurrentUser], int]:
+    # Сессия нужна только на время проверки, а не на все время соединения
+    async with get_session_maker()() as session:
+        try:
+            current_user = await authenticate_token(token, session)
+        except HTTPException:
+            return None, CLOSE_UNAUTHORIZED
+        user = await crud.get_user_by_id(session, current_user.id)
+    if user is None or user.role != 'driver':
+        return None, CLOSE_FORBIDDEN
+    return current_user, 0
+
+
+@router.websocket("/ws/drivers/location")
+async def driver_location(websocket: WebSocket, token: Optional[str] = None):
+    """
+    Водитель присылает {"lat": ..., "lon": ..., "available": true} каждые несколько секунд.
+    Позиция сразу попадает в индекс свободных водителей, а в трек (gps_breadcrumbs) — пачкой
+    через буфер; ответа на каждое сообщение нет. При отключении или available=false
+    водитель убирается из индекса.
+    Назначенный заказ приходит сообщением {"type": "assignment", ...}; водитель при этом
+    убирается из индекса и считается занятым, пока не пришлет release=true (поездка завершена
+    или отменена, ответ {"type": "released", ...}). Занятость хранится на сервере и переживает
+    переподключение: до release available=true игнорируется.
+    Соединение закрывается, когда истекает access-токен или отзывается его сессия:
+    клиент переподключается с новым токеном.
+    """
+    token = _token_from(websocket, token)
+    driver, close_code = await _authenticate_driver(token) if token else (None, CLOSE_UNAUTHORIZED)
+    if driver is None:
+        await websocket.close(code=close_code)
+        return
+    expires_at = jwt.get_unverified_claims(token)['exp']
+
+    await websocket.accept()
+    previous = _connections.get(driver.id)
+    _connections[driver.id] = websocket
+    if previous is not None:
+        try:
+            await previous.close(code=CLOSE_REPLACED)
+        except RuntimeError:
+            pass  # Предыдущее соединение уже закрыто
+    try:
+        while True:
+            message = await websocket.receive_text()
+            if time.time() >= expires_at or (driver.sid and revocation_list.is_revoked(driver.sid)):
+                await websocket.close(code=CLOSE_UNAUTHORIZED)
+                break
+            try:
+                location = DriverLocationSchema.model_validate_json(message)
+            except ValidationError:
+                await websocket.send_json({'error': 'Некорректное сообщение с координатами.'})
+                continue
+            if location.release:
+                request_id = matching_engine.release(driver.id)
+                if request_id is not None:
+                    await websocket.send_json({'type': 'released', 'request_id': request_id})
+            # Занятый водитель не возвращается в индекс, даже если клиент прислал available=true
+            available = location.available and not matching_engine.is_busy(driver.id)
+            if available:
+                driver_index.update(driver.id, location.lat, location.lon)
+            else:
+                driver_index.remove(driver.id)
+            # Трек для разбора споров и аналитики; если база отстает, точка может быть прорежена
+            breadcrumb_writer.record(driver.id, location.lat, location.lon, available)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if _connections.get(driver.id) is websocket:
+            del _connections[driver.id]
+            driver_index.remove(driver.id)
+
+
+# Ближайшие свободные водители для экрана заказа
+@router.get("/drivers/nearby")
+async def nearby_drivers(
+        lat: float = Query(ge=-90, le=90),
+        lon: float = Query(ge=-180, le=180),
+        k: int = Query(default=10, ge=1, le=100),
+        radius: float = Query(default=3000, gt=0, le=20000),
+        current_user: CurrentUser = Depends(get_current_user)
+):
+    return {"drivers": [driver._asdict() for driver in driver_index.nearest(lat, lon, k, radius)]}
+
+
+# Поездки водителя, от новых к старым; следующая страница — cursor=next_cursor
+@router.get("/drivers/trips")
+async def driver_trips(
+        cursor: Optional[str] = None,
+        limit: int = Query(default=20, ge=1, le=100),
+        current_user: CurrentUser = Depends(get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        trips, next_cursor = await list_trips(session, driver_id=current_user.id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'trips': trips, 'next_cursor': next_cursor}
+
+
+def connected_drivers() -> int:
+    return len(_connections)
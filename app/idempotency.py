@@ -0,0 +1,110 @@
+import json
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from fastapi import HTTPException
+
+from core.cache import LRUTTLCache, MISSING
+from core.config import IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL
+
+
+class IdempotencyKeyReused(Exception):
+    """Ключ уже использован для запроса с другими параметрами."""
+
+
+def request_fingerprint(payload: dict) -> str:
+    """Отпечаток параметров запроса: повтор с тем же ключом должен совпадать с первым запросом."""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Ответы на запросы с заголовком Idempotency-Key в памяти процесса. Повтор в пределах ttl
+    получает сохраненный ответ; повтор, пришедший, пока первый запрос еще выполняется,
+    ждет его результата, а не выполняет запрос второй раз. Сохраняются успешные ответы
+    и ошибки клиента (4xx); после 5xx или исключения повтор выполняется заново.
+    Число ключей ограничено, давно не использованные вытесняются.
+    """
+
+    def __init__(self, max_keys: int, ttl: float):
+        # scope — (маршрут, вызывающий); (scope, key) -> (fingerprint, ответ или HTTPException)
+        self._responses = LRUTTLCache(max_keys, ttl)
+        # (scope, key) -> (fingerprint, future) запросов, которые выполняются прямо сейчас
+        self._in_flight: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+        self.coalesced = 0
+
+    async def run(self, scope: Hashable, key: str, fingerprint: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        cache_key = (scope, key)
+        while True:
+            stored = self._responses.get(cache_key)
+            if stored is not MISSING:
+                return self._replay(stored, fingerprint)
+            in_flight = self._in_flight.get(cache_key)
+            if in_flight is None:
+                break
+            in_flight_fingerprint, future = in_flight
+            if in_flight_fingerprint != fingerprint:
+                raise IdempotencyKeyReused("Idempotency-Key уже используется запросом с другими параметрами.")
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Первый запрос отменен (клиент отключился) — выполняем сами; собственная отмена пробрасывается
+                if not future.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[cache_key] = (fingerprint, future)
+        try:
+            result = await call()
+        except HTTPException as e:
+            if e.status_code < 500:
+                self._responses.set(cache_key, (fingerprint, e))
+            future.set_exception(e)
+            raise
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+            raise
+        else:
+            self._responses.set(cache_key, (fingerprint, result))
+            future.set_result(result)
+            return result
+        finally:
+            del self._in_flight[cache_key]
+            # Исключение забирают ожидающие повторы; если их нет, asyncio не должен ругаться
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    @staticmethod
+    def _replay(stored: tuple, fingerprint: str) -> Any:
+        stored_fingerprint, result = stored
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReused("Idempotency-Key уже использован для запроса с другими параметрами.")
+        if isinstance(result, HTTPException):
+            raise HTTPException(status_code=result.status_code, detail=result.detail, headers=result.headers)
+        return result
+
+    def stats(self) -> dict:
+        return dict(self._responses.stats(), in_flight=len(self._in_flight), coalesced=self.coalesced)
+
+
+idempotency_store = IdempotencyStore(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL)
+
+
+async def idempotent(scope: str, key: Optional[str], caller: Optional[str], payload: dict,
+                     call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Выполняет call с учетом Idempotency-Key; без ключа — просто выполняет. Ключ действует
+    в пределах маршрута и вызывающего (caller: id пользователя, телефон или почта), чтобы
+    клиенты, случайно выбравшие одинаковый ключ, не получали ответы друг друга.
+    """
+    if not key:
+        return await call()
+    try:
+        return await idempotency_store.run((scope, caller), key, request_fingerprint(payload), call)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
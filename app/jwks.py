@@ -0,0 +1,22 @@
+import json
+import hashlib
+from typing import Optional
+from fastapi import APIRouter, Header, Response
+
+from core.config import JWKS_MAX_AGE
+from core.keys import key_ring
+from core.utils import ALGORITHM
+
+router = APIRouter()
+
+
+# Открытые ключи подписи JWT: другие сервисы проверяют токены сами, без запроса к этому API.
+# При HS256 список пуст — общий секрет не публикуется
+@router.get("/.well-known/jwks.json")
+async def jwks(if_none_match: Optional[str] = Header(default=None)):
+    body = json.dumps(key_ring.jwks() if ALGORITHM != 'HS256' else {'keys': []}, separators=(',', ':'))
+    etag = '"' + hashlib.sha256(body.encode()).hexdigest()[:32] + '"'
+    headers = {'Cache-Control': f'public, max-age={JWKS_MAX_AGE}', 'ETag': etag}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type='application/json', headers=headers)
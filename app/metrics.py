@@ -0,0 +1,114 @@
+import time
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core import hashing_pool
+from core.metrics import registry, render_prometheus, HTTP_REQUESTS, HTTP_LATENCY
+from core.rate_limit import rate_limiter
+from core.revocation import revocation_list
+from crud import user_cache, support_buffer, trip_buffer, breadcrumb_writer
+from services import email_dispatcher
+from services.geo_index import driver_index
+from services.matching import matching_engine
+from sql_app import get_pool_stats
+from .dependencies import token_cache
+from .idempotency import idempotency_store
+from .drivers import connected_drivers
+
+router = APIRouter()
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: счетчик и гистограмма задержек по шаблону маршрута
+    (/auth/send-code, а не конкретный URL), чтобы число меток оставалось ограниченным.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get('route')
+            path = route.path if route is not None else 'unmatched'
+            HTTP_LATENCY.observe(time.perf_counter() - started, scope['method'], path)
+            HTTP_REQUESTS.inc(scope['method'], path, str(status))
+
+
+@registry.gauge_collector
+def _collect_runtime_gauges():
+    hashing = hashing_pool.stats()
+    database = get_pool_stats()
+    users = user_cache.stats()
+    tokens = token_cache.stats()
+    email = email_dispatcher.stats()
+    support = support_buffer.stats()
+    idempotency = idempotency_store.stats()
+    return [
+        ('password_hash_pool_in_flight', 'Задачи в пуле хеширования', {}, hashing['in_flight']),
+        ('password_hash_pool_utilisation', 'Доля занятых воркеров пула хеширования', {}, hashing['utilisation']),
+        ('db_pool_checked_out', 'Соединения БД, выданные из пула', {}, database['checked_out']),
+        ('db_pool_overflow', 'Соединения БД сверх pool_size', {}, database['overflow']),
+        ('db_pool_checkouts', 'Всего выдач соединений из пула', {}, database['checkouts']),
+        ('db_pool_wait_seconds_max', 'Максимальное ожидание соединения', {}, database['max_wait_ms'] / 1000),
+        ('db_pool_timeouts', 'Таймауты ожидания соединения', {}, database['timeouts']),
+        ('cache_hits', 'Попадания в кэш', {'cache': 'users'}, users['hits']),
+        ('cache_misses', 'Промахи кэша', {'cache': 'users'}, users['misses']),
+        ('cache_hits', 'Попадания в кэш', {'cache': 'tokens'}, tokens['hits']),
+        ('cache_misses', 'Промахи кэша', {'cache': 'tokens'}, tokens['misses']),
+        ('cache_hits', 'Попадания в кэш', {'cache': 'idempotency'}, idempotency['hits']),
+        ('cache_misses', 'Промахи кэша', {'cache': 'idempotency'}, idempotency['misses']),
+        ('idempotency_coalesced', 'Повторы, дождавшиеся выполняющегося запроса', {}, idempotency['coalesced']),
+        ('email_queue_size', 'Письма в очереди на отправку', {}, email['queued']),
+        ('write_behind_pending', 'Строки, ожидающие записи в базу', {'buffer': 'support_messages'},
+         support['pending']),
+        ('write_behind_pending', 'Строки, ожидающие записи в базу', {'buffer': 'trips'}, trip_buffer.pending),
+        ('write_behind_pending', 'Строки, ожидающие записи в базу', {'buffer': 'gps_breadcrumbs'},
+         breadcrumb_writer.pending),
+        ('trips_lost', 'Поездки, не попавшие в историю: буфер переполнен или база отвергла строку', {},
+         trip_buffer.rejected + trip_buffer.dropped),
+        ('rate_limit_rejected', 'Запросы, отклоненные rate limiter', {}, rate_limiter.rejected),
+        ('revoked_sessions', 'Отозванные сессии в памяти воркера', {}, len(revocation_list)),
+        ('drivers_connected', 'Открытые WebSocket-соединения водителей', {}, connected_drivers()),
+        ('drivers_available', 'Свободные водители в пространственном индексе', {}, len(driver_index)),
+        ('matching_pending', 'Заказы, ожидающие назначения водителя', {}, matching_engine.stats()['pending']),
+    ]
+
+
+# Метрики всех воркеров в текстовом формате Prometheus
+@router.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(render_prometheus(registry.collect()), media_type='text/plain; version=0.0.4')
+
+
+# Состояние пула хеширования паролей: загрузка, очередь, задержки
+@router.get("/metrics/hashing")
+async def hashing_metrics():
+    return hashing_pool.stats()
+
+
+# Состояние пула соединений с БД: занятые соединения, overflow, время ожидания
+@router.get("/metrics/database")
+async def database_metrics():
+    return get_pool_stats()
+
+
+# Кэши пользователей, проверенных токенов и ответов по Idempotency-Key: размер и доля попаданий
+@router.get("/metrics/cache")
+async def cache_metrics():
+    return {'users': user_cache.stats(), 'tokens': token_cache.stats(), 'idempotency': idempotency_store.stats()}
@@ -1,21 +1,27 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException
 
-from crud import crud
+from crud import crud, user_cache
 from sql_app.database import get_async_session
 from schemas import UserPreferencesSchema
+from .dependencies import CurrentUser, get_current_user
 
 router = APIRouter()
 
 
 # Эндпоинт для обновления предпочтений пользователя
 @router.put("/auth/preferences")
-async def update_user_preferences(preferences: UserPreferencesSchema, session: AsyncSession = Depends(get_async_session)):
-    db_user = await crud.get_user_by_phone(preferences.phone)
-    if not db_user:
+async def update_user_preferences(
+        preferences: UserPreferencesSchema,
+        current_user: CurrentUser = Depends(get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    # Один запрос к базе вместо загрузки пользователя и сохранения ORM-объекта
+    updated = await crud.update_preferences(session, current_user.id, preferences.language,
+                                            preferences.notifications_enabled)
+    if not updated:
         raise HTTPException(status_code=404, detail='Пользователь не найден')
 
-    db_user.language = preferences.language
-    db_user.notifications_enabled = preferences.notifications_enabled
-    await session.commit()
+    user_id, phone, email = updated
+    user_cache.invalidate(user_id=user_id, phone=phone, email=email)
     return {"message": "Предпочтения успешно обновлены."}
@@ -0,0 +1,152 @@
+import logging
+from typing import Optional
+
+import orjson
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import FARE_BATCH_MAX_PAIRS
+from core.rate_limit import rate_limiter
+from crud import crud
+from crud.trips import list_trips, submit_trip
+from schemas import RideRequestSchema, FareEstimateSchema
+from services.fares import estimate_fares, tariff_store
+from services.matching import Assignment, PendingRequestExists, matching_engine
+from sql_app import get_async_session
+from sql_app.write_behind import WriteBehindFull
+from .dependencies import CurrentUser, get_current_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/rides")
+
+
+def _record_trip(assignment: Assignment):
+    # Назначенный заказ становится поездкой в истории; запись идет через буфер, тик не ждет базу
+    try:
+        submit_trip(assignment.request_id, assignment.rider_id, assignment.driver_id, assignment.lat,
+                    assignment.lon, assignment.distance)
+    except WriteBehindFull:
+        # Поездка не попадет в историю (счетчик trips_lost); данные в логе, чтобы ее можно было восстановить
+        logger.error(f"Поездка не записана, буфер trips переполнен: {assignment}")
+
+
+matching_engine.subscribe(_record_trip)
+
+
+def _status_response(request_id: str, status) -> dict:
+    response = {"request_id": request_id, "status": status.state}
+    if status.assignment is not None:
+        response.update(driver_id=status.assignment.driver_id, distance=round(status.assignment.distance),
+                        eta=round(status.assignment.eta))
+    return response
+
+
+# Заказ ставится в очередь распределения; водитель назначается на ближайшем тике.
+# У пассажира не больше одного ожидающего заказа: на повтор — 409 и Location текущего заказа
+@router.post("/requests", status_code=202)
+async def create_ride_request(
+        payload: RideRequestSchema,
+        current_user: CurrentUser = Depends(get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    await rate_limiter.check('ride_request', str(current_user.id))
+    user = await crud.get_user_by_id(session, current_user.id)
+    if user is None or user.role != 'rider':
+        raise HTTPException(status_code=403, detail="Заказывать поездки могут только пассажиры.")
+    try:
+        request = matching_engine.submit(current_user.id, payload.lat, payload.lon)
+    except PendingRequestExists as e:
+        raise HTTPException(status_code=409, detail="У вас уже есть заказ в ожидании.",
+                            headers={"Location": f"{router.prefix}/requests/{e.request_id}"})
+    return {"request_id": request.request_id, "status": "pending"}
+
+
+# Состояние заказа; с wait > 0 ответ приходит, как только назначен водитель (long polling)
+@router.get("/requests/{request_id}")
+async def get_ride_request(request_id: str, wait: float = Query(default=0, ge=0, le=30),
+                           current_user: CurrentUser = Depends(get_current_user)):
+    status = await matching_engine.wait(request_id, wait) if wait else matching_engine.status(request_id)
+    if status is None or status.rider_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Заказ не найден.")
+    return _status_response(request_id, status)
+
+
+@router.delete("/requests/{request_id}")
+async def cancel_ride_request(request_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    status = matching_engine.status(request_id)
+    if status is None or status.rider_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Заказ не найден.")
+    if not matching_engine.cancel(request_id):
+        raise HTTPException(status_code=409, detail="Заказ уже назначен или снят.")
+    return {"message": "Заказ отменен."}
+
+
+# Мои поездки (пассажир), от новых к старым; следующая страница — cursor=next_cursor
+@router.get("/trips")
+async def my_trips(
+        cursor: Optional[str] = None,
+        limit: int = Query(default=20, ge=1, le=100),
+        current_user: CurrentUser = Depends(get_current_user),
+        session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        trips, next_cursor = await list_trips(session, rider_id=current_user.id, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'trips': trips, 'next_cursor': next_cursor}
+
+
+# Предварительная стоимость поездки: расстояние, время в пути и цена по тарифу с учетом времени суток
+@router.post("/estimate")
+async def estimate_ride(payload: FareEstimateSchema, current_user: CurrentUser = Depends(get_current_user)):
+    tariffs = tariff_store.get()
+    if payload.tariff not in tariffs.classes:
+        raise HTTPException(status_code=400, detail="Неизвестный тариф.")
+    distance, duration, fare, multiplier = estimate_fares(tariffs, payload.tariff, payload.origin.lat,
+                                                          payload.origin.lon, payload.destination.lat,
+                                                          payload.destination.lon)
+    return {"distance_km": round(float(distance), 2), "duration_min": round(float(duration), 1),
+            "fare": float(fare), "currency": tariffs.currency, "multiplier": multiplier}
+
+
+def _coordinates(value, name: str) -> np.ndarray:
+    try:
+        points = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError):
+        points = None
+    if points is None or points.ndim != 2 or points.shape[1] != 2:
+        raise HTTPException(status_code=422, detail=f"{name}: ожидается список пар [lat, lon].")
+    if not (np.all(np.abs(points[:, 0]) <= 90) and np.all(np.abs(points[:, 1]) <= 180)):
+        raise HTTPException(status_code=422, detail=f"{name}: координаты вне допустимого диапазона.")
+    return points
+
+
+# Пакетный расчет: {"tariff": "economy", "origins": [[lat, lon], ...], "destinations": [[lat, lon], ...]}.
+# Тело разбирается orjson прямо в массивы NumPy, без pydantic-модели на каждую пару,
+# и ответ — массивы той же длины в том же порядке
+@router.post("/estimate/batch")
+async def estimate_rides_batch(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    try:
+        body = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=422, detail="Некорректный JSON.")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=422, detail="Ожидается JSON-объект.")
+    origins = _coordinates(body.get('origins'), 'origins')
+    destinations = _coordinates(body.get('destinations'), 'destinations')
+    if len(origins) != len(destinations):
+        raise HTTPException(status_code=422, detail="origins и destinations должны быть одной длины.")
+    if len(origins) > FARE_BATCH_MAX_PAIRS:
+        raise HTTPException(status_code=422, detail=f"Не больше {FARE_BATCH_MAX_PAIRS} пар за запрос.")
+
+    tariffs = tariff_store.get()
+    tariff = body.get('tariff', 'economy')
+    if not isinstance(tariff, str) or tariff not in tariffs.classes:
+        raise HTTPException(status_code=400, detail="Неизвестный тариф.")
+    distance, duration, fare, multiplier = estimate_fares(tariffs, tariff, origins[:, 0], origins[:, 1],
+                                                          destinations[:, 0], destinations[:, 1])
+    content = {"distance_km": np.round(distance, 2), "duration_min": np.round(duration, 1), "fare": fare,
+               "currency": tariffs.currency, "multiplier": multiplier}
+    return Response(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY), media_type='application/json')
@@ -1,10 +1,10 @@
 import logging
-from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Depends, HTTPException
 
-from crud import crud
-from sql_app.database import get_async_session
+from crud.support import submit_support_message
 from schemas import SupportMessageSchema
+from sql_app.write_behind import WriteBehindFull
+from .dependencies import CurrentUser, get_current_user
 
 router = APIRouter()
 logging.basicConfig(level=logging.INFO)
@@ -12,13 +12,13 @@ logging.basicConfig(level=logging.INFO)
 
 # Эндпоинт для отправки сообщения в службу поддержки
 @router.post("/support")
-async def send_support_message(message: SupportMessageSchema, session: AsyncSession = Depends(get_async_session)):
-    db_user = await crud.get_user_by_phone(message.phone)
-    if not db_user:
-        raise HTTPException(status_code=404, detail='Пользователь не найден')
-
-    # Здесь можно реализовать логику отправки сообщения в службу поддержки
-    # Например, сохраняем сообщение в базе данных или отправляем на почту
-    logging.info(f"Сообщение от пользователя {message.phone}: {message.message}")
+async def send_support_message(message: SupportMessageSchema, current_user: CurrentUser = Depends(get_current_user)):
+    # Пользователь уже известен по токену — искать его в базе не нужно.
+    # Сообщение попадает в буфер и сохраняется в базе пачкой вместе с другими
+    try:
+        submit_support_message(current_user.id, message.message)
+    except WriteBehindFull:
+        raise HTTPException(status_code=503, detail="Служба поддержки перегружена, попробуйте позже.",
+                            headers={"Retry-After": "5"})
 
     return {"message": "Ваше сообщение отправлено в службу поддержки."}
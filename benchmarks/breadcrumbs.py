@@ -0,0 +1,106 @@
+"""
+Запись трека водителей: пропускная способность буфера и COPY в строках в секунду.
+
+    python -m benchmarks.breadcrumbs --rows 200000
+    python -m benchmarks.breadcrumbs --rows 200000 --database
+
+Без --database замеряется только сторона приложения: постановка точек в буфер
+(что платит каждый пинг в WebSocket) и подготовка строк для COPY.
+С --database нужна PostgreSQL с применёнными миграциями: те же точки пишутся
+в gps_breadcrumbs через BreadcrumbWriter (COPY) и для сравнения — INSERT по одной
+строке и INSERT пачкой (executemany). Точки пишутся с отрицательными driver_id
+и в конце удаляются.
+"""
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, insert
+
+from crud.breadcrumbs import BreadcrumbBatch, BreadcrumbWriter
+from models.breadcrumbs import GpsBreadcrumb
+from sql_app import get_engine, dispose_engine
+from .driver_index import _random_point
+
+
+def _report(name: str, rows: int, elapsed: float):
+    print(f"{name:<40} {rows:>9} строк  {elapsed:>7.3f}s  {rows / elapsed:>12,.0f} строк/с")
+
+
+def _points(rows: int, drivers: int, seed: int) -> list:
+    rng = random.Random(seed)
+    started = time.time()
+    return [(-1 - rng.randrange(drivers), *_random_point(rng), rng.random() < 0.7, started + i / 1000)
+            for i in range(rows)]
+
+
+def _fill(writer: BreadcrumbWriter, points: list):
+    for driver_id, lat, lon, available, timestamp in points:
+        writer.record(driver_id, lat, lon, available, timestamp)
+
+
+async def _memory(points: list):
+    # Прореживание включается с половины max_pending: здесь до него не доходит
+    writer = BreadcrumbWriter(get_engine, max_batch=len(points) + 1, max_pending=2 * len(points) + 2)
+    started = time.perf_counter()
+    _fill(writer, points)
+    _report('постановка в буфер (record)', len(points), time.perf_counter() - started)
+    writer._task.cancel()
+
+    batch: BreadcrumbBatch = writer._rows
+    started = time.perf_counter()
+    for _ in batch.records():
+        pass
+    _report('подготовка строк для COPY', len(points), time.perf_counter() - started)
+    itemsize = sum(getattr(batch, column).itemsize for column in BreadcrumbBatch.__slots__)
+    print(f"память буфера: {itemsize} байт на точку, {itemsize * len(batch) / 2 ** 20:.1f} МБ на {len(batch)} точек")
+
+
+async def _database(points: list, batch_size: int, single_rows: int):
+    engine = get_engine()
+    writer = BreadcrumbWriter(get_engine, max_batch=batch_size, max_pending=2 * len(points) + 2)
+    started = time.perf_counter()
+    _fill(writer, points)
+    await writer.stop(timeout=600)
+    _report(f'BreadcrumbWriter (COPY по {batch_size})', writer.written, time.perf_counter() - started)
+
+    rows = [{'driver_id': driver_id, 'lat': lat, 'lon': lon, 'available': available,
+             'recorded_at': datetime.fromtimestamp(timestamp, timezone.utc)}
+            for driver_id, lat, lon, available, timestamp in points]
+
+    started = time.perf_counter()
+    for row in rows[:single_rows]:
+        async with engine.begin() as conn:
+            await conn.execute(insert(GpsBreadcrumb.__table__), row)
+    _report('INSERT по одной строке', single_rows, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        async with engine.begin() as conn:
+            await conn.execute(insert(GpsBreadcrumb.__table__), rows[offset:offset + batch_size])
+    _report(f'INSERT пачкой по {batch_size} (executemany)', len(rows), time.perf_counter() - started)
+
+    async with engine.begin() as conn:
+        await conn.execute(delete(GpsBreadcrumb.__table__).where(GpsBreadcrumb.__table__.c.driver_id < 0))
+
+
+async def main(rows: int, drivers: int, batch_size: int, single_rows: int, database: bool, seed: int):
+    points = _points(rows, drivers, seed)
+    await _memory(points)
+    if database:
+        await _database(points, batch_size, min(single_rows, rows))
+        await dispose_engine()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--single-rows', type=int, default=2000, help='сколько строк вставить по одной')
+    parser.add_argument('--database', action='store_true', help='писать в PostgreSQL, а не только в буфер')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.drivers, args.batch_size, args.single_rows, args.database, args.seed))
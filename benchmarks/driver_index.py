@@ -0,0 +1,99 @@
+"""
+Пространственный индекс водителей в масштабе города: обновления позиций и поиск ближайших.
+
+    python -m benchmarks.driver_index --drivers 50000 --queries 5000
+
+Водители случайно разбросаны по квадрату ~30x30 км вокруг центра Ташкента, плотнее к центру.
+Первые 200 результатов поиска сверяются с полным перебором.
+"""
+import math
+import time
+import random
+import argparse
+import statistics
+
+from services.geo_index import GridIndex, METERS_PER_DEGREE
+
+CENTER_LAT, CENTER_LON = 41.3111, 69.2797
+CITY_RADIUS_METERS = 15000
+
+
+def _random_point(rng: random.Random):
+    # Нормальное распределение: в центре водителей больше, чем на окраинах
+    dy = max(-CITY_RADIUS_METERS, min(CITY_RADIUS_METERS, rng.gauss(0, CITY_RADIUS_METERS / 2)))
+    dx = max(-CITY_RADIUS_METERS, min(CITY_RADIUS_METERS, rng.gauss(0, CITY_RADIUS_METERS / 2)))
+    lat = CENTER_LAT + dy / METERS_PER_DEGREE
+    lon = CENTER_LON + dx / (METERS_PER_DEGREE * math.cos(math.radians(CENTER_LAT)))
+    return lat, lon
+
+
+def _brute_force(points: dict, lat: float, lon: float, k: int, radius: float) -> list:
+    meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(lat))
+    found = []
+    for driver_id, (driver_lat, driver_lon) in points.items():
+        distance = math.hypot((driver_lat - lat) * METERS_PER_DEGREE, (driver_lon - lon) * meters_per_lon)
+        if distance <= radius:
+            found.append((distance, driver_id))
+    found.sort()
+    return [driver_id for _, driver_id in found[:k]]
+
+
+def _report(name: str, timings: list):
+    timings.sort()
+    print(f"{name:<40} mean={statistics.mean(timings) * 1e6:>8.1f}us  "
+          f"p50={timings[len(timings) // 2] * 1e6:>8.1f}us  "
+          f"p99={timings[int(len(timings) * 0.99)] * 1e6:>8.1f}us")
+
+
+def main(drivers: int, queries: int, k: int, radius: float, cell_meters: float, seed: int):
+    rng = random.Random(seed)
+    index = GridIndex(cell_meters, ttl=3600)
+    points = {driver_id: _random_point(rng) for driver_id in range(drivers)}
+
+    started = time.perf_counter()
+    for driver_id, (lat, lon) in points.items():
+        index.update(driver_id, lat, lon)
+    elapsed = time.perf_counter() - started
+    print(f"начальная загрузка {drivers} водителей: {elapsed:.3f}s ({drivers / elapsed:,.0f} обновлений/с)")
+
+    # Пинги: водитель сдвигается на десятки метров, часть пингов переносит его в соседнюю ячейку
+    updates = []
+    for _ in range(drivers):
+        driver_id = rng.randrange(drivers)
+        lat, lon = points[driver_id]
+        lat += rng.uniform(-50, 50) / METERS_PER_DEGREE
+        lon += rng.uniform(-50, 50) / METERS_PER_DEGREE
+        points[driver_id] = (lat, lon)
+        updates.append((driver_id, lat, lon))
+    started = time.perf_counter()
+    for driver_id, lat, lon in updates:
+        index.update(driver_id, lat, lon)
+    elapsed = time.perf_counter() - started
+    print(f"пинги позиций: {len(updates) / elapsed:,.0f} обновлений/с")
+
+    for name, spread in (('центр', CITY_RADIUS_METERS / 4), ('окраина', CITY_RADIUS_METERS)):
+        timings, mismatches = [], 0
+        for _ in range(queries):
+            lat = CENTER_LAT + rng.uniform(-spread, spread) / METERS_PER_DEGREE
+            lon = CENTER_LON + rng.uniform(-spread, spread) / METERS_PER_DEGREE
+            started = time.perf_counter()
+            result = index.nearest(lat, lon, k, radius)
+            timings.append(time.perf_counter() - started)
+            if len(timings) <= 200:  # Полный перебор медленный — сверяем первые 200 запросов
+                if [driver.driver_id for driver in result] != _brute_force(points, lat, lon, k, radius):
+                    mismatches += 1
+        _report(f"nearest k={k} r={radius:.0f}m, {name}", timings)
+        if mismatches:
+            print(f"  расхождений с полным перебором: {mismatches}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--radius', type=float, default=3000)
+    parser.add_argument('--cell-meters', type=float, default=300)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    main(args.drivers, args.queries, args.k, args.radius, args.cell_meters, args.seed)
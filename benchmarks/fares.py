@@ -0,0 +1,105 @@
+"""
+Расчет стоимости поездок: векторный estimate_fares против цикла по парам и пакетный эндпоинт.
+
+    SECRET=... python -m benchmarks.fares --pairs 10000 --iterations 20
+
+Эндпоинт /rides/estimate/batch вызывается через httpx.ASGITransport, без сети и базы:
+access-токен содержит uid, поэтому пользователь не ищется в базе, а сессия БД подменяется
+пустой (переменные DB_* не нужны).
+"""
+import math
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+
+import httpx
+import orjson
+import numpy as np
+
+import main
+from core import create_access_token
+from sql_app import get_async_session
+from services.fares import EARTH_RADIUS_KM, estimate_fares, tariff_store
+from .driver_index import _random_point
+
+
+def _loop_fares(tariffs, tariff_class: str, pairs: list) -> list:
+    # Та же формула по одной паре за раз — так считалось бы без NumPy
+    tariff = tariffs.classes[tariff_class]
+    multiplier = tariffs.multiplier_at(datetime.now(tariffs.timezone))
+    fares = []
+    for (lat1, lon1), (lat2, lon2) in pairs:
+        phi1, phi2 = math.radians(lat1), math.radians(lat2)
+        a = (math.sin((phi2 - phi1) / 2) ** 2
+             + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+        distance = 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a)) * tariffs.route_factor
+        duration = distance / tariffs.average_speed_kmh * 60
+        fare = max(tariff.base + distance * tariff.per_km + duration * tariff.per_minute, tariff.minimum) * multiplier
+        fares.append(math.ceil(fare / tariffs.rounding) * tariffs.rounding if tariffs.rounding else fare)
+    return fares
+
+
+def _report(name: str, timings: list):
+    timings.sort()
+    print(f"{name:<36} mean={statistics.mean(timings) * 1000:>8.2f}ms  "
+          f"p50={timings[len(timings) // 2] * 1000:>8.2f}ms  max={timings[-1] * 1000:>8.2f}ms")
+
+
+async def _no_session():
+    # Проверка токена с uid к базе не обращается; без подмены зависимость создала бы движок БД
+    yield None
+
+
+async def _endpoint(origins: list, destinations: list, iterations: int) -> list:
+    token = create_access_token({'sub': '+998900000000', 'uid': 1})
+    main.app.dependency_overrides[get_async_session] = _no_session
+    # Тело кодируется один раз: кодирование на стороне клиента не относится к серверу
+    body = orjson.dumps({'tariff': 'economy', 'origins': origins, 'destinations': destinations})
+    timings = []
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = await client.post('/rides/estimate/batch', content=body,
+                                         headers={'Authorization': f'Bearer {token}',
+                                                  'Content-Type': 'application/json'})
+            response.raise_for_status()
+            timings.append(time.perf_counter() - started)
+    main.app.dependency_overrides.clear()
+    return timings
+
+
+def run(pairs: int, iterations: int, seed: int):
+    rng = random.Random(seed)
+    origins = [list(_random_point(rng)) for _ in range(pairs)]
+    destinations = [list(_random_point(rng)) for _ in range(pairs)]
+    tariffs = tariff_store.get()
+    points = np.array(origins), np.array(destinations)
+
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        estimate_fares(tariffs, 'economy', points[0][:, 0], points[0][:, 1], points[1][:, 0], points[1][:, 1])
+        timings.append(time.perf_counter() - started)
+    _report(f'estimate_fares, {pairs} пар', timings)
+
+    timings = []
+    for _ in range(max(1, iterations // 5)):
+        started = time.perf_counter()
+        _loop_fares(tariffs, 'economy', list(zip(origins, destinations)))
+        timings.append(time.perf_counter() - started)
+    _report(f'цикл по парам, {pairs} пар', timings)
+
+    _report(f'POST /rides/estimate/batch, {pairs} пар', asyncio.run(_endpoint(origins, destinations, iterations)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    run(args.pairs, args.iterations, args.seed)
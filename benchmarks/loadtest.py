@@ -0,0 +1,205 @@
+"""
+Нагрузочный прогон приложения main:app внутри процесса.
+
+    pip install -r requirements-dev.txt  # aiosqlite для базы по умолчанию
+    SECRET=... python -m benchmarks.loadtest --users 500 --concurrency 50
+    python -m benchmarks.loadtest --users 500 --compare benchmarks/results/loadtest-20241015-120000.json
+
+Каждый виртуальный пользователь проходит сценарий
+signup -> login -> send-code -> verify-code -> send-code -> change-password.
+Сессия БД подменяется на локальную базу (--database-url, по умолчанию SQLite через aiosqlite),
+SMS и SMTP заменяются фейками внутри процесса, поэтому наружу ничего не уходит.
+Результаты (RPS и p50/p95/p99 по маршрутам) сохраняются в JSON для сравнения прогонов.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+import httpx
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+import main
+from models.users import Base
+from sql_app import get_async_session
+from core.rate_limit import rate_limiter
+from services import FakeSmsSender, set_sms_sender, email_dispatcher
+from crud import support_buffer
+from crud.tokens import revocation_sync
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+class CapturingSmsSender(FakeSmsSender):
+    """Фейковый шлюз, который запоминает последний код для каждого номера."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency=latency)
+        self.codes = {}
+
+    async def send(self, to: str, body: str) -> None:
+        await super().send(to, body)
+        self.codes[to] = int(body.rsplit(' ', 1)[-1])
+        self.messages.clear()
+
+
+class FakeSMTP:
+    """Подмена smtplib.SMTP для EmailDispatcher: принимает письма и ничего не отправляет."""
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        pass
+
+    def quit(self):
+        pass
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[route].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[route] += 1
+        return response
+
+    def summary(self, elapsed: float) -> dict:
+        routes = {}
+        for route, values in self.latencies.items():
+            values = sorted(values)
+            routes[route] = {
+                'requests': len(values),
+                'errors': self.errors[route],
+                'rps': len(values) / elapsed,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {'elapsed_s': elapsed, 'requests': total, 'rps': total / elapsed, 'routes': routes}
+
+
+async def user_scenario(client: httpx.AsyncClient, recorder: Recorder, sms: CapturingSmsSender, index: int):
+    phone = f"+99877{index:07d}"
+    password = f"password-{index}"
+
+    await recorder.call(client, '/signup', 'POST', '/signup', json={
+        'phone': phone, 'first_name': 'Load', 'last_name': 'Test', 'password': password,
+    })
+    await recorder.call(client, '/login', 'POST', '/login', json={'phone': phone, 'password': password})
+
+    await recorder.call(client, '/auth/send-code', 'POST', '/auth/send-code', params={'phone': phone})
+    await recorder.call(client, '/auth/verify-code', 'POST', '/auth/verify-code',
+                        json={'phone': phone, 'code': sms.codes.get(phone, 0)})
+
+    await recorder.call(client, '/auth/send-code', 'POST', '/auth/send-code', params={'phone': phone})
+    await recorder.call(client, '/auth/change-password', 'POST', '/auth/change-password',
+                        params={'new_password': password + '-new'},
+                        json={'phone': phone, 'code': sms.codes.get(phone, 0)})
+
+
+async def run(database_url: str, users: int, concurrency: int, sms_latency: float, keep_rate_limits: bool) -> dict:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_session():
+        async with session_maker() as session:
+            yield session
+
+    main.app.dependency_overrides[get_async_session] = override_session
+    sms = CapturingSmsSender(latency=sms_latency)
+    set_sms_sender(sms)
+    email_dispatcher.smtp_factory = FakeSMTP
+    rate_limiter.enabled = keep_rate_limits
+    main.settings.DB_WARMUP_CONNECTIONS = 0  # Сессии идут в тестовую базу, основной пул не нужен
+    support_buffer.engine_factory = revocation_sync.engine_factory = lambda: engine
+
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(index: int):
+        async with semaphore:
+            await user_scenario(client, recorder, sms, index)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://loadtest') as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(limited(index) for index in range(users)))
+            elapsed = time.perf_counter() - started
+
+    main.app.dependency_overrides.clear()
+    await engine.dispose()
+    return recorder.summary(elapsed)
+
+
+def print_summary(result: dict, previous: dict = None):
+    print(f"{'route':<24}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in sorted(result['routes'].items()):
+        line = (f"{route:<24}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>10.1f}"
+                f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}")
+        before = (previous or {}).get('routes', {}).get(route)
+        if before and before['p95_ms']:
+            line += f"   p95 {(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+    print(f"total: {result['requests']} requests in {result['elapsed_s']:.2f}s, {result['rps']:.1f} rps")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default=os.environ.get('LOADTEST_DATABASE_URL',
+                                                                 'sqlite+aiosqlite:///loadtest.db'))
+    parser.add_argument('--users', type=int, default=200, help='число виртуальных пользователей')
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--sms-latency', type=float, default=0.0, help='задержка фейкового SMS-шлюза, с')
+    parser.add_argument('--keep-rate-limits', action='store_true', help='не отключать rate limiting')
+    parser.add_argument('--output', help='куда сохранить результат (по умолчанию benchmarks/results/)')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.database_url, args.users, args.concurrency, args.sms_latency,
+                             args.keep_rate_limits))
+    result['config'] = {'users': args.users, 'concurrency': args.concurrency,
+                        'sms_latency': args.sms_latency, 'database': args.database_url.split('://')[0]}
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    print_summary(result, previous)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime('loadtest-%Y%m%d-%H%M%S.json'))
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"saved: {output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main_cli()
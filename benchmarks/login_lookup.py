@@ -0,0 +1,80 @@
+"""
+Сравнение поиска пользователя при входе: полный ORM-объект User против get_login_identity.
+
+    python -m benchmarks.login_lookup --users 10000 --iterations 5000
+
+Тестовые пользователи создаются внутри транзакции, которая в конце откатывается.
+"""
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud import crud, user_cache
+from models import User
+from sql_app import get_engine, dispose_engine
+
+
+def _report(name: str, timings: list):
+    timings.sort()
+    total = sum(timings)
+    print(f"{name:<28} ops/s={len(timings) / total:>9.0f}  "
+          f"mean={statistics.mean(timings) * 1e6:>7.1f}us  "
+          f"p50={timings[len(timings) // 2] * 1e6:>7.1f}us  "
+          f"p95={timings[int(len(timings) * 0.95)] * 1e6:>7.1f}us")
+
+
+async def _run(session: AsyncSession, phones: list, iterations: int, lookup) -> list:
+    timings = []
+    for _ in range(iterations):
+        phone = random.choice(phones)
+        started = time.perf_counter()
+        await lookup(session, phone)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def main(users: int, iterations: int):
+    user_cache.enabled = False  # Меряем запросы к базе, а не кэш
+    phones = [f"+99800{i:07d}" for i in range(users)]
+
+    async with get_engine().connect() as conn:
+        transaction = await conn.begin()
+        session = AsyncSession(bind=conn)
+        try:
+            await session.execute(insert(User), [
+                {'first_name': 'Bench', 'last_name': 'User', 'phone': phone,
+                 'hashed_password': '$2b$12$' + 'x' * 53}
+                for phone in phones
+            ])
+
+            async def full_user(session, phone):
+                user = await crud.get_user_by_phone(session, phone, use_cache=False)
+                session.expunge(user)
+                return user.id, user.hashed_password
+
+            async def lean_identity(session, phone):
+                return await crud.get_login_identity(session, phone=phone)
+
+            # Прогрев: компиляция запросов и кэш подготовленных выражений asyncpg
+            await _run(session, phones, 100, full_user)
+            await _run(session, phones, 100, lean_identity)
+
+            _report('get_user_by_phone (ORM)', await _run(session, phones, iterations, full_user))
+            _report('get_login_identity', await _run(session, phones, iterations, lean_identity))
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await dispose_engine()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.iterations))
@@ -0,0 +1,84 @@
+"""
+Распределение заказов на синтетическом городе: время тика и качество назначения.
+
+    python -m benchmarks.matching --drivers 20000 --requests 3000 --ticks 5
+
+Водители и заказы разбросаны вокруг центра города, как в benchmarks.driver_index.
+Для каждого тика печатается время solve_assignment, число назначенных заказов и среднее
+расстояние подачи; для сравнения — тот же тик жадным назначением по одному заказу
+(ближайший свободный водитель через GridIndex.nearest), как было бы без пакетного распределения.
+"""
+import time
+import random
+import argparse
+import statistics
+
+import numpy as np
+
+from services import matching
+from services.geo_index import GridIndex
+from .driver_index import _random_point
+
+
+def _one_by_one(index: GridIndex, requests: list, radius: float) -> list:
+    distances = []
+    for lat, lon in requests:
+        nearest = index.nearest(lat, lon, k=1, radius=radius)
+        if nearest:
+            index.remove(nearest[0].driver_id)
+            distances.append(nearest[0].distance)
+    return distances
+
+
+def main(drivers: int, requests: int, ticks: int, radius: float, candidates: int, tile_meters: float,
+         budget: float, greedy: bool, seed: int):
+    if greedy:
+        matching.linear_sum_assignment = None
+    solver = 'жадный' if matching.linear_sum_assignment is None else 'венгерский (scipy)'
+    print(f"решатель: {solver}, водителей {drivers}, заказов в тике {requests}, бюджет {budget * 1000:.0f}ms")
+    rng = random.Random(seed)
+
+    batch_timings, batch_distances, batch_assigned = [], [], 0
+    single_timings, single_distances = [], []
+    for _ in range(ticks):
+        driver_points = [_random_point(rng) for _ in range(drivers)]
+        request_points = [_random_point(rng) for _ in range(requests)]
+        driver_lat, driver_lon = np.array(driver_points).T
+        request_lat, request_lon = np.array(request_points).T
+
+        started = time.perf_counter()
+        matches = matching.solve_assignment(request_lat, request_lon, driver_lat, driver_lon, radius, candidates,
+                                            tile_meters, deadline=started + budget)
+        batch_timings.append(time.perf_counter() - started)
+        batch_assigned += len(matches)
+        batch_distances.extend(distance for _, _, distance in matches)
+
+        index = GridIndex(ttl=3600)
+        for driver_id, (lat, lon) in enumerate(driver_points):
+            index.update(driver_id, lat, lon)
+        started = time.perf_counter()
+        single_distances.extend(_one_by_one(index, request_points, radius))
+        single_timings.append(time.perf_counter() - started)
+
+    print(f"{'пакетное распределение':<28} тик p50={statistics.median(batch_timings) * 1000:>7.1f}ms  "
+          f"max={max(batch_timings) * 1000:>7.1f}ms  назначено {batch_assigned / ticks:>7.0f}  "
+          f"подача в среднем {statistics.mean(batch_distances):>6.0f}м")
+    print(f"{'по одному заказу':<28} тик p50={statistics.median(single_timings) * 1000:>7.1f}ms  "
+          f"max={max(single_timings) * 1000:>7.1f}ms  назначено {len(single_distances) / ticks:>7.0f}  "
+          f"подача в среднем {statistics.mean(single_distances):>6.0f}м")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--drivers', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--ticks', type=int, default=5)
+    parser.add_argument('--radius', type=float, default=3000)
+    parser.add_argument('--candidates', type=int, default=10)
+    parser.add_argument('--tile-meters', type=float, default=2000)
+    parser.add_argument('--budget', type=float, default=0.2)
+    parser.add_argument('--greedy', action='store_true', help='не использовать scipy, даже если он установлен')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    main(args.drivers, args.requests, args.ticks, args.radius, args.candidates, args.tile_meters, args.budget,
+         args.greedy, args.seed)
@@ -0,0 +1,65 @@
+"""
+Замер холодного старта: импорт main в отдельном процессе и запуск lifespan.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --importtime 15
+
+Каждый прогон — новый интерпретатор, поэтому кэши модулей не влияют на результат.
+С --importtime выводятся самые медленные модули по данным python -X importtime.
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+_PROBE = '''
+import time, json, asyncio
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+
+async def boot():
+    main.settings.DB_WARMUP_CONNECTIONS = 0
+    async with main.lifespan(main.app):
+        pass
+
+asyncio.run(boot())
+print(json.dumps(dict(main.startup_timings, total_import=imported)))
+'''
+
+
+def _run_probe() -> dict:
+    output = subprocess.run([sys.executable, '-c', _PROBE], check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _slowest_imports(limit: int) -> list:
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import main'],
+                            check=True, capture_output=True, text=True).stderr
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.append((int(cumulative), name.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def main(runs: int, importtime: int):
+    results = [_run_probe() for _ in range(runs)]
+    for stage in results[0]:
+        values = [result[stage] * 1000 for result in results]
+        print(f"{stage:<16} median={statistics.median(values):>8.1f}ms  max={max(values):>8.1f}ms")
+    if importtime:
+        print("\nсамые медленные импорты (cumulative):")
+        for cumulative, name in _slowest_imports(importtime):
+            print(f"{cumulative / 1000:>8.1f}ms  {name}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--importtime', type=int, default=0, help='показать N самых медленных модулей')
+    args = parser.parse_args()
+    main(args.runs, args.importtime)
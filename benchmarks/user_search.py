@@ -0,0 +1,101 @@
+"""
+Поиск пользователей на синтетической таблице: keyset-пагинация против OFFSET.
+
+    python -m benchmarks.user_search --users 3000000 --iterations 50
+
+Нужна PostgreSQL с применёнными миграциями (индексы поиска и pg_trgm).
+Синтетические пользователи вставляются через generate_series внутри транзакции,
+которая в конце откатывается, так что таблица users не меняется.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from crud.search import build_search_query
+from sql_app import get_engine, dispose_engine
+
+_FIRST_NAMES = ['Aziz', 'Bekzod', 'Dilnoza', 'Ivan', 'Kamola', 'Nodira', 'Olga', 'Rustam', 'Sardor', 'Timur']
+_LAST_NAMES = ['Aliev', 'Karimov', 'Petrov', 'Rakhimova', 'Sidorov', 'Tursunov', 'Usmonov', 'Yusupova']
+
+
+def _report(name: str, timings: list):
+    timings.sort()
+    print(f"{name:<36} mean={statistics.mean(timings) * 1000:>8.2f}ms  "
+          f"p50={timings[len(timings) // 2] * 1000:>8.2f}ms  "
+          f"p95={timings[int(len(timings) * 0.95)] * 1000:>8.2f}ms")
+
+
+async def _measure(session: AsyncSession, statement, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        (await session.execute(statement)).all()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def _walk_pages(session: AsyncSession, pages: int, limit: int, **filters) -> float:
+    """Проходит pages страниц подряд по next_after_id, возвращает время последней страницы."""
+    after_id, elapsed = None, 0.0
+    for _ in range(pages):
+        started = time.perf_counter()
+        rows = (await session.execute(build_search_query(after_id=after_id, limit=limit, **filters))).all()
+        elapsed = time.perf_counter() - started
+        if len(rows) < limit:
+            break
+        after_id = rows[-1].id
+    return elapsed
+
+
+async def main(users: int, iterations: int, limit: int):
+    async with get_engine().connect() as conn:
+        transaction = await conn.begin()
+        session = AsyncSession(bind=conn)
+        try:
+            started = time.perf_counter()
+            await session.execute(text(
+                "INSERT INTO users (first_name, last_name, phone, email, hashed_password, language, "
+                "notifications_enabled) "
+                "SELECT (CAST(:first_names AS text[]))[1 + i % 10], (CAST(:last_names AS text[]))[1 + i % 8], "
+                "'+9989' || lpad(i::text, 8, '0'), 'rider' || i || '@bench.uz', 'x', 'russian', true "
+                "FROM generate_series(1, :users) AS i"
+            ), {'first_names': _FIRST_NAMES, 'last_names': _LAST_NAMES, 'users': users})
+            await session.execute(text("ANALYZE users"))
+            print(f"вставлено {users} пользователей за {time.perf_counter() - started:.1f}s")
+
+            queries = {
+                'первая страница без фильтров': build_search_query(limit=limit),
+                'префикс телефона +99890012': build_search_query(phone='+99890012', limit=limit),
+                'префикс почты rider12345': build_search_query(email='rider12345', limit=limit),
+                'имя "ivan pet"': build_search_query(name='ivan pet', limit=limit),
+            }
+            for name, statement in queries.items():
+                await _measure(session, statement, 3)  # Прогрев кэша страниц и плана
+                _report(name, await _measure(session, statement, iterations))
+
+            # Глубокая страница: keyset по id против OFFSET на той же позиции
+            deep = users // 2
+            keyset = build_search_query(after_id=deep, limit=limit)
+            offset = build_search_query(limit=limit).offset(deep)
+            _report(f'keyset after_id={deep}', await _measure(session, keyset, iterations))
+            _report(f'OFFSET {deep}', await _measure(session, offset, max(3, iterations // 10)))
+
+            last_page = await _walk_pages(session, 100, limit, name='ivan')
+            print(f"{'100-я страница поиска по имени':<36} {last_page * 1000:>8.2f}ms")
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await dispose_engine()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=3000000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--limit', type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.iterations, args.limit))
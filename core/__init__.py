@@ -1,9 +1,15 @@
 from .utils import (generate_verification_code,
                     hash_password,
                     verify_password,
-                    create_access_token
+                    create_access_token,
+                    decode_access_token,
+                    verify_and_update_password
                     )
+from .hashing import (hash_password_async, verify_password_async, verify_and_update_password_async, hashing_pool,
+                      HashingPoolSaturated)
 from .config import SECRET, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER
 
-__all__ = ["generate_verification_code", "hash_password", "verify_password", "create_access_token", 'SECRET',
-           'TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER']
+__all__ = ["generate_verification_code", "hash_password", "verify_password", "create_access_token",
+           "decode_access_token", "verify_and_update_password", "hash_password_async", "verify_password_async",
+           "verify_and_update_password_async", "hashing_pool",
+           "HashingPoolSaturated", 'SECRET', 'TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_PHONE_NUMBER']
@@ -1,18 +1,193 @@
 import os
-from dotenv import load_dotenv
+from typing import Optional
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-load_dotenv()
 
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASS = os.environ.get('DB_PASS')
-DB_HOST = os.environ.get('DB_HOST')
-DB_PORT = os.environ.get('DB_PORT')
-SECRET = os.environ.get('SECRET')
+class Settings(BaseSettings):
+    """
+    Настройки приложения из переменных окружения и файла .env.
+    Читаются один раз при первом обращении (get_settings).
+    """
+    model_config = SettingsConfigDict(env_file='.env', extra='ignore')
 
-TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
-TWILIO_PHONE_NUMBER = os.environ.get('TWILIO_PHONE_NUMBER')
+    DB_NAME: Optional[str] = None
+    DB_USER: Optional[str] = None
+    DB_PASS: Optional[str] = None
+    DB_HOST: Optional[str] = None
+    DB_PORT: Optional[str] = None
+    SECRET: Optional[str] = None
 
-EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
-EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
+    TWILIO_ACCOUNT_SID: Optional[str] = None
+    TWILIO_AUTH_TOKEN: Optional[str] = None
+    TWILIO_PHONE_NUMBER: Optional[str] = None
+
+    EMAIL_HOST_USER: Optional[str] = None
+    EMAIL_HOST_PASSWORD: Optional[str] = None
+
+    # Пул для хеширования паролей (bcrypt): 'thread' или 'process'
+    PASSWORD_HASH_EXECUTOR: str = 'thread'
+    PASSWORD_HASH_WORKERS: int = os.cpu_count() or 1
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Схема хеширования новых паролей и ее стоимость: 'bcrypt', 'scrypt' (memory-hard)
+    # или 'argon2' (memory-hard, нужен пакет argon2-cffi). Хеши других схем и с другой
+    # стоимостью продолжают проверяться и пересчитываются при входе.
+    PASSWORD_HASH_SCHEME: str = 'bcrypt'
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_SCRYPT_ROUNDS: int = 15  # log2(N): 15 при block_size=8 — около 32 МБ памяти на хеш
+    PASSWORD_SCRYPT_BLOCK_SIZE: int = 8
+    PASSWORD_SCRYPT_PARALLELISM: int = 1
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    PASSWORD_ARGON2_MEMORY_COST: int = 65536  # КиБ
+    PASSWORD_ARGON2_PARALLELISM: int = 2
+    PASSWORD_REHASH_ON_LOGIN: bool = True
+
+    # Хранилище кодов подтверждения: 'memory' (один процесс) или 'sqlite' (общее для воркеров)
+    VERIFICATION_CODE_BACKEND: str = 'memory'
+    VERIFICATION_CODE_TTL: int = 300
+    VERIFICATION_CODE_MAX_ATTEMPTS: int = 5
+    VERIFICATION_CODE_MAX_ENTRIES: int = 100000
+    VERIFICATION_CODE_SWEEP_INTERVAL: int = 30
+    VERIFICATION_CODE_SQLITE_PATH: str = '/tmp/taxiapp_verification_codes.db'
+
+    # Отправка почты: пул SMTP-соединений и очередь исходящих писем
+    EMAIL_HOST: str = 'smtp.gmail.com'
+    EMAIL_PORT: int = 587
+    EMAIL_USE_TLS: bool = True
+    EMAIL_POOL_SIZE: int = 2
+    EMAIL_QUEUE_SIZE: int = 1000
+    EMAIL_MAX_RETRIES: int = 3
+    EMAIL_RETRY_BACKOFF: float = 1.0
+    EMAIL_IDLE_TIMEOUT: float = 60
+    EMAIL_SHUTDOWN_TIMEOUT: float = 10
+
+    # Отправка SMS: 'twilio' или 'fake' (для тестов и нагрузочных прогонов)
+    SMS_BACKEND: str = 'twilio'
+    TWILIO_API_BASE_URL: str = 'https://api.twilio.com'
+    SMS_MAX_CONCURRENCY: int = 20
+    SMS_MAX_CONNECTIONS: int = 20
+    SMS_TIMEOUT: float = 10
+    SMS_MAX_RETRIES: int = 3
+    SMS_RETRY_BACKOFF: float = 0.5
+
+    # Пул соединений с базой данных
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    # Прогрев при старте: сколько соединений открыть заранее (0 — не прогревать БД)
+    STARTUP_WARMUP: bool = True
+    DB_WARMUP_CONNECTIONS: int = 5
+
+    # Кэш пользователей в памяти процесса (по id, телефону и email)
+    USER_CACHE_ENABLED: bool = False
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60
+    USER_CACHE_NEGATIVE_TTL: float = 5
+
+    # Кэш проверенных JWT токенов (запись живет до exp токена)
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+
+    # Ограничение частоты запросов (token bucket): "маршрут=запросов/секунд" через запятую
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = 'memory'
+    RATE_LIMITS: str = 'login=10/60,send_code=3/60,reset_password=3/300,ride_request=10/60'
+    # Лимиты по IP клиента отдельно и выше: за одним адресом (NAT оператора, прокси) много пользователей
+    RATE_LIMITS_IP: str = 'login=100/60,send_code=30/60,reset_password=30/300'
+    # Прокси и балансировщики (IP или сети через запятую), которым доверяем X-Forwarded-For
+    TRUSTED_PROXIES: str = ''
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_SQLITE_PATH: str = '/tmp/taxiapp_rate_limits.db'
+
+    # Idempotency-Key для /signup и /auth/send-code: сколько помнить ответ и сколько ключей держать в памяти
+    IDEMPOTENCY_TTL: float = 86400
+    IDEMPOTENCY_MAX_KEYS: int = 100000
+
+    # Метрики Prometheus: каталог, куда воркеры сбрасывают свои значения для агрегации
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL: float = 5
+
+    # Массовый импорт пользователей
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_HASH_WORKERS: int = os.cpu_count() or 1
+
+    # Сообщения в поддержку: буфер отложенной записи (вставка пачкой по размеру или по времени)
+    SUPPORT_BUFFER_MAX_BATCH: int = 500
+    SUPPORT_BUFFER_FLUSH_INTERVAL: float = 1.0
+    SUPPORT_BUFFER_MAX_PENDING: int = 50000
+
+    # Время жизни токенов и синхронизация отозванных сессий между воркерами
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
+    REVOCATION_SYNC_INTERVAL: float = 2
+
+    # Водители онлайн: сетка пространственного индекса и через сколько секунд без обновлений позиция устаревает
+    GEO_INDEX_CELL_METERS: float = 300
+    DRIVER_LOCATION_TTL: float = 30
+
+    # Распределение заказов: раз в MATCHING_TICK_INTERVAL секунд, не дольше MATCHING_TICK_BUDGET на проход
+    MATCHING_TICK_INTERVAL: float = 1.0
+    MATCHING_TICK_BUDGET: float = 0.2
+    MATCHING_RADIUS: float = 3000
+    MATCHING_CANDIDATES: int = 10
+    MATCHING_TILE_METERS: float = 2000
+    MATCHING_REQUEST_TIMEOUT: float = 120
+    MATCHING_AVERAGE_SPEED_KMH: float = 25
+
+    # Тарифы для расчета стоимости поездки: JSON-файл перечитывается при изменении (mtime проверяется
+    # не чаще раза в FARE_TARIFFS_CHECK_INTERVAL секунд); FARE_BATCH_MAX_PAIRS — предел пакетного расчета
+    FARE_TARIFFS_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                          'services', 'tariffs.json')
+    FARE_TARIFFS_CHECK_INTERVAL: float = 5
+    FARE_BATCH_MAX_PAIRS: int = 10000
+
+    # История поездок: буфер записи новых поездок, глубина "моих поездок" и секции таблицы trips
+    # (manage.py trip-partitions создает TRIP_PARTITIONS_AHEAD месяцев вперед и отсоединяет
+    # секции старше TRIP_RETENTION_MONTHS)
+    TRIP_BUFFER_MAX_BATCH: int = 500
+    TRIP_BUFFER_FLUSH_INTERVAL: float = 1.0
+    TRIP_BUFFER_MAX_PENDING: int = 50000
+    TRIP_HISTORY_MONTHS: int = 12
+    TRIP_RETENTION_MONTHS: int = 24
+    TRIP_PARTITIONS_AHEAD: int = 3
+
+    # Трек водителей (gps_breadcrumbs): COPY по BREADCRUMB_MAX_BATCH точек или раз в BREADCRUMB_FLUSH_INTERVAL
+    # секунд; выше половины BREADCRUMB_MAX_PENDING точки прореживаются до одной в BREADCRUMB_THIN_INTERVAL
+    # секунд на водителя, на BREADCRUMB_MAX_PENDING — отбрасываются
+    BREADCRUMB_MAX_BATCH: int = 5000
+    BREADCRUMB_FLUSH_INTERVAL: float = 2.0
+    BREADCRUMB_MAX_PENDING: int = 500000
+    BREADCRUMB_THIN_INTERVAL: float = 10
+
+    # Подпись JWT: 'HS256' (общий SECRET) или 'ES256' (ключи из JWT_KEYS_DIR, публикуются в JWKS).
+    # Каталог ключей должен быть общим для всех воркеров; старый ключ после ротации
+    # проверяет токены еще JWT_KEY_RETENTION_HOURS (больше срока жизни access-токена и JWKS_MAX_AGE)
+    JWT_ALGORITHM: str = 'HS256'
+    JWT_KEYS_DIR: str = '/tmp/taxiapp_jwt_keys'
+    JWT_KEY_ROTATION_HOURS: float = 720
+    JWT_KEY_RETENTION_HOURS: float = 24
+    JWT_ACCEPT_HS256: bool = True  # принимать токены, подписанные SECRET (на время перехода на ES256)
+    JWKS_MAX_AGE: int = 300
+
+    # Токен для административных эндпоинтов (заголовок X-Admin-Token); пустой — доступ закрыт
+    ADMIN_API_TOKEN: Optional[str] = None
+
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+settings = get_settings()
+
+
+# Старый стиль импорта (from core.config import DB_NAME) продолжает работать
+def __getattr__(name: str):
+    if name in Settings.model_fields:
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,126 @@
+import time
+import asyncio
+import multiprocessing
+from typing import Optional, Tuple
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+from .config import PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+from .utils import hash_password, verify_password, verify_and_update_password
+from .metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASH_REJECTED
+
+
+class HashingPoolSaturated(Exception):
+    """Очередь пула хеширования заполнена — запрос отклоняется сразу."""
+
+
+def _timed_call(func, *args):
+    # Выполняется внутри воркера: возвращаем результат и чистое время хеширования
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+class HashingPool:
+    """
+    Ограниченный пул для bcrypt, чтобы хеширование не блокировало event loop.
+    Если занято workers + max_queue задач, новые задачи отклоняются (HashingPoolSaturated).
+    """
+
+    def __init__(self, kind: str = 'thread', workers: int = 1, max_queue: int = 0):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        self._rejected = 0
+        self._failed = 0
+        # operation -> [count, сумма времени в пуле, сумма ожидания, максимум]
+        self._latency = {}
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                # spawn, а не fork: у воркера API уже есть потоки (to_thread, пул хеширования),
+                # и дочерний процесс мог бы унаследовать захваченные ими блокировки
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hashing')
+        return self._executor
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.max_queue
+
+    async def run(self, operation: str, func, *args):
+        if self._in_flight >= self.capacity:
+            self._rejected += 1
+            PASSWORD_HASH_REJECTED.inc()
+            raise HashingPoolSaturated(f"Пул хеширования перегружен ({self._in_flight} задач)")
+
+        self._in_flight += 1
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            result, elapsed = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+        total = time.perf_counter() - started
+        PASSWORD_HASH_LATENCY.observe(total, operation)
+        stats = self._latency.setdefault(operation, [0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += max(0.0, total - elapsed)
+        stats[3] = max(stats[3], total)
+        return result
+
+    def stats(self) -> dict:
+        busy = min(self._in_flight, self.workers)
+        return {
+            'kind': self.kind,
+            'workers': self.workers,
+            'max_queue': self.max_queue,
+            'in_flight': self._in_flight,
+            'queued': max(0, self._in_flight - self.workers),
+            'utilisation': busy / self.workers,
+            'rejected': self._rejected,
+            'failed': self._failed,
+            'latency': {
+                operation: {
+                    'count': count,
+                    'avg_hash_ms': hash_time / count * 1000,
+                    'avg_wait_ms': wait_time / count * 1000,
+                    'max_total_ms': max_time * 1000,
+                }
+                for operation, (count, hash_time, wait_time, max_time) in self._latency.items()
+            },
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+hashing_pool = HashingPool(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE)
+
+
+# Асинхронное хеширование пароля
+async def hash_password_async(password: str) -> str:
+    return await hashing_pool.run('hash', hash_password, password)
+
+
+# Асинхронная проверка пароля
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await hashing_pool.run('verify', verify_password, plain_password, hashed_password)
+
+
+# Асинхронная проверка пароля с пересчетом устаревшего хеша: (верен ли пароль, новый хеш или None)
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await hashing_pool.run('verify', verify_and_update_password, plain_password, hashed_password)
@@ -0,0 +1,151 @@
+import os
+import time
+import fcntl
+import asyncio
+import logging
+import secrets
+from typing import Dict, List, NamedTuple, Optional
+
+import ecdsa
+from jose import jwk
+from jose.backends.base import Key
+
+from .config import JWT_ALGORITHM, JWT_KEYS_DIR, JWT_KEY_ROTATION_HOURS, JWT_KEY_RETENTION_HOURS, JWKS_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+# Алгоритм -> кривая для генерации ключа
+CURVES = {'ES256': ecdsa.NIST256p}
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    created_at: float
+    private_key: Key
+    public_key: Key
+
+
+class KeyRing:
+    """
+    Набор ключей подписи JWT в каталоге, общем для всех воркеров: каждый ключ — файл
+    <created_at в мс>-<random>.pem. Новый ключ сначала activation_delay секунд только публикуется
+    в JWKS, чтобы его успели подхватить остальные воркеры и кэши JWKS у потребителей,
+    и лишь затем начинает подписывать. После ротации старый ключ еще retention секунд
+    проверяет выданные им токены. Ротацию выполняет тот воркер, который первым заметит,
+    что ключ устарел (под flock).
+    """
+
+    def __init__(self, directory: str, algorithm: str = 'ES256', rotation: float = 30 * 86400,
+                 retention: float = 86400, activation_delay: float = 300, reload_interval: float = 5):
+        if algorithm not in CURVES:
+            raise ValueError(f"Неподдерживаемый алгоритм подписи: {algorithm}")
+        self.directory = directory
+        self.algorithm = algorithm
+        self.rotation = rotation
+        self.retention = retention
+        self.activation_delay = activation_delay
+        self.reload_interval = reload_interval
+        self._keys: Dict[str, SigningKey] = {}
+        self._loaded_at = 0.0
+
+    def _load(self):
+        keys = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pem'):
+                continue
+            kid = name[:-len('.pem')]
+            if kid in self._keys:
+                keys[kid] = self._keys[kid]
+                continue
+            try:
+                created_at = int(kid.split('-', 1)[0]) / 1000
+                with open(os.path.join(self.directory, name)) as f:
+                    private_key = jwk.construct(f.read(), self.algorithm)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Пропущен ключ подписи {name}: {e}")
+                continue
+            keys[kid] = SigningKey(kid, created_at, private_key, private_key.public_key())
+        self._keys = keys
+        self._loaded_at = time.monotonic()
+
+    def _generate(self, now: float):
+        kid = f"{int(now * 1000)}-{secrets.token_hex(4)}"
+        pem = ecdsa.SigningKey.generate(curve=CURVES[self.algorithm]).to_pem()
+        path = os.path.join(self.directory, f"{kid}.pem")
+        # Пишем во временный файл и переименовываем: другие воркеры не увидят недописанный ключ
+        fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pem)
+        os.replace(path + '.tmp', path)
+        logger.info(f"Создан новый ключ подписи JWT {kid}")
+
+    def rotate(self, force: bool = False):
+        """Создает новый ключ, если текущий старше rotation, и удаляет ключи старше retention."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._load()
+            now = time.time()
+            newest = max(self._keys.values(), key=lambda key: key.created_at, default=None)
+            if force or newest is None or now - newest.created_at >= self.rotation:
+                self._generate(now)
+                newest_created = now
+            else:
+                newest_created = newest.created_at
+            for key in self._keys.values():
+                # Ключ, замененный более retention секунд назад, больше не нужен для проверки
+                if key.created_at < newest_created and now - self._replaced_at(key) >= self.retention:
+                    os.remove(os.path.join(self.directory, f"{key.kid}.pem"))
+                    logger.info(f"Удален старый ключ подписи JWT {key.kid}")
+            self._load()
+
+    def _replaced_at(self, key: SigningKey) -> float:
+        # Ключ перестает подписывать, когда активируется следующий за ним
+        newer = [other.created_at for other in self._keys.values() if other.created_at > key.created_at]
+        return min(newer) + self.activation_delay if newer else time.time()
+
+    def _refresh(self):
+        # Ключи, созданные другим воркером, подхватываются не позже чем через reload_interval;
+        # уже загруженные ключи повторно не разбираются, так что это один listdir
+        if time.monotonic() - self._loaded_at >= self.reload_interval and os.path.isdir(self.directory):
+            self._load()
+
+    @property
+    def active(self) -> SigningKey:
+        """Самый новый из активированных ключей; пока активированных нет (первый запуск) — самый старый."""
+        self._refresh()
+        if not self._keys:
+            self.rotate()
+        activated_before = time.time() - self.activation_delay
+        activated = [key for key in self._keys.values() if key.created_at <= activated_before]
+        if not activated:
+            return min(self._keys.values(), key=lambda key: key.created_at)
+        return max(activated, key=lambda key: key.created_at)
+
+    def get(self, kid: str) -> Optional[SigningKey]:
+        key = self._keys.get(kid)
+        if key is None:
+            # Неизвестный kid — вероятно, другой воркер только что выполнил ротацию
+            self._refresh()
+            key = self._keys.get(kid)
+        return key
+
+    def jwks(self) -> dict:
+        self._refresh()
+        keys: List[dict] = []
+        for key in sorted(self._keys.values(), key=lambda key: key.created_at, reverse=True):
+            keys.append(dict(key.public_key.to_dict(), kid=key.kid, use='sig'))
+        return {'keys': keys}
+
+    async def rotate_forever(self, interval: float = 3600):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.rotate)
+            except Exception as e:
+                logger.error(f"Ошибка ротации ключей подписи JWT: {e}")
+
+
+key_ring = KeyRing(JWT_KEYS_DIR, algorithm=JWT_ALGORITHM if JWT_ALGORITHM in CURVES else 'ES256',
+                   rotation=JWT_KEY_ROTATION_HOURS * 3600, retention=JWT_KEY_RETENTION_HOURS * 3600,
+                   activation_delay=JWKS_MAX_AGE)
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import glob
+import asyncio
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from .config import METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL
+
+# Границы корзин гистограмм задержек, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def snapshot(self) -> list:
+        return [[list(labels), value] for labels, value in self._values.items()]
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счетчики по корзинам (последняя — +Inf), сумма]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def snapshot(self) -> list:
+        return [[list(labels), [list(counts), total]] for labels, (counts, total) in self._values.items()]
+
+
+class Registry:
+    """
+    Реестр метрик процесса. Счетчики и гистограммы обновляются на горячем пути (словарь + bisect),
+    gauge-значения (пулы, кэши) собираются функциями-коллекторами только при чтении /metrics.
+    """
+
+    def __init__(self, multiproc_dir: Optional[str] = None):
+        self.multiproc_dir = multiproc_dir
+        self._metrics: List = []
+        self._gauge_collectors: List[Callable[[], List[tuple]]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge_collector(self, collector: Callable[[], List[tuple]]):
+        """collector() возвращает список (name, documentation, {label: value}, value)."""
+        self._gauge_collectors.append(collector)
+        return collector
+
+    def snapshot(self) -> dict:
+        metrics = {}
+        for metric in self._metrics:
+            metrics[metric.name] = {
+                'type': metric.type,
+                'help': metric.documentation,
+                'labelnames': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.snapshot(),
+            }
+        gauges = []
+        for collector in self._gauge_collectors:
+            gauges.extend([name, documentation, labels, value]
+                          for name, documentation, labels, value in collector())
+        return {'pid': os.getpid(), 'time': time.time(), 'metrics': metrics, 'gauges': gauges}
+
+    # --- агрегация между воркерами ---
+
+    def _snapshot_path(self, pid: int) -> str:
+        return os.path.join(self.multiproc_dir, f"metrics-{pid}.json")
+
+    def write_snapshot(self):
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self) -> List[dict]:
+        """Снимки всех воркеров: свой берется из памяти, остальные — из multiproc_dir."""
+        own = self.snapshot()
+        if not self.multiproc_dir:
+            return [own]
+        snapshots = [own]
+        for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json')):
+            if path == self._snapshot_path(own['pid']):
+                continue
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # gauge-значения давно не обновлявшегося (остановленного) воркера неактуальны
+            if time.time() - snapshot['time'] > METRICS_FLUSH_INTERVAL * 3:
+                snapshot['gauges'] = []
+            snapshots.append(snapshot)
+        return snapshots
+
+    async def flush_forever(self, interval: float = METRICS_FLUSH_INTERVAL):
+        while True:
+            await asyncio.to_thread(self.write_snapshot)
+            await asyncio.sleep(interval)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def render_prometheus(snapshots: List[dict]) -> str:
+    """Складывает снимки воркеров и форматирует их в текстовый формат Prometheus."""
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot['metrics'].items():
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for labels, value in metric['samples']:
+                key = tuple(labels)
+                if metric['type'] == 'counter':
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+                else:
+                    counts, total = target['samples'].get(key, ([0] * len(value[0]), 0.0))
+                    target['samples'][key] = ([a + b for a, b in zip(counts, value[0])], total + value[1])
+
+    lines = []
+    for name, metric in merged.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labelnames']
+        for labels, value in metric['samples'].items():
+            if metric['type'] == 'counter':
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip(list(metric['buckets']) + ['+Inf'], counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+
+    # Gauge-значения не складываются: у каждого воркера своя метка pid
+    described = set()
+    for snapshot in snapshots:
+        for name, documentation, labels, value in snapshot['gauges']:
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+            labels = dict(labels, pid=snapshot['pid'])
+            lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {value}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(METRICS_MULTIPROC_DIR)
+
+HTTP_REQUESTS = registry.counter('http_requests_total', 'Число HTTP-запросов', ('method', 'route', 'status'))
+HTTP_LATENCY = registry.histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                                  ('method', 'route'))
+DB_QUERY_LATENCY = registry.histogram('db_query_duration_seconds', 'Время выполнения SQL-запроса', ('operation',))
+PASSWORD_HASH_LATENCY = registry.histogram('password_hash_duration_seconds',
+                                           'Время хеширования/проверки пароля в пуле', ('operation',))
+PASSWORD_HASH_REJECTED = registry.counter('password_hash_rejected_total',
+                                          'Задачи, отклоненные переполненным пулом хеширования')
+JWT_LATENCY = registry.histogram('jwt_duration_seconds', 'Подпись и проверка JWT', ('operation',),
+                                 buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01))
+NOTIFICATION_LATENCY = registry.histogram('notification_duration_seconds',
+                                          'Время отправки SMS/email провайдеру', ('channel', 'outcome'))
+WRITE_BEHIND_ROWS = registry.counter('write_behind_rows_total', 'Строки буферов отложенной записи',
+                                     ('buffer', 'outcome'))
+WRITE_BEHIND_FLUSH_LATENCY = registry.histogram('write_behind_flush_duration_seconds',
+                                                'Время вставки пачки из буфера отложенной записи',
+                                                ('buffer', 'outcome'))
+MATCHING_TICK_LATENCY = registry.histogram('matching_tick_duration_seconds', 'Время тика распределения заказов')
+MATCHING_REQUESTS = registry.counter('matching_requests_total', 'Заказы, прошедшие распределение', ('outcome',))
@@ -0,0 +1,225 @@
+import abc
+import time
+import asyncio
+import sqlite3
+import ipaddress
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+from collections import OrderedDict
+
+from .config import (RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, RATE_LIMITS, RATE_LIMITS_IP, RATE_LIMIT_MAX_KEYS,
+                     RATE_LIMIT_SQLITE_PATH, TRUSTED_PROXIES)
+
+
+class RateLimit(NamedTuple):
+    capacity: int  # сколько запросов можно сделать подряд
+    period: float  # за сколько секунд корзина наполняется полностью
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Слишком много запросов, повторите через {retry_after:.0f} с")
+        self.retry_after = retry_after
+
+
+def parse_rate_limits(value: str) -> Dict[str, RateLimit]:
+    """'login=10/60,send_code=3/60' -> {'login': RateLimit(10, 60), ...}"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        route, spec = item.split('=')
+        capacity, period = spec.split('/')
+        limits[route.strip()] = RateLimit(int(capacity), float(period))
+    return limits
+
+
+def _refill(tokens: float, updated: float, now: float, limit: RateLimit) -> float:
+    return min(limit.capacity, tokens + (now - updated) * limit.rate)
+
+
+def _retry_after(tokens: float, limit: RateLimit) -> float:
+    """Сколько ждать до следующего токена (0, если токен есть)."""
+    return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+
+Buckets = Sequence[Tuple[str, RateLimit]]
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class TokenBucketBackend(abc.ABC):
+    @abc.abstractmethod
+    async def take(self, buckets: Buckets) -> float:
+        """
+        Забирает по токену из каждой корзины, только если токен есть во всех: отклоненный
+        запрос не расходует остальные корзины. Возвращает 0, если запрос разрешен,
+        иначе через сколько секунд повторить.
+        """
+
+
+class InMemoryTokenBucketBackend(TokenBucketBackend):
+    """Корзины в памяти процесса; число ключей ограничено, старые вытесняются."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict = OrderedDict()  # key -> [tokens, updated]
+
+    async def take(self, buckets: Buckets) -> float:
+        now = time.monotonic()
+        states: List[list] = []
+        for key, limit in buckets:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(limit.capacity), now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            bucket[0], bucket[1] = _refill(bucket[0], bucket[1], now, limit), now
+            states.append(bucket)
+        retry_after = max((_retry_after(bucket[0], limit) for bucket, (_, limit) in zip(states, buckets)), default=0.0)
+        if not retry_after:
+            for bucket in states:
+                bucket[0] -= 1
+        return retry_after
+
+
+class SQLiteTokenBucketBackend(TokenBucketBackend):
+    """Общие корзины для нескольких воркеров на одном хосте (SQLite в режиме WAL)."""
+
+    def __init__(self, path: str, max_keys: int):
+        self.path = path
+        self.max_keys = max_keys
+        self._calls = 0
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _take(self, buckets: Buckets) -> float:
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            states = []
+            for key, limit in buckets:
+                row = conn.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row is not None else (float(limit.capacity), now)
+                states.append((key, _refill(tokens, updated, now, limit), limit))
+            retry_after = max((_retry_after(tokens, limit) for _, tokens, limit in states), default=0.0)
+            taken = 0 if retry_after else 1
+            conn.executemany("INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                             [(key, tokens - taken, now) for key, tokens, _ in states])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return retry_after
+
+    def _prune(self):
+        # Оставляем max_keys последних корзин, остальные удаляем
+        self._connect().execute(
+            "DELETE FROM rate_limit_buckets WHERE key NOT IN "
+            "(SELECT key FROM rate_limit_buckets ORDER BY updated DESC LIMIT ?)", (self.max_keys,)
+        )
+
+    async def take(self, buckets: Buckets) -> float:
+        self._calls += 1
+        if self._calls % 1000 == 0:
+            await asyncio.to_thread(self._prune)
+        return await asyncio.to_thread(self._take, buckets)
+
+
+class RateLimiter:
+    """
+    Token bucket по маршруту и ключам (телефон, email) и отдельно по IP клиента.
+    У IP свои, более высокие лимиты (ip_limits): за одним адресом NAT оператора или прокси
+    бывает много пользователей. Проверка выполняется до любых обращений к базе,
+    хеширования и провайдерам.
+    """
+
+    def __init__(self, backend: TokenBucketBackend, limits: Dict[str, RateLimit],
+                 ip_limits: Optional[Dict[str, RateLimit]] = None, enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.ip_limits = ip_limits or {}
+        self.enabled = enabled
+        self.rejected = 0
+
+    async def check(self, route: str, *keys: Optional[str], ip: Optional[str] = None):
+        if not self.enabled:
+            return
+        buckets = []
+        limit = self.limits.get(route)
+        if limit is not None:
+            buckets.extend((f"{route}:{key}", limit) for key in keys if key)
+        ip_limit = self.ip_limits.get(route)
+        if ip_limit is not None and ip:
+            buckets.append((f"{route}:ip:{ip}", ip_limit))
+        if not buckets:
+            return
+        retry_after = await self.backend.take(buckets)
+        if retry_after:
+            self.rejected += 1
+            raise RateLimitExceeded(retry_after)
+
+
+def parse_trusted_proxies(value: str) -> List[Network]:
+    """'10.0.0.0/8,127.0.0.1' -> список сетей, от которых принимается X-Forwarded-For."""
+    return [ipaddress.ip_network(item.strip(), strict=False) for item in value.split(',') if item.strip()]
+
+
+def _is_trusted(address: str, proxies: Sequence[Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in proxies)
+
+
+def resolve_client_ip(peer: Optional[str], forwarded_for: Optional[str],
+                      proxies: Sequence[Network]) -> Optional[str]:
+    """
+    IP клиента. X-Forwarded-For учитывается, только если соединение пришло от доверенного
+    прокси; цепочка читается справа налево до первого адреса не из доверенных сетей
+    (левые элементы клиент может подставить сам).
+    """
+    if not peer or not forwarded_for or not _is_trusted(peer, proxies):
+        return peer
+    for address in reversed([item.strip() for item in forwarded_for.split(',') if item.strip()]):
+        try:
+            ipaddress.ip_address(address)
+        except ValueError:
+            return peer  # Испорченный заголовок: не даем подставлять произвольные ключи корзин
+        if not _is_trusted(address, proxies):
+            return address
+    return peer
+
+
+trusted_proxies = parse_trusted_proxies(TRUSTED_PROXIES)
+
+
+def create_rate_limiter(backend: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    if backend == 'memory':
+        bucket_backend = InMemoryTokenBucketBackend(RATE_LIMIT_MAX_KEYS)
+    elif backend == 'sqlite':
+        bucket_backend = SQLiteTokenBucketBackend(RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_MAX_KEYS)
+    else:
+        raise ValueError(f"Неизвестное хранилище для rate limit: {backend}")
+    return RateLimiter(bucket_backend, parse_rate_limits(RATE_LIMITS), parse_rate_limits(RATE_LIMITS_IP),
+                       RATE_LIMIT_ENABLED)
+
+
+rate_limiter = create_rate_limiter()
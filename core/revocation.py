@@ -0,0 +1,38 @@
+import time
+from typing import Dict
+
+
+class RevocationList:
+    """
+    Отозванные сессии (sid из access-токена) с моментом, после которого запись не нужна:
+    к этому времени истекают все access-токены, выданные до отзыва.
+    Проверка — один поиск в словаре, без обращения к базе.
+    """
+
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._next_purge = 0.0
+
+    def add(self, session_id: str, expires_at: float):
+        if expires_at > self._revoked.get(session_id, 0.0):
+            self._revoked[session_id] = expires_at
+
+    def is_revoked(self, session_id: str) -> bool:
+        expires_at = self._revoked.get(session_id)
+        if expires_at is None:
+            return False
+        now = time.time()
+        if now >= self._next_purge:
+            self.purge(now)
+        return expires_at > now
+
+    def purge(self, now: float = None):
+        now = time.time() if now is None else now
+        self._revoked = {sid: expires_at for sid, expires_at in self._revoked.items() if expires_at > now}
+        self._next_purge = now + 60
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+
+revocation_list = RevocationList()
@@ -1,17 +1,61 @@
-from .config import SECRET
+from .config import (SECRET, JWT_ALGORITHM, JWT_ACCEPT_HS256, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_SCHEME, PASSWORD_BCRYPT_ROUNDS,
+                     PASSWORD_SCRYPT_ROUNDS, PASSWORD_SCRYPT_BLOCK_SIZE, PASSWORD_SCRYPT_PARALLELISM,
+                     PASSWORD_ARGON2_TIME_COST, PASSWORD_ARGON2_MEMORY_COST, PASSWORD_ARGON2_PARALLELISM)
+from .keys import CURVES, key_ring
+from .metrics import JWT_LATENCY
+import time
 import random
-from jose import jwt
-from typing import Optional
+import statistics
+from jose import jwt, JWTError
+from typing import Optional, Tuple
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
+from passlib.registry import get_crypt_handler
+
+# Поддерживаемые схемы хеширования паролей
+PASSWORD_SCHEMES = ('bcrypt', 'scrypt', 'argon2')
+
+# Параметр стоимости каждой схемы: (параметр passlib, переменная окружения, минимум, максимум)
+HASH_COST_PARAMETERS = {
+    'bcrypt': ('rounds', 'PASSWORD_BCRYPT_ROUNDS', 4, 20),
+    'scrypt': ('rounds', 'PASSWORD_SCRYPT_ROUNDS', 10, 18),
+    'argon2': ('time_cost', 'PASSWORD_ARGON2_TIME_COST', 1, 20),
+}
+
+
+def hash_cost_settings() -> dict:
+    """Текущие параметры стоимости всех схем в формате CryptContext."""
+    return {
+        'bcrypt__rounds': PASSWORD_BCRYPT_ROUNDS,
+        'scrypt__rounds': PASSWORD_SCRYPT_ROUNDS,
+        'scrypt__block_size': PASSWORD_SCRYPT_BLOCK_SIZE,
+        'scrypt__parallelism': PASSWORD_SCRYPT_PARALLELISM,
+        'argon2__time_cost': PASSWORD_ARGON2_TIME_COST,
+        'argon2__memory_cost': PASSWORD_ARGON2_MEMORY_COST,
+        'argon2__parallelism': PASSWORD_ARGON2_PARALLELISM,
+    }
+
+
+def create_password_context(scheme: str = PASSWORD_HASH_SCHEME) -> CryptContext:
+    """
+    Новые пароли хешируются схемой scheme, хеши остальных схем проверяются, но считаются
+    устаревшими. Хеш с другой стоимостью тоже устаревший (needs_update вернет True).
+    """
+    if scheme not in PASSWORD_SCHEMES:
+        raise ValueError(f"Неизвестная схема хеширования паролей: {scheme}")
+    schemes = [scheme] + [other for other in PASSWORD_SCHEMES if other != scheme]
+    return CryptContext(schemes=schemes, default=scheme, deprecated='auto', **hash_cost_settings())
+
 
 # Для хеширования паролей
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = create_password_context()
 
 # Секретный ключ для токенов
 SECRET_KEY = (SECRET)
-ALGORITHM = 'HS256'
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# HS256 подписывает общим SECRET; ES256 — ключом из key_ring, kid ключа пишется в заголовок токена
+ALGORITHM = JWT_ALGORITHM
+if ALGORITHM != 'HS256' and ALGORITHM not in CURVES:
+    raise ValueError(f"Неподдерживаемый алгоритм подписи JWT: {ALGORITHM}")
 
 
 def generate_verification_code():
@@ -28,12 +72,60 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# Проверка пароля и новый хеш, если текущий устарел (иначе None)
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def calibrate_hash_cost(scheme: str, target_ms: float, samples: int = 3) -> Tuple[int, float]:
+    """
+    Подбирает максимальную стоимость схемы, при которой один хеш на этой машине
+    считается не дольше target_ms. Возвращает (стоимость, медианное время в секундах).
+    """
+    parameter, _, low, high = HASH_COST_PARAMETERS[scheme]
+    fixed = {key.split('__')[1]: value for key, value in hash_cost_settings().items()
+             if key.startswith(scheme + '__') and key.split('__')[1] != parameter}
+    handler = get_crypt_handler(scheme)
+    best = None
+    for cost in range(low, high + 1):
+        configured = handler.using(**fixed, **{parameter: cost})
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            configured.hash('calibration-password')
+            timings.append(time.perf_counter() - started)
+        elapsed = statistics.median(timings)
+        if best is not None and elapsed * 1000 > target_ms:
+            break
+        best = (cost, elapsed)
+    return best
+
+
 # Создание JWT токена
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
+        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({'exp': expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    with JWT_LATENCY.time('sign'):
+        if ALGORITHM == 'HS256':
+            return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        key = key_ring.active
+        return jwt.encode(to_encode, key.private_key, algorithm=ALGORITHM, headers={'kid': key.kid})
+
+
+# Проверка подписи и срока действия JWT токена (бросает jose.JWTError)
+def decode_access_token(token: str) -> dict:
+    with JWT_LATENCY.time('verify'):
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            # Токен без kid подписан общим SECRET (HS256)
+            if ALGORITHM != 'HS256' and not JWT_ACCEPT_HS256:
+                raise JWTError("Токены HS256 больше не принимаются")
+            return jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+        key = key_ring.get(kid)
+        if key is None:
+            raise JWTError(f"Неизвестный ключ подписи: {kid}")
+        return jwt.decode(token, key.public_key, algorithms=[key_ring.algorithm])
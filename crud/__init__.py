@@ -0,0 +1,6 @@
+from .cache import user_cache
+from .support import support_buffer
+from .trips import trip_buffer
+from .breadcrumbs import breadcrumb_writer
+
+__all__ = ('user_cache', 'support_buffer', 'trip_buffer', 'breadcrumb_writer')
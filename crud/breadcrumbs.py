@@ -0,0 +1,141 @@
+import time
+from array import array
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import (BREADCRUMB_MAX_BATCH, BREADCRUMB_FLUSH_INTERVAL, BREADCRUMB_MAX_PENDING,
+                         BREADCRUMB_THIN_INTERVAL)
+from core.metrics import WRITE_BEHIND_ROWS, WRITE_BEHIND_FLUSH_LATENCY
+from models.breadcrumbs import GpsBreadcrumb
+from sql_app.database import get_engine
+from sql_app.write_behind import WriteBehindBuffer
+
+COLUMNS = ('driver_id', 'recorded_at', 'lat', 'lon', 'available')
+
+
+class BreadcrumbBatch:
+    """
+    Точки по колонкам в массивах array: ~33 байта на точку против ~300 байт у dict
+    и без отдельного объекта Python на каждое значение (меньше работы сборщику мусора).
+    """
+    __slots__ = ('driver_ids', 'timestamps', 'lats', 'lons', 'available')
+
+    def __init__(self):
+        self.driver_ids = array('q')
+        self.timestamps = array('d')  # unix time, секунды
+        self.lats = array('d')
+        self.lons = array('d')
+        self.available = array('b')
+
+    def __len__(self) -> int:
+        return len(self.driver_ids)
+
+    def append(self, driver_id: int, timestamp: float, lat: float, lon: float, available: bool):
+        self.driver_ids.append(driver_id)
+        self.timestamps.append(timestamp)
+        self.lats.append(lat)
+        self.lons.append(lon)
+        self.available.append(available)
+
+    def extend(self, other: 'BreadcrumbBatch'):
+        for column in self.__slots__:
+            getattr(self, column).extend(getattr(other, column))
+
+    def records(self) -> Iterator[Tuple[int, datetime, float, float, bool]]:
+        """Строки для COPY в порядке COLUMNS; кортежи создаются по ходу отправки, а не все сразу."""
+        moments = (datetime.fromtimestamp(timestamp, timezone.utc) for timestamp in self.timestamps)
+        return zip(self.driver_ids, moments, self.lats, self.lons, map(bool, self.available))
+
+
+class BreadcrumbWriter(WriteBehindBuffer):
+    """
+    Буфер отложенной записи пингов водителей: точки копятся в BreadcrumbBatch, и фоновая
+    задача отправляет все накопленное одним COPY (asyncpg copy_records_to_table), как только
+    набралось max_batch точек или прошло flush_interval секунд. Одновременно идет не больше
+    одного COPY: пока он выполняется, новые точки пишутся в свежий буфер.
+
+    Если база не успевает, буфер растет. Выше половины max_pending точки прореживаются:
+    от водителя сохраняется не больше одной точки в thin_interval секунд, так что трек
+    становится реже, но не обрывается. На max_pending (вместе с точками в COPY) новые
+    точки отбрасываются: память воркера ограничена, а местоположение в индекс свободных
+    водителей попадает в любом случае.
+
+    При падении процесса теряется то, что еще не записано: при исправной базе — не больше
+    flush_interval секунд или max_batch точек, при недоступной — не больше max_pending.
+    При штатной остановке буфер дописывается (stop).
+    """
+
+    def __init__(self, engine_factory: Callable[[], AsyncEngine], max_batch: int = 5000,
+                 flush_interval: float = 2.0, max_pending: int = 500000, thin_interval: float = 10,
+                 max_backoff: float = 30):
+        super().__init__('gps_breadcrumbs', GpsBreadcrumb.__table__, engine_factory, max_batch=max_batch,
+                         flush_interval=flush_interval, max_pending=max_pending, max_backoff=max_backoff)
+        self.thin_interval = thin_interval
+        self._rows = BreadcrumbBatch()
+        self._in_flight = 0
+        self._thinning: Dict[int, float] = {}  # driver_id -> время последней сохраненной точки, пока база отстает
+        self.thinned = 0
+
+    def record(self, driver_id: int, lat: float, lon: float, available: bool,
+               timestamp: Optional[float] = None) -> bool:
+        """Ставит точку в буфер; False, если она отброшена или прорежена из-за отставания базы."""
+        pending = len(self._rows) + self._in_flight
+        if pending >= self.max_pending:
+            self.rejected += 1
+            WRITE_BEHIND_ROWS.inc(self.name, 'rejected')
+            return False
+        timestamp = timestamp if timestamp is not None else time.time()
+        if pending >= self.max_pending // 2:
+            last = self._thinning.get(driver_id)
+            if last is not None and timestamp - last < self.thin_interval:
+                self.thinned += 1
+                WRITE_BEHIND_ROWS.inc(self.name, 'thinned')
+                return False
+            self._thinning[driver_id] = timestamp
+        elif self._thinning:
+            self._thinning.clear()
+        if self._task is None:
+            self.start()
+        self._rows.append(driver_id, timestamp, lat, lon, available)
+        if len(self._rows) >= self.max_batch:
+            self._wakeup.set()
+        return True
+
+    def add(self, row: dict):
+        self.record(row['driver_id'], row['lat'], row['lon'], row['available'], row.get('timestamp'))
+
+    async def flush(self) -> int:
+        """Отправляет одним COPY все накопленные точки. При ошибке точки возвращаются в начало буфера."""
+        if not self._rows:
+            return 0
+        batch, self._rows = self._rows, BreadcrumbBatch()
+        self._in_flight = len(batch)
+        started = time.perf_counter()
+        try:
+            await self._copy(batch)
+        except BaseException:
+            batch.extend(self._rows)
+            self._rows = batch
+            WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - started, self.name, 'error')
+            raise
+        finally:
+            self._in_flight = 0
+        WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - started, self.name, 'ok')
+        WRITE_BEHIND_ROWS.inc(self.name, 'written', amount=len(batch))
+        self.written += len(batch)
+        return len(batch)
+
+    async def _copy(self, batch: BreadcrumbBatch):
+        async with self.engine_factory().connect() as conn:
+            driver = (await conn.get_raw_connection()).driver_connection
+            await driver.copy_records_to_table(self.table.name, columns=COLUMNS, records=batch.records())
+
+    def stats(self) -> dict:
+        return dict(super().stats(), in_flight=self._in_flight, thinned=self.thinned)
+
+
+breadcrumb_writer = BreadcrumbWriter(get_engine, max_batch=BREADCRUMB_MAX_BATCH,
+                                     flush_interval=BREADCRUMB_FLUSH_INTERVAL, max_pending=BREADCRUMB_MAX_PENDING,
+                                     thin_interval=BREADCRUMB_THIN_INTERVAL)
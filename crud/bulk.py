@@ -0,0 +1,233 @@
+import io
+import csv
+import json
+import asyncio
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core import hash_password
+from core.hashing import HashingPool
+from core.config import BULK_IMPORT_BATCH_SIZE, BULK_IMPORT_HASH_WORKERS
+from models.users import User
+from schemas import UserCreateSchema
+from .cache import user_cache
+
+IMPORT_COLUMNS = ('first_name', 'last_name', 'phone', 'email', 'hashed_password', 'language',
+                  'notifications_enabled')
+EXPORT_COLUMNS = ('id', 'first_name', 'last_name', 'phone', 'email', 'language', 'notifications_enabled')
+MAX_REPORTED_REJECTIONS = 1000
+
+# Долгоживущий пул процессов для импорта, отдельный от hashing_pool: хеширование пачки
+# не отнимает воркеры у входа и регистрации. Очередь рассчитана на одну пачку; при
+# нескольких импортах сразу лишние получают HashingPoolSaturated (503)
+import_hashing_pool = HashingPool('process', BULK_IMPORT_HASH_WORKERS, max_queue=BULK_IMPORT_BATCH_SIZE)
+
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected_total = 0
+        self.rejected: List[dict] = []  # первые MAX_REPORTED_REJECTIONS отклоненных строк
+
+    def reject(self, line: int, reason: str):
+        self.rejected_total += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTIONS:
+            self.rejected.append({'line': line, 'reason': reason})
+
+    def as_dict(self) -> dict:
+        return {'inserted': self.inserted, 'rejected_total': self.rejected_total, 'rejected': self.rejected}
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Разбивает поток байтов на строки (еще не декодированные), не загружая файл целиком."""
+    buffer = b''
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+async def iter_records(lines: AsyncIterator[bytes], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], str]]:
+    """
+    Возвращает (номер строки, запись, ошибка разбора). Файл ожидается в UTF-8 (BOM в начале
+    допускается, его ставит Excel); строка в другой кодировке отклоняется, а не прерывает импорт.
+    CSV ожидается с заголовком, значения внутри одной строки (переносы строк внутри полей
+    не поддерживаются).
+    """
+    header = None
+    line_no = 0
+    async for raw in lines:
+        line_no += 1
+        try:
+            line = raw.decode('utf-8-sig' if line_no == 1 else 'utf-8').rstrip('\r')
+        except UnicodeDecodeError as e:
+            yield line_no, None, f"строка не в кодировке UTF-8: {e.reason}"
+            continue
+        if not line.strip():
+            continue
+        try:
+            if fmt == 'jsonl':
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("ожидается JSON-объект")
+            else:
+                values = next(csv.reader([line]))
+                if header is None:
+                    header = [name.strip() for name in values]
+                    continue
+                record = {name: value for name, value in zip(header, values) if value != ''}
+        except (ValueError, csv.Error) as e:
+            yield line_no, None, f"ошибка разбора: {e}"
+            continue
+        yield line_no, record, ''
+
+
+def _validate(record: dict) -> dict:
+    user = UserCreateSchema(**record)
+    if not user.phone and not user.email:
+        raise ValueError("нужно указать телефон или почту")
+    notifications = record.get('notifications_enabled', True)
+    if isinstance(notifications, str):
+        notifications = notifications.strip().lower() not in ('0', 'false', 'no', '')
+    return {
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'phone': user.phone,
+        'email': user.email,
+        'password': user.password,
+        'language': record.get('language') or 'russian',
+        'notifications_enabled': bool(notifications),
+    }
+
+
+async def _hash_passwords(pool: HashingPool, passwords: List[str]) -> List[str]:
+    hashes = []
+    for offset in range(0, len(passwords), pool.capacity):
+        hashes.extend(await asyncio.gather(*(pool.run('import', hash_password, password)
+                                             for password in passwords[offset:offset + pool.capacity])))
+    return hashes
+
+
+async def _insert_copy(engine: AsyncEngine, rows: List[dict]) -> List[Tuple[str, str]]:
+    """
+    COPY во временную таблицу и INSERT ... ON CONFLICT DO NOTHING в одной транзакции asyncpg.
+    Соединение отдельное, а не соединение сессии: если в сессии уже открыта транзакция,
+    transaction() asyncpg стала бы точкой сохранения и строки откатились бы вместе с сессией.
+    Транзакция фиксируется при выходе из блока transaction().
+    """
+    async with engine.connect() as connection:
+        driver = (await connection.get_raw_connection()).driver_connection
+        async with driver.transaction():
+            await driver.execute(
+                "CREATE TEMP TABLE users_import (first_name varchar, last_name varchar, phone varchar, "
+                "email varchar, hashed_password varchar, language varchar, notifications_enabled boolean) "
+                "ON COMMIT DROP"
+            )
+            await driver.copy_records_to_table(
+                'users_import', columns=IMPORT_COLUMNS,
+                records=[tuple(row[column] for column in IMPORT_COLUMNS) for row in rows],
+            )
+            columns = ', '.join(IMPORT_COLUMNS)
+            inserted = await driver.fetch(
+                f"INSERT INTO users ({columns}) SELECT {columns} FROM users_import "
+                f"ON CONFLICT DO NOTHING RETURNING phone, email"
+            )
+    return [(record['phone'], record['email']) for record in inserted]
+
+
+async def _insert_batched(session: AsyncSession, rows: List[dict]) -> List[Tuple[str, str]]:
+    statement = (postgresql.insert(User)
+                 .values([{column: row[column] for column in IMPORT_COLUMNS} for row in rows])
+                 .on_conflict_do_nothing()
+                 .returning(User.phone, User.email))
+    inserted = (await session.execute(statement)).all()
+    await session.commit()
+    return [tuple(row) for row in inserted]
+
+
+async def _flush_batch(session: AsyncSession, pool: HashingPool, batch: List[Tuple[int, dict]],
+                       method: str, report: ImportReport):
+    hashes = await _hash_passwords(pool, [row['password'] for _, row in batch])
+    rows = [dict(row, hashed_password=hashed) for (_, row), hashed in zip(batch, hashes)]
+    if method == 'copy':
+        inserted = await _insert_copy(session.bind, rows)
+    else:
+        inserted = await _insert_batched(session, rows)
+
+    inserted_keys = set(inserted)
+    report.inserted += len(inserted)
+    for line_no, row in batch:
+        if (row['phone'], row['email']) not in inserted_keys:
+            report.reject(line_no, 'пользователь с таким телефоном или почтой уже существует')
+    for phone, email in inserted:
+        user_cache.invalidate(phone=phone, email=email)
+
+
+async def import_users(session: AsyncSession, records: AsyncIterator[Tuple[int, Optional[dict], str]],
+                       method: str = 'copy', batch_size: int = BULK_IMPORT_BATCH_SIZE,
+                       pool: HashingPool = import_hashing_pool) -> ImportReport:
+    """
+    Потоковый импорт: записи валидируются, дубли внутри файла отбрасываются, пароли
+    хешируются пачкой в пуле процессов (import_hashing_pool), пачка вставляется через COPY
+    (method='copy') или многострочный INSERT (method='insert'). Каждая пачка коммитится отдельно.
+    """
+    report = ImportReport()
+    seen_phones, seen_emails = set(), set()
+    batch: List[Tuple[int, dict]] = []
+
+    async for line_no, record, error in records:
+        if record is None:
+            report.reject(line_no, error)
+            continue
+        try:
+            row = _validate(record)
+        except ValidationError as e:
+            error = e.errors()[0]
+            report.reject(line_no, f"некорректное поле {'.'.join(map(str, error['loc']))}: {error['msg']}")
+            continue
+        except (ValueError, TypeError) as e:
+            report.reject(line_no, f"некорректные данные: {e}")
+            continue
+        if (row['phone'] and row['phone'] in seen_phones) or (row['email'] and row['email'] in seen_emails):
+            report.reject(line_no, 'дубликат в файле')
+            continue
+        if row['phone']:
+            seen_phones.add(row['phone'])
+        if row['email']:
+            seen_emails.add(row['email'])
+
+        batch.append((line_no, row))
+        if len(batch) >= batch_size:
+            await _flush_batch(session, pool, batch, method, report)
+            batch = []
+    if batch:
+        await _flush_batch(session, pool, batch, method, report)
+    return report
+
+
+def _format_row(row: Iterable, fmt: str) -> str:
+    values = list(row)
+    if fmt == 'jsonl':
+        return json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False) + '\n'
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(['' if value is None else value for value in values])
+    return buffer.getvalue()
+
+
+async def export_users(session: AsyncSession, fmt: str = 'csv', batch_size: int = 1000) -> AsyncIterator[str]:
+    """Выгрузка серверным курсором: в памяти держится не больше batch_size строк."""
+    if fmt == 'csv':
+        yield _format_row(EXPORT_COLUMNS, 'csv')
+    columns = [getattr(User, column) for column in EXPORT_COLUMNS]
+    statement = select(*columns).order_by(User.id).execution_options(yield_per=batch_size)
+    result = await session.stream(statement)
+    async for partition in result.partitions(batch_size):
+        yield ''.join(_format_row(row, fmt) for row in partition)
+
@@ -0,0 +1,74 @@
+from typing import NamedTuple, Optional, Union
+
+from core.cache import LRUTTLCache, MISSING
+from core.config import USER_CACHE_ENABLED, USER_CACHE_MAX_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL
+from models.users import User
+
+
+class CachedUser(NamedTuple):
+    # Копия пользователя для кэша: без хеша пароля, который должен читаться только из базы
+    id: int
+    first_name: str
+    last_name: str
+    phone: Optional[str]
+    email: Optional[str]
+    language: Optional[str]
+    notifications_enabled: Optional[bool]
+    role: str
+
+    @classmethod
+    def from_user(cls, user: User) -> 'CachedUser':
+        return cls(user.id, user.first_name, user.last_name, user.phone, user.email, user.language,
+                   user.notifications_enabled, user.role)
+
+
+class UserCache:
+    """
+    Read-through кэш пользователей по ключам ('id', ...), ('phone', ...), ('email', ...).
+    Хранит CachedUser без хеша пароля: вход всегда проверяет хеш из базы, поэтому смена
+    пароля действует во всех воркерах сразу.
+    Отсутствие пользователя тоже кэшируется (None) на короткое время negative_ttl —
+    это ускоряет проверки при регистрации и входе.
+    Кэш локален для процесса: другие воркеры увидят изменения не позже чем через ttl.
+    """
+
+    def __init__(self, enabled: bool, max_size: int, ttl: float, negative_ttl: float):
+        self.enabled = enabled
+        self.negative_ttl = negative_ttl
+        self._cache = LRUTTLCache(max_size, ttl)
+
+    def get(self, field: str, value):
+        """Возвращает CachedUser, None (пользователя точно нет) или MISSING (нет в кэше)."""
+        if not self.enabled or value is None:
+            return MISSING
+        return self._cache.get((field, value))
+
+    def put(self, field: str, value, user: Optional[User]):
+        if not self.enabled or value is None:
+            return
+        if user is None:
+            self._cache.set((field, value), None, ttl=self.negative_ttl)
+            return
+        cached = CachedUser.from_user(user)
+        self._cache.set(('id', user.id), cached)
+        if user.phone:
+            self._cache.set(('phone', user.phone), cached)
+        if user.email:
+            self._cache.set(('email', user.email), cached)
+
+    def invalidate(self, user: Optional[Union[User, CachedUser]] = None, *, user_id: Optional[int] = None,
+                   phone: Optional[str] = None, email: Optional[str] = None):
+        if user is not None:
+            user_id, phone, email = user.id, user.phone, user.email
+        for key in (('id', user_id), ('phone', phone), ('email', email)):
+            if key[1] is not None:
+                self._cache.delete(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        return dict(self._cache.stats(), enabled=self.enabled)
+
+
+user_cache = UserCache(USER_CACHE_ENABLED, USER_CACHE_MAX_SIZE, USER_CACHE_TTL, USER_CACHE_NEGATIVE_TTL)
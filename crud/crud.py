@@ -1,18 +1,136 @@
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy import Integer, any_, bindparam, cast, update
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from core.cache import MISSING
 from models.users import User
+from .cache import user_cache
+from .search import escape_like
 
 
-async def get_user_by_email(session: AsyncSession, email: str) -> User:
+# Из кэша возвращается CachedUser (без хеша пароля), из базы — User.
+# use_cache=False нужен, когда пользователя будут изменять в этой же сессии:
+# объект из кэша не привязан к сессии, и commit его не сохранит.
+async def get_user_by_email(session: AsyncSession, email: str, use_cache: bool = True) -> User:
+    if use_cache:
+        cached = user_cache.get('email', email)
+        if cached is not MISSING:
+            return cached
     result = await session.execute(select(User).filter(User.email == email))
-    return result.scalars().first()
+    user = result.scalars().first()
+    if use_cache:
+        user_cache.put('email', email, user)
+    return user
 
 
-async def get_user_by_phone(session: AsyncSession, phone: str) -> User:
+async def get_user_by_phone(session: AsyncSession, phone: str, use_cache: bool = True) -> User:
+    if use_cache:
+        cached = user_cache.get('phone', phone)
+        if cached is not MISSING:
+            return cached
     result = await session.execute(select(User).filter(User.phone == phone))
-    return result.scalars().first()
+    user = result.scalars().first()
+    if use_cache:
+        user_cache.put('phone', phone, user)
+    return user
 
 
-async def get_user_by_id(session: AsyncSession, user_id: int):
+async def get_user_by_id(session: AsyncSession, user_id: int, use_cache: bool = True):
+    if use_cache:
+        cached = user_cache.get('id', user_id)
+        if cached is not MISSING:
+            return cached
     result = await session.execute(select(User).where(User.id == user_id))
-    return result.scalars().first()
+    user = result.scalars().first()
+    if use_cache:
+        user_cache.put('id', user_id, user)
+    return user
+
+
+class LoginIdentity(NamedTuple):
+    id: int
+    hashed_password: str
+
+
+# Для входа нужны только id и хеш пароля: выбираем две колонки без создания ORM-объекта.
+# Запросы собраны один раз, поэтому SQLAlchemy и asyncpg переиспользуют скомпилированный/подготовленный запрос.
+_LOGIN_BY_EMAIL = select(User.id, User.hashed_password).where(User.email == bindparam('identifier'))
+_LOGIN_BY_PHONE = select(User.id, User.hashed_password).where(User.phone == bindparam('identifier'))
+
+
+async def get_login_identity(session: AsyncSession, email: Optional[str] = None,
+                             phone: Optional[str] = None) -> Optional[LoginIdentity]:
+    field, identifier = ('email', email) if email else ('phone', phone)
+    # Хеш пароля всегда читается из базы (после смены пароля старый не должен приниматься ни в одном
+    # воркере); кэш лишь отвечает, что такого пользователя нет
+    if user_cache.get(field, identifier) is None:
+        return None
+
+    statement = _LOGIN_BY_EMAIL if email else _LOGIN_BY_PHONE
+    row = (await session.execute(statement, {'identifier': identifier})).first()
+    if row is None:
+        user_cache.put(field, identifier, None)
+        return None
+    return LoginIdentity(*row)
+
+
+async def update_password_hash(session: AsyncSession, user_id: int, old_hash: str, new_hash: str) -> bool:
+    """
+    Заменяет хеш пароля, только если он не изменился с момента проверки
+    (пароль могли сменить параллельно). Возвращает True, если хеш обновлен.
+    """
+    result = await session.execute(
+        update(User)
+        .where(User.id == user_id, User.hashed_password == old_hash)
+        .values(hashed_password=new_hash)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount > 0
+
+
+async def update_preferences(session: AsyncSession, user_id: int, language: str,
+                             notifications_enabled: bool) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+    """
+    Один UPDATE ... RETURNING без загрузки пользователя. Возвращает (id, phone, email)
+    для сброса кэша или None, если пользователя нет.
+    """
+    statement = (update(User)
+                 .where(User.id == user_id)
+                 .values(language=language, notifications_enabled=notifications_enabled)
+                 .returning(User.id, User.phone, User.email)
+                 .execution_options(synchronize_session=False))
+    row = (await session.execute(statement)).first()
+    await session.commit()
+    return tuple(row) if row else None
+
+
+async def update_role(session: AsyncSession, user_id: int,
+                      role: str) -> Optional[Tuple[int, Optional[str], Optional[str]]]:
+    """Меняет роль пользователя; как update_preferences, возвращает (id, phone, email) или None."""
+    statement = (update(User)
+                 .where(User.id == user_id)
+                 .values(role=role)
+                 .returning(User.id, User.phone, User.email)
+                 .execution_options(synchronize_session=False))
+    row = (await session.execute(statement)).first()
+    await session.commit()
+    return tuple(row) if row else None
+
+
+async def bulk_update_preferences(session: AsyncSession, values: dict, user_ids: Optional[List[int]] = None,
+                                  phone_prefix: Optional[str] = None) -> int:
+    """
+    Меняет language/notifications_enabled у всех выбранных пользователей одним UPDATE.
+    Список id передается одним параметром-массивом (= ANY), а не тысячами параметров IN.
+    Возвращает число измененных строк.
+    """
+    statement = update(User).values(**values).execution_options(synchronize_session=False)
+    if user_ids is not None:
+        statement = statement.where(User.id == any_(cast(user_ids, ARRAY(Integer))))
+    if phone_prefix:
+        statement = statement.where(User.phone.like(escape_like(phone_prefix) + '%', escape='!'))
+    result = await session.execute(statement)
+    await session.commit()
+    return result.rowcount
@@ -0,0 +1,61 @@
+import json
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.users import User
+from .bulk import EXPORT_COLUMNS
+
+# Выражения совпадают с индексами из миграции (lower(email) text_pattern_ops и триграммный
+# индекс по lower(first_name || ' ' || last_name)), иначе планировщик их не использует.
+# Пробел — литерал, а не параметр запроса, по той же причине.
+EMAIL_LOWER = func.lower(User.email)
+FULL_NAME_LOWER = func.lower(User.first_name + literal_column("' '") + User.last_name)
+
+
+# Экранирующий символ '!' вместо обратной косой черты: ее запись в SQL зависит от standard_conforming_strings
+def escape_like(value: str) -> str:
+    return value.replace('!', '!!').replace('%', '!%').replace('_', '!_')
+
+
+def build_search_query(phone: Optional[str] = None, email: Optional[str] = None, name: Optional[str] = None,
+                       after_id: Optional[int] = None, limit: int = 100):
+    """
+    Поиск по префиксу телефона и почты и по подстроке имени с keyset-пагинацией по id:
+    следующая страница начинается после последнего id предыдущей, OFFSET не используется.
+    """
+    columns = [getattr(User, column) for column in EXPORT_COLUMNS]
+    statement = select(*columns).order_by(User.id).limit(limit)
+    if phone:
+        statement = statement.where(User.phone.like(escape_like(phone) + '%', escape='!'))
+    if email:
+        statement = statement.where(EMAIL_LOWER.like(escape_like(email.lower()) + '%', escape='!'))
+    if name:
+        statement = statement.where(FULL_NAME_LOWER.like('%' + escape_like(name.lower()) + '%', escape='!'))
+    if after_id is not None:
+        statement = statement.where(User.id > after_id)
+    return statement
+
+
+async def search_users(session: AsyncSession, phone: Optional[str] = None, email: Optional[str] = None,
+                       name: Optional[str] = None, after_id: Optional[int] = None, limit: int = 100,
+                       batch_size: int = 500) -> AsyncIterator[str]:
+    """
+    Страница результатов в виде JSON, который отдается по частям:
+    {"users": [...], "next_after_id": <id последней строки или null, если страница неполная>}.
+    """
+    statement = build_search_query(phone, email, name, after_id, limit).execution_options(yield_per=batch_size)
+    result = await session.stream(statement)
+    yield '{"users": ['
+    count, last_id = 0, None
+    async for partition in result.partitions(batch_size):
+        chunk = []
+        for row in partition:
+            chunk.append(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False))
+            last_id = row.id
+        yield (',' if count else '') + ','.join(chunk)
+        count += len(chunk)
+    next_after_id = last_id if count == limit else None
+    yield f'], "next_after_id": {json.dumps(next_after_id)}}}'
@@ -0,0 +1,65 @@
+import json
+import base64
+import binascii
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import SUPPORT_BUFFER_MAX_BATCH, SUPPORT_BUFFER_FLUSH_INTERVAL, SUPPORT_BUFFER_MAX_PENDING
+from models.support import SupportMessage
+from sql_app.database import get_engine
+from sql_app.write_behind import WriteBehindBuffer
+
+# Сообщения не вставляются по одному в запросе: буфер пишет их пачками
+support_buffer = WriteBehindBuffer('support_messages', SupportMessage.__table__, get_engine,
+                                   max_batch=SUPPORT_BUFFER_MAX_BATCH,
+                                   flush_interval=SUPPORT_BUFFER_FLUSH_INTERVAL,
+                                   max_pending=SUPPORT_BUFFER_MAX_PENDING)
+
+
+def submit_support_message(user_id: int, message: str):
+    """Ставит сообщение в буфер; WriteBehindFull, если база давно не принимает записи."""
+    support_buffer.add({'user_id': user_id, 'message': message, 'created_at': datetime.now(timezone.utc)})
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), message_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Разбирает курсор из encode_cursor (ValueError, если он поврежден)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, message_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(message_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"некорректный курсор: {e}")
+
+
+async def list_support_messages(session: AsyncSession, user_id: Optional[int] = None, cursor: Optional[str] = None,
+                                limit: int = 50) -> Tuple[List[dict], Optional[str]]:
+    """
+    Сообщения от новых к старым с keyset-пагинацией по (created_at, id): каждая страница —
+    один проход по индексу без OFFSET, поэтому глубокие страницы не медленнее первой.
+    Возвращает (сообщения, курсор следующей страницы или None).
+    """
+    statement = (select(SupportMessage.id, SupportMessage.user_id, SupportMessage.message, SupportMessage.created_at)
+                 .order_by(SupportMessage.created_at.desc(), SupportMessage.id.desc())
+                 .limit(limit + 1))
+    if user_id is not None:
+        statement = statement.where(SupportMessage.user_id == user_id)
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        statement = statement.where(tuple_(SupportMessage.created_at, SupportMessage.id) < (created_at, message_id))
+
+    rows = (await session.execute(statement)).all()
+    messages = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = messages[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return messages, next_cursor
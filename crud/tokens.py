@@ -0,0 +1,172 @@
+import uuid
+import asyncio
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import func, update, delete
+from sqlalchemy.future import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core import create_access_token
+from core.config import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, REVOCATION_SYNC_INTERVAL
+from core.revocation import RevocationList, revocation_list
+from models.tokens import RefreshToken, RevokedSession
+from models.users import User
+from sql_app.database import get_engine
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_TTL = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+REFRESH_TOKEN_TTL = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _subject(email: Optional[str], phone: Optional[str]) -> str:
+    return email if email else phone
+
+
+async def issue_tokens(session: AsyncSession, user_id: int, sub: str, session_id: Optional[str] = None) -> dict:
+    """
+    Выдает пару access/refresh. Access-токен несет sid сессии — по нему проверяется отзыв.
+    Refresh-токен — случайная строка, в базе хранится только ее sha256.
+    """
+    session_id = session_id or uuid.uuid4().hex
+    refresh_token = secrets.token_urlsafe(32)
+    session.add(RefreshToken(token_hash=_hash_token(refresh_token), session_id=session_id, user_id=user_id,
+                             expires_at=datetime.now(timezone.utc) + REFRESH_TOKEN_TTL))
+    await session.commit()
+    access_token = create_access_token(data={'sub': sub, 'uid': user_id, 'sid': session_id},
+                                       expires_delta=ACCESS_TOKEN_TTL)
+    return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'Bearer'}
+
+
+async def rotate_refresh_token(session: AsyncSession, refresh_token: str) -> Optional[dict]:
+    """
+    Погашает refresh-токен и выдает новую пару в той же сессии. Погашение — один UPDATE
+    с условием revoked_at IS NULL, поэтому два параллельных запроса не получат две пары.
+    Повторное предъявление уже погашенного токена означает, что его украли:
+    сессия отзывается целиком. Возвращает None, если токен недействителен.
+    """
+    token_hash = _hash_token(refresh_token)
+    statement = (update(RefreshToken)
+                 .where(RefreshToken.token_hash == token_hash,
+                        RefreshToken.revoked_at.is_(None),
+                        RefreshToken.expires_at > func.now(),
+                        User.id == RefreshToken.user_id)
+                 .values(revoked_at=func.now())
+                 .returning(RefreshToken.user_id, RefreshToken.session_id, User.email, User.phone)
+                 .execution_options(synchronize_session=False))
+    row = (await session.execute(statement)).first()
+    if row is None:
+        await session.rollback()
+        reused = (await session.execute(
+            select(RefreshToken.user_id, RefreshToken.session_id)
+            .where(RefreshToken.token_hash == token_hash, RefreshToken.revoked_at.is_not(None))
+        )).first()
+        if reused is not None:
+            logger.warning(f"Повторное использование refresh-токена, сессия {reused.session_id} отозвана")
+            await revoke_sessions(session, reused.user_id, [reused.session_id])
+        return None
+    return await issue_tokens(session, row.user_id, _subject(row.email, row.phone), session_id=row.session_id)
+
+
+async def revoke_sessions(session: AsyncSession, user_id: int, session_ids: Iterable[str]):
+    """Гасит refresh-токены сессий и записывает отзыв в журнал для остальных воркеров."""
+    session_ids = list(set(session_ids))
+    if not session_ids:
+        return
+    expires_at = datetime.now(timezone.utc) + ACCESS_TOKEN_TTL
+    await session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.session_id.in_(session_ids), RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    # ON CONFLICT есть в обоих диалектах; SQLite — для нагрузочного прогона benchmarks.loadtest
+    dialect = postgresql if session.get_bind().dialect.name != 'sqlite' else sqlite
+    await session.execute(
+        dialect.insert(RevokedSession)
+        .values([{'session_id': sid, 'user_id': user_id, 'expires_at': expires_at} for sid in session_ids])
+        .on_conflict_do_update(index_elements=[RevokedSession.session_id],
+                               set_={'revoked_at': func.now(), 'expires_at': expires_at})
+    )
+    await session.commit()
+    for sid in session_ids:
+        revocation_list.add(sid, expires_at.timestamp())
+
+
+async def revoke_user_sessions(session: AsyncSession, user_id: int):
+    """Отзывает все активные сессии пользователя (например, после смены пароля)."""
+    session_ids = (await session.execute(
+        select(RefreshToken.session_id.distinct())
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None),
+               RefreshToken.expires_at > func.now())
+    )).scalars().all()
+    await revoke_sessions(session, user_id, session_ids)
+
+
+async def purge_expired_tokens(session: AsyncSession) -> dict:
+    """Удаляет истекшие refresh-токены и записи журнала отзывов, которые больше не нужны."""
+    tokens = await session.execute(delete(RefreshToken).where(RefreshToken.expires_at <= func.now()))
+    revoked = await session.execute(delete(RevokedSession).where(RevokedSession.expires_at <= func.now()))
+    await session.commit()
+    return {'refresh_tokens': tokens.rowcount, 'revoked_sessions': revoked.rowcount}
+
+
+class RevocationSync:
+    """
+    Фоновая задача воркера: раз в interval секунд читает из revoked_sessions записи,
+    появившиеся с прошлого раза, и добавляет их в локальный список отзывов.
+    Окно чтения перекрывается на overlap секунд: now() в PostgreSQL — время начала
+    транзакции, и запись может стать видимой позже, чем более новая по времени.
+    """
+
+    def __init__(self, revocations: RevocationList, engine_factory: Callable[[], AsyncEngine],
+                 interval: float = 2, overlap: float = 60):
+        self.revocations = revocations
+        self.engine_factory = engine_factory
+        self.interval = interval
+        self.overlap = timedelta(seconds=overlap)
+        self._last_seen: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def sync(self) -> int:
+        statement = (select(RevokedSession.session_id, RevokedSession.revoked_at, RevokedSession.expires_at)
+                     .where(RevokedSession.expires_at > func.now()))
+        if self._last_seen is not None:
+            statement = statement.where(RevokedSession.revoked_at > self._last_seen - self.overlap)
+        async with self.engine_factory().connect() as conn:
+            rows = (await conn.execute(statement)).all()
+        for session_id, revoked_at, expires_at in rows:
+            self.revocations.add(session_id, expires_at.timestamp())
+            if self._last_seen is None or revoked_at > self._last_seen:
+                self._last_seen = revoked_at
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Не удалось синхронизировать отозванные сессии: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+revocation_sync = RevocationSync(revocation_list, get_engine, interval=REVOCATION_SYNC_INTERVAL)
@@ -0,0 +1,143 @@
+import re
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from core.config import (TRIP_BUFFER_MAX_BATCH, TRIP_BUFFER_FLUSH_INTERVAL, TRIP_BUFFER_MAX_PENDING,
+                         TRIP_HISTORY_MONTHS)
+from models.trips import Trip
+from sql_app.database import get_engine
+from sql_app.write_behind import WriteBehindBuffer
+from .support import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Секция за месяц: trips_p2026_10 хранит created_at в [2026-10-01, 2026-11-01) UTC
+PARTITION_NAME = re.compile(r'^trips_p(\d{4})_(\d{2})$')
+
+# Поездки появляются при назначении водителя и пишутся в базу пачками
+trip_buffer = WriteBehindBuffer('trips', Trip.__table__, get_engine, max_batch=TRIP_BUFFER_MAX_BATCH,
+                                flush_interval=TRIP_BUFFER_FLUSH_INTERVAL, max_pending=TRIP_BUFFER_MAX_PENDING)
+
+
+def submit_trip(request_id: str, rider_id: int, driver_id: int, pickup_lat: float, pickup_lon: float,
+                pickup_distance: float):
+    """Ставит новую поездку в буфер; WriteBehindFull, если база давно не принимает записи."""
+    trip_buffer.add({'request_id': request_id, 'rider_id': rider_id, 'driver_id': driver_id, 'status': 'assigned',
+                     'pickup_lat': pickup_lat, 'pickup_lon': pickup_lon, 'pickup_distance': pickup_distance,
+                     'created_at': datetime.now(timezone.utc)})
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(moment: datetime) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"trips_p{month.year:04d}_{month.month:02d}"
+
+
+async def list_trips(session: AsyncSession, rider_id: Optional[int] = None, driver_id: Optional[int] = None,
+                     cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[dict], Optional[str]]:
+    """
+    Поездки пассажира или водителя от новых к старым с keyset-пагинацией по (created_at, id).
+    Сравнение кортежей планировщик не использует для отсечения секций, поэтому границы
+    по created_at заданы еще и отдельными условиями: сверху — курсор, снизу — глубина
+    истории TRIP_HISTORY_MONTHS. Запрос читает только секции в этом окне, а каждая
+    следующая страница сдвигает верхнюю границу к более старым месяцам.
+    Возвращает (поездки, курсор следующей страницы или None).
+    """
+    since = add_months(month_start(datetime.now(timezone.utc)), -TRIP_HISTORY_MONTHS)
+    statement = (select(Trip.id, Trip.request_id, Trip.rider_id, Trip.driver_id, Trip.status, Trip.pickup_lat,
+                        Trip.pickup_lon, Trip.pickup_distance, Trip.created_at, Trip.finished_at)
+                 .where(Trip.created_at >= datetime(since.year, since.month, 1, tzinfo=timezone.utc))
+                 .order_by(Trip.created_at.desc(), Trip.id.desc())
+                 .limit(limit + 1))
+    if rider_id is not None:
+        statement = statement.where(Trip.rider_id == rider_id)
+    if driver_id is not None:
+        statement = statement.where(Trip.driver_id == driver_id)
+    if cursor:
+        created_at, trip_id = decode_cursor(cursor)
+        statement = statement.where(Trip.created_at <= created_at,
+                                    tuple_(Trip.created_at, Trip.id) < (created_at, trip_id))
+
+    rows = (await session.execute(statement)).all()
+    trips = [dict(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = trips[-1]
+        next_cursor = encode_cursor(last['created_at'], last['id'])
+    return trips, next_cursor
+
+
+async def _partitions(conn: AsyncConnection) -> List[Tuple[str, bool]]:
+    # (имя секции, отсоединение не завершено); inhdetachpending есть с PostgreSQL 14
+    rows = await conn.execute(text(
+        "SELECT c.relname, i.inhdetachpending FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'trips'::regclass ORDER BY c.relname"
+    ))
+    return [(name, pending) for name, pending in rows]
+
+
+async def create_partitions(engine: AsyncEngine, months_ahead: int, today: Optional[date] = None) -> List[str]:
+    """
+    Создает секции с текущего месяца на months_ahead месяцев вперед; возвращает созданные.
+    Вызывается при старте каждого воркера и из manage.py, поэтому запуски сериализуются
+    advisory-блокировкой до конца транзакции.
+    """
+    first = month_start(today or datetime.now(timezone.utc))
+    created = []
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('trips_partitions'))"))
+        existing = {name for name, _ in await _partitions(conn)}
+        for offset in range(months_ahead + 1):
+            month = add_months(first, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            await conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF trips "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+                f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+            ))
+            created.append(name)
+    return created
+
+
+async def detach_old_partitions(engine: AsyncEngine, retention_months: int, drop: bool = False,
+                                today: Optional[date] = None) -> List[str]:
+    """
+    Отсоединяет секции, целиком старше retention_months месяцев. Это операция над каталогом,
+    а не DELETE миллионов строк: нет нагрузки на WAL, раздувания таблицы и долгого VACUUM.
+    DETACH ... CONCURRENTLY (PostgreSQL 14+) не блокирует запись и чтение trips, но не
+    работает внутри транзакции. Прерванное отсоединение завершается через FINALIZE при
+    следующем запуске. Отсоединенная таблица остается в базе (ее можно выгрузить в архив),
+    с drop=True — удаляется. Возвращает имена обработанных секций.
+    """
+    cutoff = add_months(month_start(today or datetime.now(timezone.utc)), -retention_months)
+    detached = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        for name, pending in await _partitions(conn):
+            match = PARTITION_NAME.match(name)
+            if match is None:
+                continue
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            if add_months(month, 1) > cutoff:
+                continue
+            mode = 'FINALIZE' if pending else 'CONCURRENTLY'
+            await conn.execute(text(f"ALTER TABLE trips DETACH PARTITION {name} {mode}"))
+            if drop:
+                await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info(f"Секция {name} отсоединена от trips{' и удалена' if drop else ''}")
+            detached.append(name)
+    return detached
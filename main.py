@@ -1,9 +1,141 @@
-from fastapi import FastAPI
-from app import auth_router, support_router, preferences_router
-app = FastAPI()
+import time
+_import_started = time.perf_counter()
+
+import math
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from core import hashing_pool, HashingPoolSaturated, hash_password_async, create_access_token, decode_access_token
+from core.config import settings
+from core.keys import key_ring
+from core.metrics import registry
+from core.rate_limit import RateLimitExceeded
+from crud import support_buffer, trip_buffer, breadcrumb_writer
+from crud.bulk import import_hashing_pool
+from crud.tokens import revocation_sync
+from crud.trips import create_partitions
+from services import verification_store, email_dispatcher, get_sms_sender
+from services.geo_index import driver_index
+from services.matching import matching_engine
+from sql_app import get_engine, warm_up_pool, dispose_engine
+from app import (auth_router, support_router, preferences_router, admin_router, metrics_router, jwks_router,
+                 drivers_router, rides_router, MetricsMiddleware)
+
+logger = logging.getLogger(__name__)
+
+# Время импорта приложения и этапов старта, секунды (для отслеживания холодного старта)
+startup_timings = {'import': time.perf_counter() - _import_started}
+
+
+async def warm_up():
+    """Открываем соединения с БД и прогреваем bcrypt и JWT, чтобы за это не платили первые запросы."""
+    started = time.perf_counter()
+    if settings.DB_WARMUP_CONNECTIONS > 0:
+        try:
+            opened = await warm_up_pool(settings.DB_WARMUP_CONNECTIONS)
+            logger.info(f"Открыто соединений с БД при старте: {opened}")
+        except Exception as e:
+            # База может подняться позже приложения — это не повод падать при старте
+            logger.warning(f"Не удалось прогреть пул соединений с БД: {e}")
+    startup_timings['warmup_db'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    await hash_password_async('warm-up')
+    startup_timings['warmup_hashing'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    decode_access_token(create_access_token({'sub': 'warm-up'}))
+    startup_timings['warmup_jwt'] = time.perf_counter() - started
+
+
+async def ensure_trip_partitions():
+    """
+    Секции trips на текущий и TRIP_PARTITIONS_AHEAD следующих месяцев: без секции под created_at
+    база отвергает поездку. Дальше секции по расписанию создает manage.py trip-partitions.
+    """
+    try:
+        created = await create_partitions(get_engine(), settings.TRIP_PARTITIONS_AHEAD)
+    except Exception as e:
+        logger.warning(f"Не удалось проверить секции trips: {e}")
+        return
+    if created:
+        logger.info(f"Созданы секции trips: {', '.join(created)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    await verification_store.start()
+    email_dispatcher.start()
+    support_buffer.start()
+    await ensure_trip_partitions()
+    trip_buffer.start()
+    breadcrumb_writer.start()
+    revocation_sync.start()
+    matching_engine.start()
+    metrics_flusher = asyncio.create_task(registry.flush_forever()) if registry.multiproc_dir else None
+    driver_purge = asyncio.create_task(driver_index.purge_forever())
+    key_rotation = None
+    if settings.JWT_ALGORITHM != 'HS256':
+        await asyncio.to_thread(key_ring.rotate)
+        key_rotation = asyncio.create_task(key_ring.rotate_forever())
+    if settings.STARTUP_WARMUP:
+        await warm_up()
+    startup_timings['startup'] = time.perf_counter() - started
+    logger.info(f"Приложение запущено: импорт {startup_timings['import']:.3f}s, "
+                f"старт {startup_timings['startup']:.3f}s")
+    yield
+    tasks = [task for task in (metrics_flusher, driver_purge, key_rotation) if task is not None]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if metrics_flusher is not None:
+        await asyncio.to_thread(registry.write_snapshot)  # Значения после последнего сброса не теряются
+    await email_dispatcher.stop()
+    await support_buffer.stop()
+    await revocation_sync.stop()
+    await matching_engine.stop()
+    await trip_buffer.stop()
+    await breadcrumb_writer.stop()
+    await get_sms_sender().close()
+    await verification_store.stop()
+    await dispose_engine()
+    hashing_pool.shutdown()
+    import_hashing_pool.shutdown()
+
+
+@registry.gauge_collector
+def _collect_startup_gauges():
+    return [('app_startup_seconds', 'Длительность этапов старта приложения', {'stage': stage}, seconds)
+            for stage, seconds in startup_timings.items()]
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth_router)
 app.include_router(support_router)
 app.include_router(preferences_router)
+app.include_router(admin_router)
+app.include_router(metrics_router)
+app.include_router(jwks_router)
+app.include_router(drivers_router)
+app.include_router(rides_router)
+
+
+# Пул хеширования перегружен — быстро отвечаем 503, не ставя запрос в очередь
+@app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated_handler(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(status_code=503, content={"detail": "Сервис перегружен, попробуйте позже."},
+                        headers={"Retry-After": "1"})
+
+
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    return JSONResponse(status_code=429, content={"detail": "Слишком много запросов, попробуйте позже."},
+                        headers={"Retry-After": str(math.ceil(exc.retry_after))})
 
 # Остальная часть вашего кода, например, настройки базы данных
@@ -0,0 +1,126 @@
+"""
+Служебные команды:
+
+    python manage.py import-users riders.csv [--format csv|jsonl] [--method copy|insert]
+    python manage.py export-users users.jsonl [--format jsonl]
+    python manage.py calibrate-hash [--scheme bcrypt|scrypt|argon2] [--target-ms 250]
+    python manage.py purge-tokens
+    python manage.py trip-partitions [--retention-months 24] [--ahead 3] [--drop]
+"""
+import sys
+import json
+import asyncio
+import argparse
+
+from core import utils
+from core.config import PASSWORD_HASH_SCHEME, TRIP_RETENTION_MONTHS, TRIP_PARTITIONS_AHEAD
+from crud import bulk, tokens, trips
+from sql_app import get_engine, get_session_maker, dispose_engine
+
+
+async def _file_chunks(path: str, size: int = 1 << 16):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _detect_format(path: str, fmt: str) -> str:
+    if fmt:
+        return fmt
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+async def import_users(args):
+    fmt = _detect_format(args.path, args.format)
+    async with get_session_maker()() as session:
+        records = bulk.iter_records(bulk.iter_lines(_file_chunks(args.path)), fmt)
+        report = await bulk.import_users(session, records, method=args.method, batch_size=args.batch_size)
+    bulk.import_hashing_pool.shutdown()
+    await dispose_engine()
+    json.dump(report.as_dict(), sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+async def export_users(args):
+    fmt = _detect_format(args.path or '', args.format)
+    output = open(args.path, 'w') if args.path else sys.stdout
+    try:
+        async with get_session_maker()() as session:
+            async for chunk in bulk.export_users(session, fmt):
+                output.write(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    await dispose_engine()
+
+
+async def purge_tokens(args):
+    async with get_session_maker()() as session:
+        deleted = await tokens.purge_expired_tokens(session)
+    await dispose_engine()
+    json.dump(deleted, sys.stdout)
+    print()
+
+
+async def trip_partitions(args):
+    # Запускается по расписанию (например, раз в сутки): секции на следующие месяцы появляются заранее,
+    # а вставка в месяц без секции невозможна
+    created = await trips.create_partitions(get_engine(), args.ahead)
+    detached = await trips.detach_old_partitions(get_engine(), args.retention_months, drop=args.drop)
+    await dispose_engine()
+    json.dump({'created': created, 'detached': detached}, sys.stdout)
+    print()
+
+
+def calibrate_hash(args):
+    parameter, variable, _, _ = utils.HASH_COST_PARAMETERS[args.scheme]
+    cost, elapsed = utils.calibrate_hash_cost(args.scheme, args.target_ms, samples=args.samples)
+    print(f"{args.scheme}: {parameter}={cost}, {elapsed * 1000:.0f} мс на хеш (цель {args.target_ms:.0f} мс)",
+          file=sys.stderr)
+    print(f"PASSWORD_HASH_SCHEME={args.scheme}")
+    print(f"{variable}={cost}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('import-users', help='импорт пользователей из CSV/JSONL')
+    command.add_argument('path')
+    command.add_argument('--format', choices=('csv', 'jsonl'))
+    command.add_argument('--method', choices=('copy', 'insert'), default='copy')
+    command.add_argument('--batch-size', type=int, default=bulk.BULK_IMPORT_BATCH_SIZE)
+    command.set_defaults(handler=import_users)
+
+    command = commands.add_parser('export-users', help='потоковая выгрузка пользователей')
+    command.add_argument('path', nargs='?', help='файл для выгрузки (по умолчанию stdout)')
+    command.add_argument('--format', choices=('csv', 'jsonl'))
+    command.set_defaults(handler=export_users)
+
+    command = commands.add_parser('purge-tokens', help='удалить истекшие refresh-токены и записи об отзыве')
+    command.set_defaults(handler=purge_tokens)
+
+    command = commands.add_parser('trip-partitions',
+                                  help='создать секции trips наперед и отсоединить секции старше срока хранения')
+    command.add_argument('--retention-months', type=int, default=TRIP_RETENTION_MONTHS)
+    command.add_argument('--ahead', type=int, default=TRIP_PARTITIONS_AHEAD, help='на сколько месяцев вперед')
+    command.add_argument('--drop', action='store_true', help='удалить отсоединенные секции, а не оставлять их')
+    command.set_defaults(handler=trip_partitions)
+
+    command = commands.add_parser('calibrate-hash', help='подбор стоимости хеширования паролей под целевое время')
+    command.add_argument('--scheme', choices=utils.PASSWORD_SCHEMES, default=PASSWORD_HASH_SCHEME)
+    command.add_argument('--target-ms', type=float, default=250, help='целевое время одного хеша')
+    command.add_argument('--samples', type=int, default=3)
+    command.set_defaults(handler=calibrate_hash)
+
+    args = parser.parse_args()
+    result = args.handler(args)
+    if asyncio.iscoroutine(result):
+        asyncio.run(result)
+
+
+if __name__ == '__main__':
+    main()
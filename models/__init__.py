@@ -1,3 +1,7 @@
 from .users import User
+from .support import SupportMessage
+from .tokens import RefreshToken, RevokedSession
+from .trips import Trip
+from .breadcrumbs import GpsBreadcrumb
 
-__all__ = ('User',)
+__all__ = ('User', 'SupportMessage', 'RefreshToken', 'RevokedSession', 'Trip', 'GpsBreadcrumb')
@@ -0,0 +1,27 @@
+from sql_app.database import Base
+
+from sqlalchemy import Table, Column, Integer, Float, Boolean, DateTime, Index
+
+
+class GpsBreadcrumb(Base):
+    """
+    Все пинги координат водителей (разбор споров, аналитика). Таблица только для добавления
+    и пишется через COPY, поэтому в ней нет первичного ключа и внешнего ключа на users:
+    каждый из них — лишняя проверка на каждую строку. Первичный ключ задан только для ORM.
+    """
+    __table__ = Table(
+        "gps_breadcrumbs", Base.metadata,
+        Column('driver_id', Integer, nullable=False),
+        Column('recorded_at', DateTime(timezone=True), nullable=False),  # время получения пинга приложением
+        Column('lat', Float, nullable=False),
+        Column('lon', Float, nullable=False),
+        Column('available', Boolean, nullable=False),
+        # Трек водителя за интервал времени
+        Index('ix_gps_breadcrumbs_driver_id_recorded_at', 'driver_id', 'recorded_at'),
+        # Строки приходят по возрастанию времени: BRIN по времени на порядки меньше B-tree
+        Index('ix_gps_breadcrumbs_recorded_at_brin', 'recorded_at', postgresql_using='brin'),
+    )
+    __mapper_args__ = {'primary_key': [__table__.c.driver_id, __table__.c.recorded_at]}
+
+    def __repr__(self):
+        return f"<GpsBreadcrumb(driver_id={self.driver_id}, recorded_at={self.recorded_at})>"
@@ -0,0 +1,22 @@
+from sql_app.database import Base
+
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index, func
+
+
+class SupportMessage(Base):
+    __tablename__ = "support_messages"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    message = Column(Text, nullable=False)
+    # Время получения сообщения приложением (а не вставки пачкой из буфера)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        # Лента поддержки и сообщения одного пользователя, обе с keyset-пагинацией по (created_at, id)
+        Index('ix_support_messages_created_at_id', 'created_at', 'id'),
+        Index('ix_support_messages_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<SupportMessage(id={self.id}, user_id={self.user_id})>"
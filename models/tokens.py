@@ -0,0 +1,29 @@
+from sql_app.database import Base
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, func
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # sha256 от токена, сам токен не храним
+    session_id = Column(String(32), index=True, nullable=False)  # общий для всей цепочки ротаций
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)  # заменен новым токеном или сессия отозвана
+
+    def __repr__(self):
+        return f"<RefreshToken(session_id='{self.session_id}', user_id={self.user_id})>"
+
+
+class RevokedSession(Base):
+    """Журнал отзывов: воркеры читают новые строки и пополняют свой список отозванных сессий."""
+    __tablename__ = "revoked_sessions"
+
+    session_id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), index=True, nullable=False, server_default=func.now())
+    # После этого момента все access-токены сессии истекли и запись можно удалить
+    expires_at = Column(DateTime(timezone=True), nullable=False)
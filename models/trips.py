@@ -0,0 +1,37 @@
+from sql_app.database import Base
+
+from sqlalchemy import Column, BigInteger, Integer, String, Float, DateTime, ForeignKey, Identity, Index, func
+
+TRIP_STATUSES = ('assigned', 'completed', 'cancelled')
+
+
+class Trip(Base):
+    """
+    История поездок. Таблица секционирована по месяцам (RANGE по created_at): секции
+    создаются заранее и отсоединяются после срока хранения командой manage.py trip-partitions.
+    Первичный ключ секционированной таблицы обязан включать ключ секционирования.
+    """
+    __tablename__ = "trips"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    request_id = Column(String(32), nullable=False)  # заказ в распределении, из которого появилась поездка
+    rider_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # История пассажира не должна пропадать вместе с удаленным водителем
+    driver_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    status = Column(String, nullable=False, default='assigned', server_default='assigned')
+    pickup_lat = Column(Float, nullable=False)
+    pickup_lon = Column(Float, nullable=False)
+    pickup_distance = Column(Float, nullable=True)  # метры от водителя до точки подачи при назначении
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # "Мои поездки" пассажира и водителя: keyset-пагинация по (created_at, id) от новых к старым.
+        # Индексы создаются на родительской таблице и автоматически — на каждой секции
+        Index('ix_trips_rider_id_created_at', 'rider_id', 'created_at', 'id'),
+        Index('ix_trips_driver_id_created_at', 'driver_id', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+    def __repr__(self):
+        return f"<Trip(id={self.id}, rider_id={self.rider_id}, driver_id={self.driver_id})>"
@@ -1,9 +1,11 @@
 from sql_app.database import Base
 
-from sqlalchemy import Column, Integer, String, Boolean
+from sqlalchemy import Column, Integer, String, Boolean, Index
 
 Base()
 
+USER_ROLES = ('rider', 'driver')
+
 
 class User(Base):
     __tablename__ = "users"
@@ -16,6 +18,13 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     language = Column(String, default="russian")
     notifications_enabled = Column(Boolean, default=True)  # По умолчанию уведомления включены
+    role = Column(String, nullable=False, default='rider', server_default='rider')  # 'rider' или 'driver'
+
+    __table_args__ = (
+        # Поиск по префиксу телефона (LIKE '+99890%') при любой collation базы.
+        # Индексы по lower(email) и триграммный по имени — выражения, они есть только в миграции
+        Index('ix_users_phone_pattern', 'phone', postgresql_ops={'phone': 'varchar_pattern_ops'}),
+    )
 
     def __repr__(self):
         return f"<User(email='{self.email}', phone='{self.phone}')>"
@@ -1,7 +1,11 @@
 from .support import SupportMessageSchema
-from .user_preferences import UserPreferencesSchema
+from .drivers import DriverLocationSchema, UserRoleSchema
+from .rides import PointSchema, RideRequestSchema, FareEstimateSchema
+from .user_preferences import UserPreferencesSchema, BulkPreferencesSchema
 from .users import (UserBaseSchema, UserCreateSchema, UserLoginSchema, UserUpdateSchema, VerifyCodeSchema, TokenSchema,
-                   )
+                    RefreshTokenSchema)
 
-__all__ = ['SupportMessageSchema', 'UserPreferencesSchema', 'UserBaseSchema', 'UserCreateSchema', 'UserLoginSchema',
-           'UserUpdateSchema', 'TokenSchema']
+__all__ = ['SupportMessageSchema', 'UserPreferencesSchema', 'BulkPreferencesSchema', 'UserBaseSchema',
+           'UserCreateSchema', 'UserLoginSchema', 'UserUpdateSchema', 'TokenSchema',
+           'RefreshTokenSchema', 'DriverLocationSchema', 'UserRoleSchema',
+           'PointSchema', 'RideRequestSchema', 'FareEstimateSchema']
@@ -0,0 +1,15 @@
+from typing import Literal
+from pydantic import BaseModel, Field
+
+
+class DriverLocationSchema(BaseModel):
+    # Сообщение водителя по WebSocket: координаты, готов ли он брать заказы
+    # и release=true, когда назначенная поездка завершена или отменена
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+    available: bool = True
+    release: bool = False
+
+
+class UserRoleSchema(BaseModel):
+    role: Literal['rider', 'driver']
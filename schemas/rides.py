@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+
+
+class PointSchema(BaseModel):
+    lat: float = Field(ge=-90, le=90)
+    lon: float = Field(ge=-180, le=180)
+
+
+class RideRequestSchema(PointSchema):
+    # Точка подачи
+    pass
+
+
+class FareEstimateSchema(BaseModel):
+    origin: PointSchema
+    destination: PointSchema
+    tariff: str = 'economy'
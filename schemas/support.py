@@ -1,6 +1,5 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class SupportMessageSchema(BaseModel):
-    phone: str
-    message: str
+    message: str = Field(min_length=1, max_length=4000)
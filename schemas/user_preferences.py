@@ -1,6 +1,16 @@
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 
 class UserPreferencesSchema(BaseModel):
     language: str  # 'uzbek' or 'russian'
     notifications_enabled: bool
+
+
+class BulkPreferencesSchema(BaseModel):
+    # Кого менять: список id и/или префикс телефона (например, код города)
+    user_ids: Optional[List[int]] = Field(default=None, max_length=100000)
+    phone_prefix: Optional[str] = Field(default=None, pattern=r'^\+998\d{2,}$')
+    # Что менять: хотя бы одно из полей
+    language: Optional[str] = None
+    notifications_enabled: Optional[bool] = None
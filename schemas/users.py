@@ -41,6 +41,11 @@ class VerifyCodeSchema(BaseModel):
 class TokenSchema(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshTokenSchema(BaseModel):
+    refresh_token: str
 
 # Модели Pydantic (UserBase, UserCreate, UserLogin, Token): оставить в main.py
 # или в отдельном файле, например, users.py. Эти модели нужны для валидации данных при регистрации, входе и возврате токенов.
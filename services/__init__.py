@@ -1,8 +1,30 @@
-from .email_service import send_email_verification_code
-from .twilio_service import client, TWILIO_PHONE_NUMBER
+from .email_service import send_email_verification_code, EmailDispatcher, EmailQueueFull, email_dispatcher
+from .twilio_service import (SmsSender, SmsSendError, TwilioSmsSender, FakeSmsSender, create_sms_sender,
+                             get_sms_sender, set_sms_sender, send_sms, TWILIO_PHONE_NUMBER)
+from .verification_store import (VerificationCodeStore, InMemoryVerificationCodeStore, SQLiteVerificationCodeStore,
+                                 create_verification_store, verification_store)
+from .geo_index import GridIndex, NearbyDriver, driver_index
 
 __all__ = [
     "send_email_verification_code",
-    "client",
-    "TWILIO_PHONE_NUMBER"
+    "EmailDispatcher",
+    "EmailQueueFull",
+    "email_dispatcher",
+    "SmsSender",
+    "SmsSendError",
+    "TwilioSmsSender",
+    "FakeSmsSender",
+    "create_sms_sender",
+    "get_sms_sender",
+    "set_sms_sender",
+    "send_sms",
+    "TWILIO_PHONE_NUMBER",
+    "VerificationCodeStore",
+    "InMemoryVerificationCodeStore",
+    "SQLiteVerificationCodeStore",
+    "create_verification_store",
+    "verification_store",
+    "GridIndex",
+    "NearbyDriver",
+    "driver_index",
 ]
@@ -1,10 +1,203 @@
+import time
+import random
+import asyncio
+import logging
 import smtplib
+from typing import List, Optional
 from email.mime.text import MIMEText
 from fastapi import HTTPException
-from core.config import EMAIL_HOST_USER, EMAIL_HOST_PASSWORD
+from core.metrics import NOTIFICATION_LATENCY
+from core.config import (EMAIL_HOST_USER, EMAIL_HOST_PASSWORD, EMAIL_HOST, EMAIL_PORT, EMAIL_USE_TLS, EMAIL_POOL_SIZE,
+                         EMAIL_QUEUE_SIZE, EMAIL_MAX_RETRIES, EMAIL_RETRY_BACKOFF, EMAIL_IDLE_TIMEOUT,
+                         EMAIL_SHUTDOWN_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+
+class EmailQueueFull(Exception):
+    """Очередь исходящих писем переполнена."""
+
+
+class _PooledSMTPConnection:
+    """Одно авторизованное SMTP-соединение, которое переиспользуется между письмами."""
+
+    def __init__(self, dispatcher: 'EmailDispatcher'):
+        self.dispatcher = dispatcher
+        self.server: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _open(self):
+        d = self.dispatcher
+        server = d.smtp_factory(d.host, d.port, timeout=d.timeout)
+        try:
+            if d.use_tls:
+                server.starttls()  # Начинаем шифрование
+            if d.username:
+                server.login(d.username, d.password)
+        except BaseException:
+            server.close()
+            raise
+        self.server = server
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except Exception:
+                self.server.close()
+            self.server = None
+
+    def _drop(self):
+        # Соединение оборвано: QUIT отправить уже некуда, только закрываем сокет
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def send(self, msg: MIMEText):
+        # Долго простаивавшее соединение сервер мог уже закрыть — открываем заново
+        if self.server is not None and time.monotonic() - self.last_used > self.dispatcher.idle_timeout:
+            self.close()
+        if self.server is None:
+            self._open()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self._drop()
+            raise
+        except smtplib.SMTPException:
+            # Сервер ответил отказом (адрес, 4xx/5xx): smtplib уже сбросил транзакцию (RSET),
+            # соединение исправно и остается в пуле. SMTPException — подкласс OSError,
+            # поэтому эта ветка должна идти раньше проверки сетевых ошибок
+            self.last_used = time.monotonic()
+            raise
+        except OSError:
+            self._drop()
+            raise
+        self.last_used = time.monotonic()
+
+
+class EmailDispatcher:
+    """
+    Фоновая очередь исходящих писем. Каждый воркер держит свое SMTP-соединение,
+    так что STARTTLS и login выполняются один раз на соединение, а не на письмо.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_tls: bool = True, pool_size: int = 2, queue_size: int = 1000, max_retries: int = 3,
+                 retry_backoff: float = 1.0, idle_timeout: float = 60, timeout: float = 30,
+                 smtp_factory=smtplib.SMTP):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.pool_size = max(1, pool_size)
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.smtp_factory = smtp_factory
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._connections: List[_PooledSMTPConnection] = []
+        self.sent = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.running:
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+        for _ in range(self.pool_size):
+            connection = _PooledSMTPConnection(self)
+            self._connections.append(connection)
+            self._workers.append(asyncio.create_task(self._worker(connection)))
+
+    def enqueue(self, msg: MIMEText):
+        # Воркеры запускаются при первом письме, если lifespan еще не сделал этого
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            raise EmailQueueFull("Очередь исходящих писем переполнена")
+
+    async def _deliver(self, connection: _PooledSMTPConnection, msg: MIMEText):
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                await asyncio.to_thread(connection.send, msg)
+                self.sent += 1
+                NOTIFICATION_LATENCY.observe(time.perf_counter() - started, 'email', 'ok')
+                return
+            except smtplib.SMTPRecipientsRefused:
+                # Адрес отклонен сервером — повтор не поможет
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    break
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Ошибка отправки письма на {msg['To']} (попытка {attempt + 1}): {e}")
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        self.failed += 1
+        NOTIFICATION_LATENCY.observe(time.perf_counter() - started, 'email', 'error')
+        logger.error(f"Не удалось отправить письмо на {msg['To']}")
+
+    async def _worker(self, connection: _PooledSMTPConnection):
+        try:
+            while True:
+                msg = await self._queue.get()
+                try:
+                    await self._deliver(connection, msg)
+                finally:
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(connection.close)
+
+    async def stop(self, timeout: float = EMAIL_SHUTDOWN_TIMEOUT):
+        """Дожидается отправки писем из очереди (не дольше timeout) и закрывает соединения."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не отправлено писем при остановке: {self._queue.qsize()}")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        self._connections.clear()
+
+    def stats(self) -> dict:
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'pool_size': self.pool_size,
+            'sent': self.sent,
+            'failed': self.failed,
+        }
+
+
+email_dispatcher = EmailDispatcher(
+    host=EMAIL_HOST,
+    port=EMAIL_PORT,
+    username=EMAIL_HOST_USER,
+    password=EMAIL_HOST_PASSWORD,
+    use_tls=EMAIL_USE_TLS,
+    pool_size=EMAIL_POOL_SIZE,
+    queue_size=EMAIL_QUEUE_SIZE,
+    max_retries=EMAIL_MAX_RETRIES,
+    retry_backoff=EMAIL_RETRY_BACKOFF,
+    idle_timeout=EMAIL_IDLE_TIMEOUT,
+)
 
 
 def send_email_verification_code(email: str, code: int):
+    """Ставит письмо с кодом в очередь и сразу возвращается."""
     sender = EMAIL_HOST_USER  # Убедитесь, что вы установили эту переменную окружения
     recipient = email
     subject = "Ваш код подтверждения"
@@ -16,10 +209,6 @@ def send_email_verification_code(email: str, code: int):
     msg['To'] = recipient
 
     try:
-        # Настройка SMTP-сервера для Gmail
-        with smtplib.SMTP('smtp.gmail.com', 587) as server:
-            server.starttls()  # Начинаем шифрование
-            server.login(sender, EMAIL_HOST_PASSWORD)  # Убедитесь, что вы установили эту переменную окружения
-            server.sendmail(sender, recipient, msg.as_string())
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка отправки кода на почту: {e}")
+        email_dispatcher.enqueue(msg)
+    except EmailQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Ошибка отправки кода на почту: {e}")
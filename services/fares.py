@@ -0,0 +1,135 @@
+import os
+import json
+import time
+import logging
+from datetime import datetime, time as day_time
+from zoneinfo import ZoneInfo
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from core.config import FARE_TARIFFS_PATH, FARE_TARIFFS_CHECK_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class TariffClass(NamedTuple):
+    base: float
+    per_km: float
+    per_minute: float
+    minimum: float
+
+
+class TimeMultiplier(NamedTuple):
+    start: day_time
+    end: day_time  # если end <= start, интервал переходит через полночь
+    multiplier: float
+
+
+class Tariffs(NamedTuple):
+    currency: str
+    timezone: ZoneInfo
+    route_factor: float  # во сколько раз путь по дорогам длиннее прямой
+    average_speed_kmh: float
+    rounding: float
+    classes: Dict[str, TariffClass]
+    time_multipliers: List[TimeMultiplier]
+
+    def multiplier_at(self, moment: datetime) -> float:
+        local = moment.astimezone(self.timezone).time()
+        for interval in self.time_multipliers:
+            if interval.start < interval.end:
+                inside = interval.start <= local < interval.end
+            else:
+                inside = local >= interval.start or local < interval.end
+            if inside:
+                return interval.multiplier
+        return 1.0
+
+
+def parse_tariffs(raw: dict) -> Tariffs:
+    """Проверяет и разбирает таблицу тарифов (ValueError/KeyError/TypeError при ошибке)."""
+    classes = {name: TariffClass(float(tariff['base']), float(tariff['per_km']), float(tariff['per_minute']),
+                                 float(tariff['minimum']))
+               for name, tariff in raw['classes'].items()}
+    if not classes:
+        raise ValueError("в таблице тарифов нет ни одного класса")
+    multipliers = [TimeMultiplier(day_time.fromisoformat(item['from']), day_time.fromisoformat(item['to']),
+                                  float(item['multiplier']))
+                   for item in raw.get('time_multipliers', [])]
+    return Tariffs(raw.get('currency', 'UZS'), ZoneInfo(raw.get('timezone', 'Asia/Tashkent')),
+                   float(raw.get('route_factor', 1.0)), float(raw['average_speed_kmh']),
+                   float(raw.get('rounding', 0)), classes, multipliers)
+
+
+class TariffStore:
+    """
+    Таблица тарифов из JSON-файла: читается один раз и держится в памяти. Не чаще раза
+    в check_interval секунд проверяется mtime файла; изменившийся файл перечитывается
+    без перезапуска. Если новый файл не разбирается, остается прежняя таблица.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5):
+        self.path = path
+        self.check_interval = check_interval
+        self._tariffs: Optional[Tariffs] = None
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def get(self) -> Tariffs:
+        now = time.monotonic()
+        if self._tariffs is None or now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self._reload_if_changed()
+        return self._tariffs
+
+    def _reload_if_changed(self):
+        mtime = None
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime and self._tariffs is not None:
+                return
+            with open(self.path, encoding='utf-8') as f:
+                tariffs = parse_tariffs(json.load(f))
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            if self._tariffs is None:
+                raise
+            # Ошибочный файл не перечитываем, пока его не изменят снова
+            self._mtime = mtime if mtime is not None else self._mtime
+            logger.error(f"Не удалось перечитать тарифы из {self.path}, остаются прежние: {e}")
+            return
+        self._tariffs, self._mtime = tariffs, mtime
+        self.reloads += 1
+        logger.info(f"Загружены тарифы из {self.path}: {', '.join(tariffs.classes)}")
+
+
+def haversine_km(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Расстояние по большому кругу для массивов координат (поэлементно), км."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def estimate_fares(tariffs: Tariffs, tariff_class: str, origin_lat: np.ndarray, origin_lon: np.ndarray,
+                   destination_lat: np.ndarray, destination_lon: np.ndarray,
+                   at: Optional[datetime] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    Стоимость поездок для массивов точек отправления и назначения одной векторной операцией.
+    Возвращает (расстояние по дорогам, км; время в пути, мин; цена; множитель времени суток).
+    KeyError, если такого класса тарифа нет.
+    """
+    tariff = tariffs.classes[tariff_class]
+    multiplier = tariffs.multiplier_at(at or datetime.now(tariffs.timezone))
+    distance = haversine_km(origin_lat, origin_lon, destination_lat, destination_lon) * tariffs.route_factor
+    duration = distance / tariffs.average_speed_kmh * 60
+    fare = np.maximum(tariff.base + distance * tariff.per_km + duration * tariff.per_minute, tariff.minimum)
+    fare *= multiplier
+    if tariffs.rounding > 0:
+        fare = np.ceil(fare / tariffs.rounding) * tariffs.rounding
+    return distance, duration, fare, multiplier
+
+
+tariff_store = TariffStore(FARE_TARIFFS_PATH, check_interval=FARE_TARIFFS_CHECK_INTERVAL)
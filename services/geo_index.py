@@ -0,0 +1,146 @@
+import math
+import time
+import asyncio
+import itertools
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from core.config import GEO_INDEX_CELL_METERS, DRIVER_LOCATION_TTL
+
+# Метров в градусе широты (и долготы на экваторе)
+METERS_PER_DEGREE = 111320.0
+
+
+class DriverLocation(NamedTuple):
+    driver_id: int
+    lat: float
+    lon: float
+    updated_at: float
+
+
+class NearbyDriver(NamedTuple):
+    driver_id: int
+    lat: float
+    lon: float
+    distance: float  # метры
+
+
+class GridIndex:
+    """
+    Свободные водители в памяти процесса, разложенные по ячейкам сетки cell_meters x cell_meters
+    (по широте; по долготе ячейка уже в cos(широты) раз). Обновление позиции — перенос между
+    двумя словарями. Поиск ближайших обходит кольца ячеек вокруг точки и останавливается,
+    как только следующее кольцо заведомо дальше k-го найденного водителя или радиуса,
+    поэтому стоит десятки ячеек, а не весь город.
+    Расстояния — равнопромежуточная проекция: на масштабе города ошибка меньше метра.
+    Позиции старше ttl секунд (водитель пропал без закрытия соединения) не возвращаются.
+    """
+
+    def __init__(self, cell_meters: float = 300, ttl: float = 30):
+        self.cell_degrees = cell_meters / METERS_PER_DEGREE
+        self.ttl = ttl
+        self._cells: Dict[Tuple[int, int], Dict[int, DriverLocation]] = {}
+        self._drivers: Dict[int, Tuple[int, int]] = {}  # driver_id -> ячейка
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees)
+
+    def update(self, driver_id: int, lat: float, lon: float, updated_at: Optional[float] = None):
+        cell = self._cell(lat, lon)
+        previous = self._drivers.get(driver_id)
+        if previous is not None and previous != cell:
+            self._discard(driver_id, previous)
+        self._cells.setdefault(cell, {})[driver_id] = DriverLocation(
+            driver_id, lat, lon, time.monotonic() if updated_at is None else updated_at)
+        self._drivers[driver_id] = cell
+
+    def remove(self, driver_id: int):
+        cell = self._drivers.pop(driver_id, None)
+        if cell is not None:
+            self._discard(driver_id, cell)
+
+    def _discard(self, driver_id: int, cell: Tuple[int, int]):
+        drivers = self._cells[cell]
+        drivers.pop(driver_id, None)
+        if not drivers:
+            del self._cells[cell]
+
+    def get(self, driver_id: int) -> Optional[DriverLocation]:
+        cell = self._drivers.get(driver_id)
+        return self._cells[cell][driver_id] if cell is not None else None
+
+    def nearest(self, lat: float, lon: float, k: int = 10, radius: float = 3000) -> List[NearbyDriver]:
+        """До k свободных водителей в радиусе radius метров, от ближнего к дальнему."""
+        meters_per_lat = METERS_PER_DEGREE
+        meters_per_lon = METERS_PER_DEGREE * math.cos(math.radians(lat))
+        # По долготе ячейка уже, чем по широте: все, что за кольцом ring, не ближе ring ее ширин
+        ring_meters = max(self.cell_degrees * meters_per_lon, 1.0)
+        center_lat, center_lon = self._cell(lat, lon)
+        stale_before = time.monotonic() - self.ttl
+        radius_sq = radius * radius
+        found: List[Tuple[float, DriverLocation]] = []
+
+        for ring in itertools.count():
+            for cell in self._ring_cells(center_lat, center_lon, ring):
+                drivers = self._cells.get(cell)
+                if not drivers:
+                    continue
+                for location in drivers.values():
+                    if location.updated_at < stale_before:
+                        continue
+                    dy = (location.lat - lat) * meters_per_lat
+                    dx = (location.lon - lon) * meters_per_lon
+                    distance_sq = dx * dx + dy * dy
+                    if distance_sq <= radius_sq:
+                        found.append((distance_sq, location))
+            reach = ring * ring_meters
+            if reach >= radius:
+                break
+            if len(found) >= k:
+                found.sort(key=lambda item: item[0])
+                if found[k - 1][0] <= reach * reach:
+                    break
+
+        found.sort(key=lambda item: item[0])
+        return [NearbyDriver(location.driver_id, location.lat, location.lon, math.sqrt(distance_sq))
+                for distance_sq, location in found[:k]]
+
+    @staticmethod
+    def _ring_cells(center_lat: int, center_lon: int, ring: int):
+        if ring == 0:
+            yield center_lat, center_lon
+            return
+        for d_lon in range(-ring, ring + 1):
+            yield center_lat - ring, center_lon + d_lon
+            yield center_lat + ring, center_lon + d_lon
+        for d_lat in range(-ring + 1, ring):
+            yield center_lat + d_lat, center_lon - ring
+            yield center_lat + d_lat, center_lon + ring
+
+    def snapshot(self) -> List[DriverLocation]:
+        """Все свежие позиции (для пакетной обработки, например распределения заказов)."""
+        stale_before = time.monotonic() - self.ttl
+        return [location for drivers in self._cells.values() for location in drivers.values()
+                if location.updated_at >= stale_before]
+
+    def purge(self) -> int:
+        """Удаляет позиции старше ttl; возвращает, сколько водителей удалено."""
+        stale_before = time.monotonic() - self.ttl
+        stale = [location.driver_id for drivers in self._cells.values() for location in drivers.values()
+                 if location.updated_at < stale_before]
+        for driver_id in stale:
+            self.remove(driver_id)
+        return len(stale)
+
+    async def purge_forever(self):
+        while True:
+            await asyncio.sleep(self.ttl)
+            self.purge()
+
+    def __len__(self):
+        return len(self._drivers)
+
+    def stats(self) -> dict:
+        return {'drivers': len(self._drivers), 'cells': len(self._cells)}
+
+
+driver_index = GridIndex(GEO_INDEX_CELL_METERS, ttl=DRIVER_LOCATION_TTL)
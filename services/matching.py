@@ -0,0 +1,327 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from core.cache import LRUTTLCache, MISSING
+from core.config import (MATCHING_TICK_INTERVAL, MATCHING_TICK_BUDGET, MATCHING_RADIUS, MATCHING_CANDIDATES,
+                         MATCHING_TILE_METERS, MATCHING_REQUEST_TIMEOUT, MATCHING_AVERAGE_SPEED_KMH)
+from core.metrics import MATCHING_TICK_LATENCY, MATCHING_REQUESTS
+from .geo_index import GridIndex, METERS_PER_DEGREE, driver_index
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy необязателен: без него назначение жадное
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
+
+class PendingRequestExists(Exception):
+    def __init__(self, request_id: str):
+        super().__init__(f"У пассажира уже есть заказ в ожидании: {request_id}")
+        self.request_id = request_id
+
+
+class RideRequest(NamedTuple):
+    request_id: str
+    rider_id: int
+    lat: float
+    lon: float
+    created_at: float
+
+
+class Assignment(NamedTuple):
+    request_id: str
+    rider_id: int
+    driver_id: int
+    distance: float  # метры по прямой
+    eta: float  # секунды
+    lat: float  # точка подачи
+    lon: float
+
+
+class RequestStatus(NamedTuple):
+    state: str  # 'pending' | 'assigned' | 'expired' | 'cancelled'
+    rider_id: int
+    assignment: Optional[Assignment] = None
+
+
+def _greedy_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Пары от дешевых к дорогим; пара берется, если и заказ, и водитель еще свободны
+    rows_taken = np.zeros(cost.shape[0], dtype=bool)
+    cols_taken = np.zeros(cost.shape[1], dtype=bool)
+    rows, cols = [], []
+    for flat in np.argsort(cost, axis=None):
+        row, col = divmod(int(flat), cost.shape[1])
+        if not np.isfinite(cost[row, col]):
+            break
+        if rows_taken[row] or cols_taken[col]:
+            continue
+        rows_taken[row] = cols_taken[col] = True
+        rows.append(row)
+        cols.append(col)
+        if len(rows) == min(cost.shape):
+            break
+    return np.array(rows, dtype=int), np.array(cols, dtype=int)
+
+
+def _optimal_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # linear_sum_assignment не допускает бесконечностей: недопустимая пара получает штраф больше
+    # суммы любых допустимых, так что ее выбор никогда не выгоднее лишней допустимой пары
+    finite = np.isfinite(cost)
+    if not finite.any():
+        return np.array([], dtype=int), np.array([], dtype=int)
+    penalty = cost[finite].max() * min(cost.shape) + 1
+    rows, cols = linear_sum_assignment(np.where(finite, cost, penalty))
+    feasible = np.isfinite(cost[rows, cols])
+    return rows[feasible], cols[feasible]
+
+
+def _request_blocks(tile_of_request: np.ndarray, max_block: int) -> List[np.ndarray]:
+    """Индексы заказов по плиткам, в порядке самого старого заказа плитки, блоками не больше max_block."""
+    order = np.argsort(tile_of_request, kind='stable')  # внутри плитки заказы остаются от старых к новым
+    tiles = np.split(order, np.flatnonzero(np.diff(tile_of_request[order])) + 1)
+    tiles.sort(key=lambda rows: rows[0])
+    return [block for rows in tiles for block in np.array_split(rows, -(-len(rows) // max_block))]
+
+
+def solve_assignment(request_lat: np.ndarray, request_lon: np.ndarray, driver_lat: np.ndarray,
+                     driver_lon: np.ndarray, radius: float, candidates: int, tile_meters: float,
+                     deadline: Optional[float] = None, max_block: int = 128, search_start: float = 500,
+                     optimal_max_cells: int = 250000
+                     ) -> List[Tuple[int, int, float]]:
+    """
+    Назначает водителей заказам так, чтобы суммарное расстояние подачи было минимальным.
+    Заказы раскладываются по плиткам tile_meters; для каждой плитки матрица расстояний
+    «заказы x водители в радиусе» считается NumPy целиком, у каждого заказа остаются
+    candidates ближайших водителей (в плотной плитке заказы берутся блоками по max_block,
+    чтобы матрица оставалась небольшой), и задача решается венгерским алгоритмом (scipy),
+    а без scipy или на слишком большой матрице — жадно. Водитель, назначенный в одной плитке,
+    недоступен для следующих. Плитки идут в порядке самого старого заказа в них (заказы
+    передаются от старых к новым); после deadline (time.perf_counter) оставшиеся плитки
+    откладываются до следующего раза.
+    Возвращает [(индекс заказа, индекс водителя, расстояние в метрах)].
+    """
+    if not len(request_lat) or not len(driver_lat):
+        return []
+    meters_per_lon = METERS_PER_DEGREE * np.cos(np.radians(float(np.mean(request_lat))))
+
+    tile_y = np.floor(request_lat * METERS_PER_DEGREE / tile_meters).astype(np.int64)
+    tile_x = np.floor(request_lon * meters_per_lon / tile_meters).astype(np.int64)
+    _, tile_of_request = np.unique(tile_y * 2 ** 32 + tile_x, return_inverse=True)
+
+    # Водители отсортированы по широте: полоса окрестности находится бинарным поиском
+    by_lat = np.argsort(driver_lat)
+    driver_lat, driver_lon = driver_lat[by_lat], driver_lon[by_lat]
+    free = np.ones(len(driver_lat), dtype=bool)
+    matches = []
+    for rows in _request_blocks(tile_of_request.ravel(), max_block):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        lat, lon = request_lat[rows], request_lon[rows]
+        # Окрестность растет от search_start до radius, пока у каждого заказа не найдется candidates
+        # водителей внутри нее: в плотном центре матрица получается в десятки раз меньше
+        reach = min(search_start, radius)
+        while True:
+            start, stop = np.searchsorted(driver_lat, (lat.min() - reach / METERS_PER_DEGREE,
+                                                       lat.max() + reach / METERS_PER_DEGREE))
+            band_lon = driver_lon[start:stop]
+            nearby = start + np.flatnonzero(free[start:stop]
+                                            & (band_lon >= lon.min() - reach / meters_per_lon)
+                                            & (band_lon <= lon.max() + reach / meters_per_lon))
+            dy = (driver_lat[nearby][None, :] - lat[:, None]) * METERS_PER_DEGREE
+            dx = (driver_lon[nearby][None, :] - lon[:, None]) * meters_per_lon
+            cost = np.hypot(dx, dy)
+            if reach >= radius or np.all(np.count_nonzero(cost <= reach, axis=1) >= candidates):
+                break
+            reach = min(reach * 2, radius)
+        if not len(nearby):
+            continue
+        cost[cost > radius] = np.inf
+        if cost.shape[1] > candidates * len(rows):
+            # Каждому заказу — только его candidates ближайших водителей: матрица становится узкой
+            nearest = np.argpartition(cost, candidates - 1, axis=1)[:, :candidates]
+            keep = np.unique(nearest)
+            cost, nearby = cost[:, keep], nearby[keep]
+
+        if linear_sum_assignment is not None and cost.size <= optimal_max_cells:
+            assigned_rows, assigned_cols = _optimal_assignment(cost)
+        else:
+            assigned_rows, assigned_cols = _greedy_assignment(cost)
+        for row, col in zip(assigned_rows, assigned_cols):
+            free[nearby[col]] = False
+            matches.append((int(rows[row]), int(by_lat[nearby[col]]), float(cost[row, col])))
+    return matches
+
+
+Subscriber = Callable[[Assignment], Union[None, Awaitable[None]]]
+
+
+class MatchingEngine:
+    """
+    Распределение заказов пачками: заказы копятся tick_interval секунд, затем все ожидающие
+    назначаются свободным водителям из пространственного индекса за один проход solve_assignment
+    (в отдельном потоке, чтобы не останавливать прием координат). На проход отводится
+    budget секунд; что не успело — ждет следующего тика. Назначенный водитель убирается
+    из индекса и остается занятым, пока не будет явно освобожден (release): до этого его
+    координаты не возвращают его в индекс. Подписчики (например, WebSocket водителя) получают Assignment.
+    Заказ, не получивший водителя за request_timeout секунд, снимается.
+    У пассажира одновременно не больше одного ожидающего заказа (PendingRequestExists).
+    """
+
+    def __init__(self, index: GridIndex, tick_interval: float = 1.0, budget: float = 0.2, radius: float = 3000,
+                 candidates: int = 10, tile_meters: float = 2000, request_timeout: float = 120,
+                 average_speed_kmh: float = 25):
+        self.index = index
+        self.tick_interval = tick_interval
+        self.budget = budget
+        self.radius = radius
+        self.candidates = candidates
+        self.tile_meters = tile_meters
+        self.request_timeout = request_timeout
+        self.average_speed = average_speed_kmh / 3.6  # м/с
+        self._pending: 'OrderedDict[str, RideRequest]' = OrderedDict()  # от старых к новым
+        self._results = LRUTTLCache(100000, ttl=300)  # request_id -> RequestStatus завершенного заказа
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self._busy: Dict[int, str] = {}  # driver_id -> request_id назначенного заказа
+        self._riders: Dict[int, str] = {}  # rider_id -> request_id ожидающего заказа
+        self._subscribers: List[Subscriber] = []
+        self._task: Optional[asyncio.Task] = None
+        self.last_tick: dict = {}
+
+    def subscribe(self, callback: Subscriber):
+        self._subscribers.append(callback)
+
+    def submit(self, rider_id: int, lat: float, lon: float) -> RideRequest:
+        pending = self._riders.get(rider_id)
+        if pending is not None:
+            raise PendingRequestExists(pending)
+        request = RideRequest(uuid.uuid4().hex, rider_id, lat, lon, time.monotonic())
+        self._pending[request.request_id] = request
+        self._riders[rider_id] = request.request_id
+        return request
+
+    def cancel(self, request_id: str) -> bool:
+        request = self._pending.pop(request_id, None)
+        if request is None:
+            return False
+        self._finish(request, 'cancelled')
+        return True
+
+    def is_busy(self, driver_id: int) -> bool:
+        return driver_id in self._busy
+
+    def release(self, driver_id: int) -> Optional[str]:
+        """Освобождает водителя после поездки; request_id его заказа или None, если он не был занят."""
+        return self._busy.pop(driver_id, None)
+
+    def status(self, request_id: str) -> Optional[RequestStatus]:
+        """Состояние заказа или None, если такого нет (или он завершен давно)."""
+        request = self._pending.get(request_id)
+        if request is not None:
+            return RequestStatus('pending', request.rider_id)
+        result = self._results.get(request_id)
+        return None if result is MISSING else result
+
+    async def wait(self, request_id: str, timeout: float) -> Optional[RequestStatus]:
+        """Ждет назначения не дольше timeout секунд (long polling)."""
+        if request_id in self._pending:
+            event = self._waiters.setdefault(request_id, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.status(request_id)
+
+    def _finish(self, request: RideRequest, state: str, assignment: Optional[Assignment] = None):
+        MATCHING_REQUESTS.inc(state)
+        if self._riders.get(request.rider_id) == request.request_id:
+            del self._riders[request.rider_id]
+        self._results.set(request.request_id, RequestStatus(state, request.rider_id, assignment))
+        event = self._waiters.pop(request.request_id, None)
+        if event is not None:
+            event.set()
+
+    async def tick(self) -> List[Assignment]:
+        started = time.perf_counter()
+        expire_before = time.monotonic() - self.request_timeout
+        while self._pending:
+            request = next(iter(self._pending.values()))  # самый старый
+            if request.created_at >= expire_before:
+                break
+            del self._pending[request.request_id]
+            self._finish(request, 'expired')
+
+        requests = list(self._pending.values())
+        drivers = self.index.snapshot()
+        assignments = []
+        if requests and drivers:
+            request_coords = np.array([(r.lat, r.lon) for r in requests]).reshape(-1, 2)
+            driver_coords = np.array([(d.lat, d.lon) for d in drivers]).reshape(-1, 2)
+            matches = await asyncio.to_thread(
+                solve_assignment, request_coords[:, 0], request_coords[:, 1], driver_coords[:, 0],
+                driver_coords[:, 1], self.radius, self.candidates, self.tile_meters, started + self.budget)
+            for request_position, driver_position, distance in matches:
+                request, driver = requests[request_position], drivers[driver_position]
+                # Пока шел расчет, заказ могли отменить, а водитель — уйти с линии
+                if request.request_id not in self._pending or self.index.get(driver.driver_id) is None:
+                    continue
+                del self._pending[request.request_id]
+                self.index.remove(driver.driver_id)
+                self._busy[driver.driver_id] = request.request_id
+                assignment = Assignment(request.request_id, request.rider_id, driver.driver_id, distance,
+                                        distance / self.average_speed, request.lat, request.lon)
+                assignments.append(assignment)
+                self._finish(request, 'assigned', assignment)
+                await self._publish(assignment)
+
+        elapsed = time.perf_counter() - started
+        MATCHING_TICK_LATENCY.observe(elapsed)
+        self.last_tick = {'requests': len(requests), 'drivers': len(drivers), 'assigned': len(assignments),
+                          'seconds': elapsed}
+        if elapsed > self.budget:
+            logger.warning(f"Тик распределения занял {elapsed:.3f}s при бюджете {self.budget}s "
+                           f"({len(requests)} заказов, {len(drivers)} водителей)")
+        return assignments
+
+    async def _publish(self, assignment: Assignment):
+        for callback in self._subscribers:
+            try:
+                result = callback(assignment)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка доставки назначения {assignment.request_id}: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Ошибка тика распределения заказов: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return dict(self.last_tick, pending=len(self._pending), busy_drivers=len(self._busy),
+                    solver='hungarian' if linear_sum_assignment is not None else 'greedy')
+
+
+matching_engine = MatchingEngine(driver_index, tick_interval=MATCHING_TICK_INTERVAL, budget=MATCHING_TICK_BUDGET,
+                                 radius=MATCHING_RADIUS, candidates=MATCHING_CANDIDATES,
+                                 tile_meters=MATCHING_TILE_METERS, request_timeout=MATCHING_REQUEST_TIMEOUT,
+                                 average_speed_kmh=MATCHING_AVERAGE_SPEED_KMH)
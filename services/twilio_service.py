@@ -1,20 +1,154 @@
-import os
-from twilio.rest import Client
-from dotenv import load_dotenv
+import abc
+import time
+import random
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+import httpx
+
 from core import TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER
+from core.metrics import NOTIFICATION_LATENCY
+from core.config import (SMS_BACKEND, TWILIO_API_BASE_URL, SMS_MAX_CONCURRENCY, SMS_MAX_CONNECTIONS, SMS_TIMEOUT,
+                         SMS_MAX_RETRIES, SMS_RETRY_BACKOFF)
+
+logger = logging.getLogger(__name__)
+
+
+class SmsSendError(Exception):
+    """SMS не удалось отправить."""
+
+
+# Ошибки, при которых запрос точно не ушел к провайдеру, и его можно безопасно повторить
+RETRYABLE_TRANSPORT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class SmsSender(abc.ABC):
+    @abc.abstractmethod
+    async def send(self, to: str, body: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class TwilioSmsSender(SmsSender):
+    """
+    Отправка SMS через REST API Twilio общим пулом keep-alive соединений (httpx).
+    Число одновременных запросов к провайдеру ограничено семафором. Ошибки соединения,
+    429 и 5xx повторяются с экспоненциальной задержкой и джиттером; обрыв или таймаут
+    после отправки запроса не повторяется, чтобы не отправить SMS дважды.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, base_url: str = 'https://api.twilio.com',
+                 max_concurrency: int = 20, max_connections: int = 20, timeout: float = 10, max_retries: int = 3,
+                 retry_backoff: float = 0.5, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.base_url = base_url
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.transport = transport
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Клиент создается при первой отправке, а не при импорте модуля
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                auth=(self.account_sid or '', self.auth_token or ''),
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport,
+            )
+        return self._client
+
+    async def send(self, to: str, body: str) -> None:
+        url = f"/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        data = {'To': to, 'From': self.from_number, 'Body': body}
+        for attempt in range(self.max_retries + 1):
+            # Семафор держится только на время запроса, а не на время паузы перед повтором
+            async with self._semaphore:
+                try:
+                    response = await self.client.post(url, data=data)
+                except RETRYABLE_TRANSPORT_ERRORS as e:
+                    error = f"{type(e).__name__}: {e}"
+                except httpx.TransportError as e:
+                    # Запрос мог дойти до Twilio (например, таймаут чтения ответа): повтор
+                    # отправил бы пользователю второе SMS
+                    raise SmsSendError(f"{type(e).__name__}: {e}")
+                else:
+                    if response.status_code < 400:
+                        return
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code != 429 and response.status_code < 500:
+                        raise SmsSendError(error)
+            if attempt == self.max_retries:
+                raise SmsSendError(error)
+            logger.warning(f"Ошибка отправки SMS на {to} (попытка {attempt + 1}): {error}")
+            await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeSmsSender(SmsSender):
+    """Локальный шлюз для тестов и бенчмарков: ничего не отправляет, запоминает сообщения."""
+
+    def __init__(self, latency: float = 0.0, fail: bool = False):
+        self.latency = latency
+        self.fail = fail
+        self.messages: List[Tuple[str, str]] = []
+
+    async def send(self, to: str, body: str) -> None:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise SmsSendError("Отправка SMS отключена в фейковом шлюзе")
+        self.messages.append((to, body))
+
+
+def create_sms_sender(backend: str = SMS_BACKEND) -> SmsSender:
+    if backend == 'twilio':
+        return TwilioSmsSender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_PHONE_NUMBER,
+                               base_url=TWILIO_API_BASE_URL,
+                               max_concurrency=SMS_MAX_CONCURRENCY,
+                               max_connections=SMS_MAX_CONNECTIONS,
+                               timeout=SMS_TIMEOUT,
+                               max_retries=SMS_MAX_RETRIES,
+                               retry_backoff=SMS_RETRY_BACKOFF)
+    if backend == 'fake':
+        return FakeSmsSender()
+    raise ValueError(f"Неизвестный SMS-провайдер: {backend}")
+
+
+sms_sender: SmsSender = create_sms_sender()
+
 
-load_dotenv()
+def get_sms_sender() -> SmsSender:
+    return sms_sender
 
-TWILIO_ACCOUNT_SID = TWILIO_ACCOUNT_SID
-TWILIO_AUTH_TOKEN = TWILIO_AUTH_TOKEN
-TWILIO_PHONE_NUMBER = TWILIO_PHONE_NUMBER
 
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+def set_sms_sender(sender: SmsSender) -> SmsSender:
+    """Подменяет отправителя (например, на FakeSmsSender в тестах) и возвращает предыдущего."""
+    global sms_sender
+    previous, sms_sender = sms_sender, sender
+    return previous
 
 
-def send_sms(to: str, body: str):
-    client.messages.create(
-        body=body,
-        from_=TWILIO_PHONE_NUMBER,
-        to=to
-    )
+async def send_sms(to: str, body: str):
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        await sms_sender.send(to, body)
+        outcome = 'ok'
+    finally:
+        NOTIFICATION_LATENCY.observe(time.perf_counter() - started, 'sms', outcome)
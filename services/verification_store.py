@@ -0,0 +1,217 @@
+import abc
+import time
+import hmac
+import asyncio
+import sqlite3
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+from core.config import (VERIFICATION_CODE_BACKEND, VERIFICATION_CODE_TTL, VERIFICATION_CODE_MAX_ATTEMPTS,
+                         VERIFICATION_CODE_MAX_ENTRIES, VERIFICATION_CODE_SWEEP_INTERVAL,
+                         VERIFICATION_CODE_SQLITE_PATH)
+
+
+def _codes_equal(expected: int, given: int) -> bool:
+    return hmac.compare_digest(str(expected), str(given))
+
+
+class VerificationCodeStore(abc.ABC):
+    """
+    Хранилище кодов подтверждения с TTL и счетчиком попыток.
+    Ключ — телефон или email, на который отправлен код.
+    """
+
+    def __init__(self, ttl: int, max_attempts: int, max_entries: int, sweep_interval: int):
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @abc.abstractmethod
+    async def save(self, key: str, code: int) -> None:
+        """Сохраняет код (перезаписывает предыдущий и сбрасывает попытки)."""
+
+    @abc.abstractmethod
+    async def verify(self, key: str, code: int) -> bool:
+        """
+        Атомарно проверяет и удаляет код. Неверный код увеличивает счетчик попыток,
+        после max_attempts код удаляется.
+        """
+
+    @abc.abstractmethod
+    async def delete(self, key: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def sweep(self) -> int:
+        """Удаляет просроченные коды, возвращает их количество."""
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    async def start(self):
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+class InMemoryVerificationCodeStore(VerificationCodeStore):
+    """Хранилище в памяти процесса: TTL + вытеснение самых старых (LRU) при переполнении."""
+
+    def __init__(self, ttl: int, max_attempts: int, max_entries: int, sweep_interval: int):
+        super().__init__(ttl, max_attempts, max_entries, sweep_interval)
+        # key -> [code, expires_at, attempts]
+        self._codes: OrderedDict = OrderedDict()
+
+    async def save(self, key: str, code: int) -> None:
+        self._codes[key] = [code, time.monotonic() + self.ttl, 0]
+        self._codes.move_to_end(key)
+        while len(self._codes) > self.max_entries:
+            self._codes.popitem(last=False)
+
+    async def verify(self, key: str, code: int) -> bool:
+        entry = self._codes.get(key)
+        if entry is None:
+            return False
+        if entry[1] <= time.monotonic():
+            del self._codes[key]
+            return False
+        if _codes_equal(entry[0], code):
+            del self._codes[key]
+            return True
+        entry[2] += 1
+        if entry[2] >= self.max_attempts:
+            del self._codes[key]
+        else:
+            self._codes.move_to_end(key)
+        return False
+
+    async def delete(self, key: str) -> None:
+        self._codes.pop(key, None)
+
+    async def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [key for key, entry in self._codes.items() if entry[1] <= now]
+        for key in expired:
+            del self._codes[key]
+        return len(expired)
+
+    def __len__(self):
+        return len(self._codes)
+
+
+class SQLiteVerificationCodeStore(VerificationCodeStore):
+    """
+    Общее хранилище для нескольких воркеров на одном хосте (SQLite в режиме WAL).
+    Запросы выполняются в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, path: str, ttl: int, max_attempts: int, max_entries: int, sweep_interval: int):
+        super().__init__(ttl, max_attempts, max_entries, sweep_interval)
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS verification_codes ("
+                "key TEXT PRIMARY KEY, code INTEGER NOT NULL, expires_at REAL NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_verification_codes_expires_at "
+                         "ON verification_codes (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _save(self, key: str, code: int):
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO verification_codes (key, code, expires_at, attempts) VALUES (?, ?, ?, 0) "
+            "ON CONFLICT(key) DO UPDATE SET code = excluded.code, expires_at = excluded.expires_at, attempts = 0",
+            (key, code, time.time() + self.ttl),
+        )
+
+    def _verify(self, key: str, code: int) -> bool:
+        conn = self._connect()
+        # BEGIN IMMEDIATE берет блокировку на запись: проверка и удаление атомарны между процессами
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT code, expires_at, attempts FROM verification_codes WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                verified = False
+            elif row[1] <= time.time():
+                verified = False
+                conn.execute("DELETE FROM verification_codes WHERE key = ?", (key,))
+            elif _codes_equal(row[0], code):
+                verified = True
+                conn.execute("DELETE FROM verification_codes WHERE key = ?", (key,))
+            else:
+                verified = False
+                if row[2] + 1 >= self.max_attempts:
+                    conn.execute("DELETE FROM verification_codes WHERE key = ?", (key,))
+                else:
+                    conn.execute("UPDATE verification_codes SET attempts = attempts + 1 WHERE key = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return verified
+
+    def _delete(self, key: str):
+        self._connect().execute("DELETE FROM verification_codes WHERE key = ?", (key,))
+
+    def _sweep(self) -> int:
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM verification_codes WHERE expires_at <= ?", (time.time(),)).rowcount
+        # Если записей больше лимита — удаляем те, что истекают раньше всех
+        overflow = conn.execute("SELECT COUNT(*) FROM verification_codes").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += conn.execute(
+                "DELETE FROM verification_codes WHERE key IN "
+                "(SELECT key FROM verification_codes ORDER BY expires_at LIMIT ?)",
+                (overflow,),
+            ).rowcount
+        return removed
+
+    async def save(self, key: str, code: int) -> None:
+        await asyncio.to_thread(self._save, key, code)
+
+    async def verify(self, key: str, code: int) -> bool:
+        return await asyncio.to_thread(self._verify, key, code)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def sweep(self) -> int:
+        return await asyncio.to_thread(self._sweep)
+
+
+def create_verification_store(backend: str = VERIFICATION_CODE_BACKEND) -> VerificationCodeStore:
+    options = dict(ttl=VERIFICATION_CODE_TTL, max_attempts=VERIFICATION_CODE_MAX_ATTEMPTS,
+                   max_entries=VERIFICATION_CODE_MAX_ENTRIES, sweep_interval=VERIFICATION_CODE_SWEEP_INTERVAL)
+    if backend == 'memory':
+        return InMemoryVerificationCodeStore(**options)
+    if backend == 'sqlite':
+        return SQLiteVerificationCodeStore(VERIFICATION_CODE_SQLITE_PATH, **options)
+    raise ValueError(f"Неизвестное хранилище кодов подтверждения: {backend}")
+
+
+verification_store = create_verification_store()
@@ -1,3 +1,4 @@
-from .database import get_async_session
+from .database import get_async_session, get_pool_stats, get_engine, get_session_maker, warm_up_pool, dispose_engine
 
-__all__ = ('get_async_session',)
+__all__ = ('get_async_session', 'get_pool_stats', 'get_engine', 'get_session_maker', 'warm_up_pool',
+           'dispose_engine')
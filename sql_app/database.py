@@ -1,18 +1,141 @@
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional
+from sqlalchemy import exc, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 
-from core.config import DB_NAME, DB_PORT, DB_HOST, DB_USER, DB_PASS
+from core.metrics import DB_QUERY_LATENCY
+from core.config import (DB_NAME, DB_PORT, DB_HOST, DB_USER, DB_PASS, DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                         DB_POOL_TIMEOUT, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_STATEMENT_CACHE_SIZE)
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 Base = declarative_base()
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+class PoolStats:
+    """Счетчики ожидания соединения из пула (общие для пересозданных пулов)."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, wait: float):
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    # Замеряем, сколько запрос ждал свободное соединение
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        pool_stats.record(time.perf_counter() - started)
+        return connection
+
+
+_engine: Optional[AsyncEngine] = None
+_session_maker: Optional[sessionmaker] = None
+
+
+# Время каждого SQL-запроса по типу операции (SELECT, INSERT, ...)
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    DB_QUERY_LATENCY.observe(time.perf_counter() - started, statement.lstrip()[:6].upper())
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get('query_started'):
+        context.connection.info['query_started'].pop()
+
+
+def get_engine() -> AsyncEngine:
+    """Движок создается при первом обращении, а не при импорте модуля."""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(
+            DATABASE_URL,
+            echo=DB_ECHO,
+            poolclass=InstrumentedAsyncAdaptedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args={'prepared_statement_cache_size': DB_STATEMENT_CACHE_SIZE},
+        )
+        event.listen(_engine.sync_engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(_engine.sync_engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(_engine.sync_engine, 'handle_error', _handle_error)
+    return _engine
+
+
+def get_session_maker() -> sessionmaker:
+    global _session_maker
+    if _session_maker is None:
+        _session_maker = sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+    return _session_maker
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session_maker() as session:
+    async with get_session_maker()() as session:
         yield session
+
+
+async def warm_up_pool(connections: int) -> int:
+    """
+    Заранее открывает до connections соединений (не больше pool_size), чтобы первые
+    запросы после старта не платили за установку соединения. Возвращает число открытых.
+    """
+    engine = get_engine()
+    count = max(0, min(connections, DB_POOL_SIZE))
+    opened = []
+    try:
+        # Соединения держим открытыми до конца, иначе пул будет выдавать одно и то же
+        for _ in range(count):
+            conn = await engine.connect()
+            opened.append(conn)
+            await conn.execute(text('SELECT 1'))
+    finally:
+        for conn in opened:
+            await conn.close()
+    return len(opened)
+
+
+async def dispose_engine():
+    global _engine, _session_maker
+    if _engine is not None:
+        await _engine.dispose()
+    _engine, _session_maker = None, None
+
+
+def get_pool_stats() -> dict:
+    pool = _engine.sync_engine.pool if _engine is not None else None
+    checkouts = pool_stats.checkouts
+    return {
+        'pool_size': pool.size() if pool is not None else DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'checked_in': pool.checkedin() if pool is not None else 0,
+        'checked_out': pool.checkedout() if pool is not None else 0,
+        'overflow': max(0, pool.overflow()) if pool is not None else 0,
+        'checkouts': checkouts,
+        'timeouts': pool_stats.timeouts,
+        'avg_wait_ms': pool_stats.wait_total / checkouts * 1000 if checkouts else 0.0,
+        'max_wait_ms': pool_stats.wait_max * 1000,
+    }
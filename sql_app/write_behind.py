@@ -0,0 +1,162 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+from sqlalchemy import Table, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.metrics import WRITE_BEHIND_ROWS, WRITE_BEHIND_FLUSH_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Ошибки в самих строках (нарушение ключа, нет секции, неверные данные): повтор той же строки не поможет
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+
+class WriteBehindFull(Exception):
+    """В буфере уже max_pending неотправленных строк (база не успевает или недоступна)."""
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи: запрос только кладет строку в память, а фоновая задача
+    вставляет накопленное одним INSERT, как только набралось max_batch строк
+    или прошло flush_interval секунд. Если база недоступна, строки остаются в буфере
+    и вставка повторяется; новые строки сверх max_pending отклоняются (WriteBehindFull).
+    Если пачку отвергла сама база (PERMANENT_ERRORS), она делится пополам, пока
+    ошибочные строки не останутся по одной: они пишутся в лог и отбрасываются (dropped),
+    остальные вставляются — одна плохая строка не останавливает буфер.
+    """
+
+    def __init__(self, name: str, table: Table, engine_factory: Callable[[], AsyncEngine], max_batch: int = 500,
+                 flush_interval: float = 1.0, max_pending: int = 50000, max_backoff: float = 30):
+        self.name = name
+        self.table = table
+        self.engine_factory = engine_factory
+        self.max_batch = max(1, max_batch)
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_backoff = max_backoff
+        self._rows: Deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._rows)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, row: dict):
+        if len(self._rows) >= self.max_pending:
+            self.rejected += 1
+            WRITE_BEHIND_ROWS.inc(self.name, 'rejected')
+            raise WriteBehindFull(f"Буфер {self.name} переполнен ({len(self._rows)} строк)")
+        # Фоновая задача запускается при первой записи, если lifespan еще не сделал этого
+        if self._task is None:
+            self.start()
+        self._rows.append(row)
+        if len(self._rows) >= self.max_batch:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Вставляет одну пачку (не больше max_batch строк); возвращает, сколько строк взято из буфера.
+        При ошибке соединения или базы невставленные строки возвращаются в буфер.
+        """
+        if not self._rows:
+            return 0
+        batch = [self._rows.popleft() for _ in range(min(self.max_batch, len(self._rows)))]
+        started = time.perf_counter()
+        try:
+            await self._write(batch)
+        except BaseException:
+            WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - started, self.name, 'error')
+            raise
+        WRITE_BEHIND_FLUSH_LATENCY.observe(time.perf_counter() - started, self.name, 'ok')
+        return len(batch)
+
+    async def _insert(self, rows: List[dict]):
+        async with self.engine_factory().begin() as conn:
+            await conn.execute(insert(self.table), rows)
+
+    async def _write(self, batch: List[dict]):
+        chunks = [batch]  # стек: сверху — самые ранние строки
+        while chunks:
+            rows = chunks.pop()
+            try:
+                await self._insert(rows)
+            except PERMANENT_ERRORS as e:
+                if len(rows) == 1:
+                    self._drop(rows[0], e)
+                else:
+                    middle = len(rows) // 2
+                    chunks.extend((rows[middle:], rows[:middle]))
+                continue
+            except BaseException:
+                # Соединение или база недоступны: невставленное возвращается в начало буфера в прежнем порядке
+                unwritten = rows + [row for chunk in reversed(chunks) for row in chunk]
+                self._rows.extendleft(reversed(unwritten))
+                raise
+            WRITE_BEHIND_ROWS.inc(self.name, 'written', amount=len(rows))
+            self.written += len(rows)
+
+    def _drop(self, row: dict, error: Exception):
+        self.dropped += 1
+        WRITE_BEHIND_ROWS.inc(self.name, 'dropped')
+        logger.error(f"Буфер {self.name}: строка отброшена, база ее не принимает: {row!r}: {error.orig}")
+
+    async def _run(self):
+        failures = 0
+        while True:
+            if len(self._rows) < self.max_batch:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            try:
+                while await self.flush() == self.max_batch:
+                    pass  # Во время всплеска пишем пачками подряд, не дожидаясь таймера
+                failures = 0
+            except Exception as e:
+                failures += 1
+                self.failed_flushes += 1
+                delay = min(self.flush_interval * 2 ** failures, self.max_backoff)
+                logger.warning(f"Ошибка записи буфера {self.name} ({len(self._rows)} строк ждут): {e}")
+                await asyncio.sleep(delay)
+
+    async def stop(self, timeout: float = 10):
+        """Останавливает фоновую задачу и дописывает остаток буфера (не дольше timeout)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except Exception as e:
+            logger.error(f"Буфер {self.name}: при остановке не записано строк: {len(self._rows)} ({e})")
+
+    async def _drain(self):
+        while await self.flush():
+            pass
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._rows),
+            'max_pending': self.max_pending,
+            'written': self.written,
+            'rejected': self.rejected,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes,
+        }
@@ -0,0 +1,5 @@
+import os
+
+# Настройки читаются при импорте core.config: тестам достаточно подписи JWT без внешних сервисов
+os.environ.setdefault('SECRET', 'test-secret')
+os.environ.setdefault('USER_CACHE_ENABLED', 'false')
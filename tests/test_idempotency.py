@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.idempotency import IdempotencyKeyReused, IdempotencyStore, idempotent, idempotency_store
+
+
+class Counter:
+    """call для store.run: считает выполнения, может ждать события и завершаться ошибкой."""
+
+    def __init__(self, result=None, error: Exception = None, gate: asyncio.Event = None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_repeat_gets_stored_response():
+    async def scenario():
+        store = IdempotencyStore(100, ttl=60)
+        call = Counter({'ok': 1})
+        assert await store.run('signup', 'k', 'fp', call) == {'ok': 1}
+        assert await store.run('signup', 'k', 'fp', call) == {'ok': 1}
+        assert call.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_same_key_with_other_parameters_is_rejected():
+    async def scenario():
+        store = IdempotencyStore(100, ttl=60)
+        await store.run('signup', 'k', 'fp', Counter('first'))
+        with pytest.raises(IdempotencyKeyReused):
+            await store.run('signup', 'k', 'other', Counter('second'))
+        # Тот же ключ на другом маршруте — другой запрос
+        assert await store.run('send_code', 'k', 'other', Counter('third')) == 'third'
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_repeat_waits_for_first_request():
+    async def scenario():
+        store = IdempotencyStore(100, ttl=60)
+        call = Counter('done', gate=asyncio.Event())
+        first = asyncio.create_task(store.run('signup', 'k', 'fp', call))
+        second = asyncio.create_task(store.run('signup', 'k', 'fp', call))
+        await asyncio.sleep(0)
+        with pytest.raises(IdempotencyKeyReused):
+            await store.run('signup', 'k', 'other', call)
+        call.gate.set()
+        assert await asyncio.gather(first, second) == ['done', 'done']
+        assert call.calls == 1
+        assert store.coalesced == 1
+        assert store.stats()['in_flight'] == 0
+
+    asyncio.run(scenario())
+
+
+def test_client_errors_are_stored_server_errors_are_not():
+    async def scenario():
+        store = IdempotencyStore(100, ttl=60)
+        conflict = Counter(error=HTTPException(status_code=409, detail='exists'))
+        for _ in range(2):
+            with pytest.raises(HTTPException) as error:
+                await store.run('signup', 'a', 'fp', conflict)
+            assert error.value.status_code == 409
+        assert conflict.calls == 1
+
+        failure = Counter(error=HTTPException(status_code=503, detail='busy'))
+        crash = Counter(error=RuntimeError('boom'))
+        for key, call, expected in (('b', failure, HTTPException), ('c', crash, RuntimeError)):
+            for _ in range(2):
+                with pytest.raises(expected):
+                    await store.run('signup', key, 'fp', call)
+            assert call.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_waiter_runs_request_itself_when_first_is_cancelled():
+    async def scenario():
+        store = IdempotencyStore(100, ttl=60)
+        blocked = Counter('never', gate=asyncio.Event())
+        first = asyncio.create_task(store.run('signup', 'k', 'fp', blocked))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(store.run('signup', 'k', 'fp', Counter('retried')))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 'retried'
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_idempotent_separates_callers_and_maps_reuse_to_422():
+    async def scenario():
+        call = Counter({'ok': 1})
+        payload = {'phone': None, 'email': None}
+        await idempotent('test_route', 'shared-key', '+100', payload, call)
+        await idempotent('test_route', 'shared-key', '+200', payload, call)
+        await idempotent('test_route', 'shared-key', '+100', payload, call)
+        assert call.calls == 2
+        with pytest.raises(HTTPException) as error:
+            await idempotent('test_route', 'shared-key', '+100', {'phone': '+1'}, call)
+        assert error.value.status_code == 422
+        # Без ключа запрос просто выполняется
+        await idempotent('test_route', None, '+100', payload, call)
+        assert call.calls == 3
+
+    asyncio.run(scenario())
+    idempotency_store._responses.clear()
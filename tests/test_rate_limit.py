@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from core import rate_limit
+from core.rate_limit import (InMemoryTokenBucketBackend, RateLimit, RateLimiter, RateLimitExceeded,
+                             SQLiteTokenBucketBackend, parse_rate_limits, parse_trusted_proxies, resolve_client_ip)
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path, clock):
+    if request.param == 'memory':
+        return InMemoryTokenBucketBackend(max_keys=100)
+    return SQLiteTokenBucketBackend(str(tmp_path / 'buckets.db'), max_keys=100)
+
+
+def take(backend, *buckets) -> float:
+    return asyncio.run(backend.take(list(buckets)))
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits(' login=10/60, send_code=3/60 ,') == {
+        'login': RateLimit(10, 60.0), 'send_code': RateLimit(3, 60.0)}
+
+
+def test_bucket_allows_capacity_then_reports_retry_after(backend):
+    limit = RateLimit(3, 60)
+    assert [take(backend, ('a', limit)) for _ in range(3)] == [0, 0, 0]
+    assert take(backend, ('a', limit)) == pytest.approx(20)  # один токен в 60 / 3 секунд
+
+
+def test_bucket_refills_over_time(backend, clock):
+    limit = RateLimit(2, 10)
+    take(backend, ('a', limit))
+    take(backend, ('a', limit))
+    clock.now += 2.5
+    assert take(backend, ('a', limit)) == pytest.approx(2.5)  # накопилось полтокена
+    clock.now += 2.5
+    assert take(backend, ('a', limit)) == 0
+    clock.now += 1000
+    # Больше capacity не копится
+    assert take(backend, ('a', limit)) == take(backend, ('a', limit)) == 0
+    assert take(backend, ('a', limit)) > 0
+
+
+def test_rejected_request_does_not_consume_other_buckets(backend):
+    small, large = RateLimit(1, 60), RateLimit(2, 60)
+    assert take(backend, ('user', small), ('ip', large)) == 0
+    # Корзина пользователя пуста: запрос отклонен, токен IP не списан
+    assert take(backend, ('user', small), ('ip', large)) > 0
+    assert take(backend, ('other', small), ('ip', large)) == 0
+    assert take(backend, ('third', small), ('ip', large)) > 0
+
+
+def test_rate_limiter_keys_and_ip_limits(clock):
+    limiter = RateLimiter(InMemoryTokenBucketBackend(100), {'login': RateLimit(1, 60)},
+                          {'login': RateLimit(2, 60)})
+    asyncio.run(limiter.check('login', '+100', None, ip='1.1.1.1'))
+    with pytest.raises(RateLimitExceeded) as error:
+        asyncio.run(limiter.check('login', '+100', ip='2.2.2.2'))
+    assert error.value.retry_after == pytest.approx(60)
+    # Другой пользователь за тем же IP проходит, пока не исчерпан лимит IP
+    asyncio.run(limiter.check('login', '+200', ip='1.1.1.1'))
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(limiter.check('login', '+300', ip='1.1.1.1'))
+    assert limiter.rejected == 2
+    asyncio.run(limiter.check('unknown_route', '+100', ip='1.1.1.1'))
+
+
+def test_disabled_rate_limiter_allows_everything(clock):
+    limiter = RateLimiter(InMemoryTokenBucketBackend(100), {'login': RateLimit(1, 60)}, enabled=False)
+    for _ in range(5):
+        asyncio.run(limiter.check('login', '+100'))
+
+
+PROXIES = parse_trusted_proxies('10.0.0.0/8, 192.168.1.1')
+
+
+@pytest.mark.parametrize('peer, forwarded_for, expected', [
+    # Заголовок от недоверенного адреса игнорируется
+    ('203.0.113.5', '198.51.100.7', '203.0.113.5'),
+    ('10.0.0.2', None, '10.0.0.2'),
+    ('10.0.0.2', '198.51.100.7', '198.51.100.7'),
+    # Левые элементы подставляет клиент: берется первый справа не доверенный адрес
+    ('10.0.0.2', '1.2.3.4, 198.51.100.7, 192.168.1.1, 10.1.1.1', '198.51.100.7'),
+    ('10.0.0.2', '10.1.1.1, 192.168.1.1', '10.0.0.2'),
+    ('10.0.0.2', '1.2.3.4, junk', '10.0.0.2'),
+    ('10.0.0.2', ' , 2001:db8::1 ', '2001:db8::1'),
+    (None, '198.51.100.7', None),
+])
+def test_resolve_client_ip(peer, forwarded_for, expected):
+    assert resolve_client_ip(peer, forwarded_for, PROXIES) == expected
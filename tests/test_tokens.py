@@ -0,0 +1,198 @@
+"""
+Refresh-токены и отзыв сессий. Ротация (UPDATE ... FROM ... RETURNING) компилируется только
+для PostgreSQL: эти тесты выполняются, если задан TEST_DATABASE_URL
+(postgresql+asyncpg://...); таблицы создаются во временной схеме и удаляются вместе с ней.
+Остальное проверяется на SQLite.
+"""
+import os
+import time
+import uuid
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.dependencies import authenticate_token
+from core.revocation import RevocationList
+from crud import tokens
+from crud.tokens import RevocationSync
+from models.tokens import RefreshToken, RevokedSession
+from models.users import User
+
+pytest.importorskip('aiosqlite')
+
+TABLES = [User.__table__, RefreshToken.__table__, RevokedSession.__table__]
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+async def _sqlite_engine():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: User.metadata.create_all(sync_conn, tables=TABLES))
+    return engine
+
+
+async def _postgres_engine(schema: str):
+    admin = create_async_engine(TEST_DATABASE_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    await admin.dispose()
+    engine = create_async_engine(TEST_DATABASE_URL, connect_args={'server_settings': {'search_path': schema}})
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: User.metadata.create_all(sync_conn, tables=TABLES))
+    return engine
+
+
+async def _drop_schema(engine, schema: str):
+    async with engine.begin() as conn:
+        await conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+    await engine.dispose()
+
+
+def _with_database(engine_factory, scenario):
+    async def run():
+        engine = await engine_factory()
+        session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_maker() as session:
+                session.add_all([
+                    User(id=1, first_name='a', last_name='b', email='one@example.com', hashed_password='x'),
+                    User(id=2, first_name='c', last_name='d', phone='+100', hashed_password='x'),
+                ])
+                await session.commit()
+            await scenario(engine, session_maker)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(run())
+
+
+def with_sqlite(scenario):
+    _with_database(_sqlite_engine, scenario)
+
+
+def with_postgres(scenario):
+    schema = f"test_tokens_{uuid.uuid4().hex[:8]}"
+
+    async def cleanup_after(engine, session_maker):
+        try:
+            await scenario(engine, session_maker)
+        finally:
+            await _drop_schema(create_async_engine(TEST_DATABASE_URL), schema)
+
+    _with_database(lambda: _postgres_engine(schema), cleanup_after)
+
+
+requires_postgres = pytest.mark.skipif(not TEST_DATABASE_URL, reason='нужен TEST_DATABASE_URL (PostgreSQL)')
+
+
+async def _sid(session: AsyncSession, refresh_token: str) -> str:
+    return (await session.execute(select(RefreshToken.session_id)
+                                  .where(RefreshToken.token_hash == tokens._hash_token(refresh_token)))).scalar()
+
+
+def test_revocation_list_expires_entries():
+    revocations = RevocationList()
+    now = time.time()
+    revocations.add('old', now - 1)
+    revocations.add('live', now + 60)
+    revocations.add('live', now + 10)  # более ранний срок не сокращает запись
+    assert not revocations.is_revoked('old')
+    assert revocations.is_revoked('live')
+    assert not revocations.is_revoked('unknown')
+    revocations.purge(now + 30)
+    assert len(revocations) == 1
+    revocations.purge(now + 61)
+    assert len(revocations) == 0
+
+
+def test_revoke_user_sessions_revokes_only_that_user():
+    async def scenario(engine, session_maker):
+        async with session_maker() as session:
+            first = await tokens.issue_tokens(session, 1, 'one@example.com')
+            second = await tokens.issue_tokens(session, 1, 'one@example.com')
+            other = await tokens.issue_tokens(session, 2, '+100')
+            sids = [await _sid(session, pair['refresh_token']) for pair in (first, second, other)]
+
+            await tokens.revoke_user_sessions(session, 1)
+            revoked = (await session.execute(select(RefreshToken.session_id)
+                                             .where(RefreshToken.revoked_at.is_not(None)))).scalars().all()
+            assert sorted(revoked) == sorted(sids[:2])
+            assert tokens.revocation_list.is_revoked(sids[0]) and tokens.revocation_list.is_revoked(sids[1])
+            assert not tokens.revocation_list.is_revoked(sids[2])
+
+            # Access-токен отозванной сессии больше не принимается, другой сессии — принимается
+            with pytest.raises(HTTPException) as error:
+                await authenticate_token(first['access_token'], session)
+            assert error.value.status_code == 401
+            assert (await authenticate_token(other['access_token'], session)).id == 2
+
+    with_sqlite(scenario)
+
+
+def test_revocation_sync_loads_revocations_from_other_workers():
+    async def scenario(engine, session_maker):
+        worker = RevocationList()
+        sync = RevocationSync(worker, lambda: engine)
+        assert await sync.sync() == 0
+        async with session_maker() as session:
+            await tokens.revoke_sessions(session, 1, ['s1', 's2', 's1'])
+        assert await sync.sync() == 2
+        assert worker.is_revoked('s1') and worker.is_revoked('s2')
+        async with session_maker() as session:
+            await tokens.revoke_sessions(session, 2, ['s3'])
+        await sync.sync()
+        assert worker.is_revoked('s3')
+
+    with_sqlite(scenario)
+
+
+@requires_postgres
+def test_rotation_issues_new_pair_and_reuse_revokes_session():
+    async def scenario(engine, session_maker):
+        async with session_maker() as session:
+            issued = await tokens.issue_tokens(session, 1, 'one@example.com')
+            sid = await _sid(session, issued['refresh_token'])
+            rotated = await tokens.rotate_refresh_token(session, issued['refresh_token'])
+            assert rotated is not None and rotated['refresh_token'] != issued['refresh_token']
+            assert await _sid(session, rotated['refresh_token']) == sid
+            assert not tokens.revocation_list.is_revoked(sid)
+
+            # Старый токен предъявлен повторно — его украли: сессия отзывается целиком
+            assert await tokens.rotate_refresh_token(session, issued['refresh_token']) is None
+            assert tokens.revocation_list.is_revoked(sid)
+            assert await tokens.rotate_refresh_token(session, rotated['refresh_token']) is None
+
+    with_postgres(scenario)
+
+
+@requires_postgres
+def test_concurrent_rotation_issues_one_pair():
+    async def scenario(engine, session_maker):
+        async with session_maker() as session:
+            issued = await tokens.issue_tokens(session, 2, '+100')
+
+        async def rotate():
+            async with session_maker() as session:
+                return await tokens.rotate_refresh_token(session, issued['refresh_token'])
+
+        results = await asyncio.gather(rotate(), rotate())
+        assert sum(result is not None for result in results) == 1
+
+    with_postgres(scenario)
+
+
+@requires_postgres
+def test_unknown_token_does_not_revoke_anything():
+    async def scenario(engine, session_maker):
+        async with session_maker() as session:
+            issued = await tokens.issue_tokens(session, 1, 'one@example.com')
+            sid = await _sid(session, issued['refresh_token'])
+            assert await tokens.rotate_refresh_token(session, 'not-a-token') is None
+            assert not tokens.revocation_list.is_revoked(sid)
+            assert await tokens.rotate_refresh_token(session, issued['refresh_token']) is not None
+
+    with_postgres(scenario)
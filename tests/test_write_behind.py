@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from sql_app.write_behind import WriteBehindBuffer, WriteBehindFull
+
+pytest.importorskip('aiosqlite')
+
+metadata = MetaData()
+messages = Table('messages', metadata, Column('id', Integer, primary_key=True),
+                 Column('text', String, nullable=False))
+
+
+class Unavailable:
+    """Движок, у которого не открывается соединение (база недоступна)."""
+
+    def begin(self):
+        raise OperationalError('BEGIN', None, ConnectionRefusedError('connection refused'))
+
+
+async def _engine():
+    engine = create_async_engine('sqlite+aiosqlite:///:memory:')
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.create_all)
+    return engine
+
+
+async def _stored_ids(engine) -> list:
+    async with engine.connect() as conn:
+        return list((await conn.execute(select(messages.c.id).order_by(messages.c.id))).scalars())
+
+
+def _buffer(engine, **kwargs) -> WriteBehindBuffer:
+    options = dict(max_batch=100, flush_interval=60, max_pending=1000, max_backoff=0.01)
+    options.update(kwargs)
+    return WriteBehindBuffer('test_messages', messages, lambda: engine, **options)
+
+
+def test_flush_inserts_batch():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine)
+        for i in range(1, 6):
+            buffer.add({'id': i, 'text': 'x'})
+        assert buffer.pending == 5
+        assert await buffer.flush() == 5
+        assert await _stored_ids(engine) == [1, 2, 3, 4, 5]
+        assert buffer.stats()['written'] == 5
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_rows_rejected_by_database_are_dropped_rest_is_written():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine)
+        for i in range(1, 21):
+            buffer.add({'id': i, 'text': None if i in (5, 13, 20) else 'x'})
+        buffer.add({'id': 3, 'text': 'duplicate key'})
+        assert await buffer.flush() == 21
+        assert await _stored_ids(engine) == [i for i in range(1, 21) if i not in (5, 13, 20)]
+        stats = buffer.stats()
+        assert (stats['written'], stats['dropped'], stats['pending']) == (17, 4, 0)
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_unavailable_database_keeps_rows_in_order():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine, max_batch=3)
+        buffer.engine_factory = Unavailable
+        for i in range(1, 6):
+            buffer.add({'id': i, 'text': 'x'})
+        with pytest.raises(OperationalError):
+            await buffer.flush()
+        assert [row['id'] for row in buffer._rows] == [1, 2, 3, 4, 5]
+        assert buffer.stats()['dropped'] == 0
+
+        buffer.engine_factory = lambda: engine
+        await buffer.stop()
+        assert await _stored_ids(engine) == [1, 2, 3, 4, 5]
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_connection_error_during_split_requeues_only_unwritten_rows():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine)
+        inserts = []
+        insert = buffer._insert
+
+        async def flaky_insert(rows):
+            inserts.append([row['id'] for row in rows])
+            if len(inserts) == 3:  # пачка, левая половина, затем правая половина падает
+                raise OperationalError('INSERT', None, ConnectionResetError('connection reset'))
+            await insert(rows)
+
+        buffer._insert = flaky_insert
+        for i in range(1, 9):
+            buffer.add({'id': i, 'text': None if i == 8 else 'x'})
+        with pytest.raises(OperationalError):
+            await buffer.flush()
+        assert inserts == [[1, 2, 3, 4, 5, 6, 7, 8], [1, 2, 3, 4], [5, 6, 7, 8]]
+        assert await _stored_ids(engine) == [1, 2, 3, 4]
+        assert [row['id'] for row in buffer._rows] == [5, 6, 7, 8]
+
+        buffer._insert = insert
+        await buffer.flush()
+        assert await _stored_ids(engine) == [1, 2, 3, 4, 5, 6, 7]
+        assert buffer.stats()['dropped'] == 1
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_full_buffer_rejects_new_rows():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine, max_pending=2)
+        buffer.add({'id': 1, 'text': 'x'})
+        buffer.add({'id': 2, 'text': 'x'})
+        with pytest.raises(WriteBehindFull):
+            buffer.add({'id': 3, 'text': 'x'})
+        assert buffer.stats()['rejected'] == 1
+        await buffer.stop()
+        assert await _stored_ids(engine) == [1, 2]
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_background_task_flushes_by_size_and_retries_after_outage():
+    async def scenario():
+        engine = await _engine()
+        buffer = _buffer(engine, max_batch=2, flush_interval=0.01)
+        buffer.engine_factory = Unavailable
+        for i in range(1, 4):
+            buffer.add({'id': i, 'text': 'x'})
+        await asyncio.sleep(0.05)
+        assert buffer.stats()['failed_flushes'] > 0
+        buffer.engine_factory = lambda: engine
+        for _ in range(100):
+            if buffer.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await _stored_ids(engine) == [1, 2, 3]
+        await buffer.stop()
+        await engine.dispose()
+
+    asyncio.run(scenario())